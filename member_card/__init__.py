@@ -104,6 +104,14 @@ def create_app(env=None) -> "Flask":
 
     recaptcha.init_app(app)
 
+    from member_card.passes import get_pass_signer
+    from member_card.passes.apple_wallet import apple_developer_key_configured
+
+    with app.app_context():
+        if apple_developer_key_configured():
+            logger.debug("preloading apple pass signer")
+            get_pass_signer()
+
     return app
 
 
@@ -113,4 +121,11 @@ def create_worker_app(env=None) -> "Flask":
     logging.debug("registering worker blueprint")
     app.register_blueprint(worker_bp)
 
+    if app.config["CARD_RENDERER_POOL_SIZE"] > 0:
+        logging.debug("warming up card renderer pool")
+        from member_card.renderer import get_renderer_pool
+
+        with app.app_context():
+            get_renderer_pool()
+
     return app
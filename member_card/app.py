@@ -1,10 +1,12 @@
 #!/usr/bin/env python
-from datetime import datetime, timedelta
+from datetime import datetime
 from functools import wraps
+from io import BytesIO
 
 from flask import (
     Flask,
     g,
+    jsonify,
     redirect,
     render_template,
     request,
@@ -21,9 +23,10 @@ from flask_security.decorators import login_required, roles_required
 from flask_security.utils import logout_user
 from social_flask.template_filters import backends
 from social_flask.utils import load_strategy
+from sqlalchemy.orm import joinedload, lazyload
 
 from member_card import utils
-from member_card.db import db
+from member_card.db import db, get_pool_stats, get_replica_router, read_replica_route
 from member_card.exceptions import MemberCardException
 from member_card.models import (
     AnnualMembership,
@@ -31,10 +34,19 @@ from member_card.models import (
     SquarespaceWebhook,
     User,
 )
-from member_card.models.membership_card import get_or_create_membership_card
+from member_card.models.dashboard_stats import get_dashboard_stats
+from member_card.models.membership_card import (
+    get_membership_card,
+)
 from member_card.models.user import edit_user_name
-from member_card.passes import get_apple_pass_from_card
-from member_card.gcp import publish_message
+from member_card.passes import get_cached_apple_pass
+from member_card.passes.cache import get_pkpass_cache
+from member_card.queues import publish_message
+from member_card.query_stats import (
+    get_query_stats,
+    start_tracking_queries,
+    stop_tracking_queries,
+)
 from member_card.squarespace import (
     InvalidSquarespaceWebhookSignature,
     ensure_orders_webhook_subscription,
@@ -55,6 +67,38 @@ recaptcha = ReCaptcha()
 cdn = CDN()
 
 
+@app.before_request
+def start_request_query_stats():
+    g.query_stats_token = start_tracking_queries()
+
+
+@app.after_request
+def report_request_query_stats(response):
+    query_stats = get_query_stats()
+    if query_stats is None:
+        return response
+    query_stats.log(
+        description=f"{request.method} {request.path}",
+        n_plus_one_threshold=app.config["SQL_N_PLUS_ONE_THRESHOLD"],
+        log_extra=dict(
+            http_method=request.method,
+            http_path=request.path,
+            http_status=response.status_code,
+        ),
+    )
+    if app.config["SQL_QUERY_STATS_HEADERS_ENABLED"]:
+        response.headers["X-DB-Query-Count"] = str(query_stats.num_statements)
+        response.headers["X-DB-Query-Time-Ms"] = f"{query_stats.total_duration_ms:.3f}"
+    return response
+
+
+@app.teardown_request
+def stop_request_query_stats(error=None):
+    query_stats_token = g.pop("query_stats_token", None)
+    if query_stats_token is not None:
+        stop_tracking_queries(query_stats_token)
+
+
 @app.before_request
 def global_user():
     # evaluate proxy value
@@ -67,7 +111,9 @@ def commit_on_success(error=None):
         # TODO: do this better
         return
     if error is None:
-        db.session.commit()
+        # Most requests only read; don't turn them into write transactions by committing a session with no changes
+        if db.session.new or db.session.dirty or db.session.deleted:
+            db.session.commit()
     else:
         db.session.rollback()
 
@@ -103,6 +149,20 @@ app.context_processor(backends)
 app.jinja_env.globals["url"] = utils.social_url_for
 
 
+def request_membership_card(user):
+    """Have the worker create `user`'s missing membership card (and card image) so page views stay read-only"""
+    topic_id = app.config["GCLOUD_PUBSUB_TOPIC_ID"]
+    logger.info(f"publishing membership card request for {user=} to pubsub {topic_id=}")
+    publish_message(
+        project_id=app.config["GCLOUD_PROJECT"],
+        topic_id=topic_id,
+        message_data=dict(
+            type="ensure_uploaded_card_image_request",
+            member_email_address=user.email,
+        ),
+    )
+
+
 def active_membership_card_required(f):
     @wraps(f)
     @login_required
@@ -112,7 +172,14 @@ def active_membership_card_required(f):
                 url_for("no_active_membership_landing_page", **request.args)
             )
 
-        membership_card = get_or_create_membership_card(g.user)
+        membership_card = get_membership_card(g.user)
+        if membership_card is None:
+            # Cards are normally created as memberships are written; any that predate that are left to the worker
+            request_membership_card(g.user)
+            return render_template(
+                "membership_card_pending.html.j2",
+                refresh_delay_seconds="15",
+            )
 
         return f(*args, membership_card=membership_card, **kwargs)
 
@@ -202,10 +269,14 @@ def login_via_bigcommerce(store_hash, jwt_token):
 
 
 @app.route("/storefront/<store_hash>/members/<jwt_token>/card.html")
+@read_replica_route
 @cross_origin()
 def customer_card_html(store_hash, jwt_token):
     user = decode_member_jwt(store_hash=store_hash, jwt_token=jwt_token)
-    membership_card = get_or_create_membership_card(user)
+    membership_card = get_membership_card(user)
+    if membership_card is None and user.has_active_memberships:
+        # Have the card ready by the time any of its download links get clicked
+        request_membership_card(user)
     return render_template(
         "store_embed_member_info.html.j2",
         membership_card=membership_card,
@@ -216,62 +287,86 @@ def customer_card_html(store_hash, jwt_token):
     )
 
 
-def generate_membership_stats():
-    memberships = AnnualMembership.query.filter()
-    total_num_memberships = memberships.count()
-
-    active_memberships = AnnualMembership.query.filter(
-        AnnualMembership.created_on >= (datetime.utcnow() - timedelta(days=365))
-    )
-    num_active_memberships = active_memberships.count()
-
-    users = User.query.filter()
-
+def generate_membership_stats(dashboard_stats):
+    num_active_memberships = dashboard_stats.num_active_memberships
     membership_stats = {
-        "Membership Orders (Total)": total_num_memberships,
+        "Membership Orders (Total)": dashboard_stats.num_memberships,
         "Membership Orders (Active)": num_active_memberships,
-        "Membership Orders (Expired)": total_num_memberships - num_active_memberships,
-        "Users (Total)": users.count(),
+        "Membership Orders (Expired)": dashboard_stats.num_memberships
+        - num_active_memberships,
+        "Users (Total)": dashboard_stats.num_users,
     }
     logger.debug(f"{membership_stats=}")
     return membership_stats
 
 
-def generate_user_stats():
-    newest_user = None
-    newest_user_row = (
-        db.session.query(AnnualMembership)
-        .order_by(AnnualMembership.created_on.desc())
-        .first()
-    )
-    if newest_user_row:
-        newest_user = newest_user_row.user
-    oldest_user = None
-    oldest_user_row = (
-        db.session.query(AnnualMembership)
-        .order_by(AnnualMembership.created_on.asc())
-        .first()
-    )
-    if oldest_user_row:
-        oldest_user = oldest_user_row.user
+def generate_user_stats(dashboard_stats):
+    membership_ids = [
+        membership_id
+        for membership_id in (
+            dashboard_stats.newest_membership_id,
+            dashboard_stats.oldest_membership_id,
+        )
+        if membership_id
+    ]
+    memberships = []
+    if membership_ids:
+        # Fetch both memberships (and their users) in one go, skipping the cards they'd otherwise eagerly load
+        memberships = (
+            db.session.query(AnnualMembership)
+            .options(
+                joinedload(AnnualMembership.user),
+                lazyload(AnnualMembership.membership_cards),
+            )
+            .filter(AnnualMembership.id.in_(membership_ids))
+            .all()
+        )
+    users_by_membership_id = {m.id: m.user for m in memberships}
     user_stats = {
-        "Newest User": newest_user,
-        "Oldest User": oldest_user,
+        "Newest User": users_by_membership_id.get(dashboard_stats.newest_membership_id),
+        "Oldest User": users_by_membership_id.get(dashboard_stats.oldest_membership_id),
     }
     return user_stats
 
 
 @app.route("/admin-dashboard")
+@read_replica_route
 @login_required
 @roles_required("admin")
 def admin_dashboard():
+    dashboard_stats = get_dashboard_stats()
     return render_template(
         "admin_dashboard.html.j2",
-        membership_stats=generate_membership_stats(),
-        user_stats=generate_user_stats(),
+        membership_stats=generate_membership_stats(dashboard_stats),
+        user_stats=generate_user_stats(dashboard_stats),
+        stats_updated_on=dashboard_stats.time_updated,
     )
 
 
+@app.route("/admin-dashboard/pkpass-cache-stats")
+@login_required
+@roles_required("admin")
+def admin_pkpass_cache_stats():
+    return jsonify(get_pkpass_cache().stats())
+
+
+@app.route("/admin-dashboard/db-pool-stats")
+@login_required
+@roles_required("admin")
+def admin_db_pool_stats():
+    return jsonify(get_pool_stats(db.engine))
+
+
+@app.route("/admin-dashboard/db-replica-stats")
+@login_required
+@roles_required("admin")
+def admin_db_replica_stats():
+    replica_router = get_replica_router()
+    if replica_router is None:
+        return jsonify(dict(status="no read replica configured"))
+    return jsonify(replica_router.stats())
+
+
 @app.route("/no-active-membership-found")
 @login_required
 def no_active_membership_landing_page():
@@ -382,14 +477,16 @@ def passes_google_pay(membership_card):
 @active_membership_card_required
 def passes_apple_pay(membership_card):
     attachment_filename = f"lv_apple_pass-{g.user.last_name.lower()}.pkpass"
-    pkpass_out_path = get_apple_pass_from_card(
+    cached_pkpass = get_cached_apple_pass(
         membership_card=membership_card,
     )
     return send_file(
-        pkpass_out_path,
+        BytesIO(cached_pkpass.data),
         attachment_filename=attachment_filename,
         mimetype="application/vnd.apple.pkpass",
         as_attachment=True,
+        etag=cached_pkpass.etag,
+        last_modified=cached_pkpass.last_modified,
     )
 
 
@@ -450,6 +547,7 @@ def squarespace_order_webhook():
 
 
 @app.route("/verify-pass/<serial_number>")
+@read_replica_route
 @login_required
 # Note: get_or_create_membership_card() has this route hard-coded in it
 # TODO: ^ make that not the case
@@ -1,20 +1,33 @@
 import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
 from datetime import datetime, timedelta, timezone
+from time import sleep
 from typing import List
 from zoneinfo import ZoneInfo
 
 import requests
 from bigcommerce.api import BigcommerceApi
+from bigcommerce.exception import RateLimitingException
 from dateutil.parser import parse
 from flask import current_app
 from member_card.utils import sign
-from member_card.db import db, get_or_update
+from member_card.db import chunked, db
 from member_card.models import table_metadata, User
-from member_card.models.user import ensure_user
+from member_card.models.annual_membership import (
+    record_upserted_memberships,
+    tally_membership_batches,
+    upsert_memberships,
+)
+from member_card.models.membership_card import ensure_membership_cards
+from member_card.models.user import UserResolver
 
 logger = logging.getLogger(__name__)
 
+_fetch_thread_local = threading.local()
+
 
 def get_app_client_for_store() -> BigcommerceApi:
     # store = Store.query.filter(Store.store_hash == store_hash).one()
@@ -23,6 +36,12 @@ def get_app_client_for_store() -> BigcommerceApi:
         client_id=current_app.config["BIGCOMMERCE_CLIENT_ID"],
         store_hash=store_hash,
         access_token=current_app.config["BIGCOMMERCE_ACCESS_TOKEN"],
+        rate_limiting_management=dict(
+            min_requests_remaining=current_app.config[
+                "BIGCOMMERCE_RATE_LIMIT_MIN_REMAINING"
+            ],
+            wait=True,
+        ),
     )
     logger.debug(f"{app_client=} generated for {store_hash=}")
     return app_client
@@ -205,25 +224,19 @@ class BiggercommerceApi(object):
         )
 
 
-def insert_order_as_membership(order, order_products, membership_skus):
-    from member_card.models import AnnualMembership
-
-    membership_orders = []
+def membership_rows_from_order(order, order_products, membership_skus):
+    membership_rows = []
     line_items = order_products
-    # breakpoint()
     subscription_line_items = [i for i in line_items if i["sku"] in membership_skus]
     ignored_line_items = [i for i in line_items if i["sku"] not in membership_skus]
     logger.debug(f"{ignored_line_items=}")
-    customer_id = order["customer_id"]
     for subscription_line_item in subscription_line_items:
         fulfillment_status = order["status"]
-        # breakpoint()
         if order["date_shipped"] != "" and order["date_shipped"] is not None:
             fulfilled_on = parse(order["date_shipped"]).replace(tzinfo=timezone.utc)
         else:
             fulfilled_on = None
 
-        # customer_email = order["customerEmail"]
         variant_id = None
         if product_options := subscription_line_item.get("product_options"):
             variant_id = product_options[0].get("id", "unknown")
@@ -250,56 +263,190 @@ def insert_order_as_membership(order, order_products, membership_skus):
             product_id=subscription_line_item["product_id"],
             product_name=subscription_line_item["name"],
         )
-        membership = get_or_update(
-            session=db.session,
-            model=AnnualMembership,
-            filters=["order_id"],
-            kwargs=membership_kwargs,
-        )
-        db.session.add(membership)
+        membership_rows.append(membership_kwargs)
 
-        membership_user = ensure_user(
-            email=membership.customer_email,
-            first_name=membership.billing_address_first_name,
-            last_name=membership.billing_address_last_name,
+    return membership_rows
+
+
+def ensure_membership_row_users(membership_rows, customer_ids):
+    user_resolver = UserResolver()
+    user_resolver.preload(r["customer_email"] for r in membership_rows)
+    membership_users = [
+        user_resolver.resolve(
+            email=membership_row["customer_email"],
+            first_name=membership_row["billing_address_first_name"],
+            last_name=membership_row["billing_address_last_name"],
             bigcommerce_id=customer_id,
         )
-        db.session.add(membership_user)
-        setattr(membership, "user_id", membership_user.id)
+        for membership_row, customer_id in zip(membership_rows, customer_ids)
+    ]
+    # Flush once for the whole batch so newly created users have IDs assigned
+    user_resolver.flush()
+    for membership_row, membership_user in zip(membership_rows, membership_users):
+        membership_row["user_id"] = membership_user.id
 
-        membership_orders.append(membership)
 
-    return membership_orders
+def insert_order_as_membership(order, order_products, membership_skus):
+    membership_rows = membership_rows_from_order(
+        order=order,
+        order_products=order_products,
+        membership_skus=membership_skus,
+    )
+    ensure_membership_row_users(
+        membership_rows=membership_rows,
+        customer_ids=[order["customer_id"]] * len(membership_rows),
+    )
+    memberships = upsert_memberships(membership_rows)
+    record_upserted_memberships(memberships)
+    db.session.commit()
+    ensure_membership_cards(user_ids=[m.user_id for m in memberships])
+    return memberships
 
 
-def parse_subscription_orders(bigcommerce_client, membership_skus, subscription_orders):
-    # logger.info(f"{len(subscription_orders)=} retrieved from Bigcommerce...")
+def fetch_order_products(bigcommerce_client, order_id, max_retries=None):
+    if max_retries is None:
+        max_retries = current_app.config["BIGCOMMERCE_RATE_LIMIT_MAX_RETRIES"]
+
+    attempt = 0
+    while True:
+        try:
+            return [dict(p) for p in bigcommerce_client.OrderProducts.all(order_id)]
+        except RateLimitingException as err:
+            attempt += 1
+            if attempt > max_retries:
+                raise
+            # BigCommerce tells us exactly how long until the current rate limit window resets
+            retry_after_secs = int(err.retry_after) / 1000
+            logger.warning(
+                f"Rate limited fetching products for {order_id=}, retrying in {retry_after_secs}s ({attempt=})",
+                extra=dict(order_id=order_id, attempt=attempt),
+            )
+            sleep(retry_after_secs)
+
+
+def init_fetch_thread(app):
+    # BigcommerceApi clients (rate limit bookkeeping included) aren't thread-safe, so each pool thread gets its own
+    with app.app_context():
+        _fetch_thread_local.bigcommerce_client = get_app_client_for_store()
+
+
+def fetch_thread_order_products(order_id, max_retries):
+    return fetch_order_products(
+        bigcommerce_client=_fetch_thread_local.bigcommerce_client,
+        order_id=order_id,
+        max_retries=max_retries,
+    )
+
+
+def generate_orders_with_products(orders, max_workers=None):
+    """Yield `(order, order_products)` tuples, in order, with product requests run ahead on a bounded thread pool.
+
+    At most `max_workers` requests are in flight (and buffered) at any given time, each pool thread making them with
+    its own client from `get_app_client_for_store()`.
+    """
+    if max_workers is None:
+        max_workers = current_app.config["BIGCOMMERCE_FETCH_CONCURRENCY"]
+
+    # current_app is a thread-local proxy, so resolve config (and the app itself) before handing work off to the pool
+    max_retries = current_app.config["BIGCOMMERCE_RATE_LIMIT_MAX_RETRIES"]
+    app = current_app._get_current_object()
+    orders_iter = iter(orders)
+    pending = deque()
+    with ThreadPoolExecutor(
+        max_workers=max_workers,
+        thread_name_prefix="bigcomm-fetch",
+        initializer=init_fetch_thread,
+        initargs=(app,),
+    ) as executor:
+
+        def submit_next():
+            order = next(orders_iter, None)
+            if order is None:
+                return False
+            future = executor.submit(
+                fetch_thread_order_products,
+                order_id=order["id"],
+                max_retries=max_retries,
+            )
+            pending.append((order, future))
+            return True
+
+        for _ in range(max_workers):
+            if not submit_next():
+                break
+
+        while pending:
+            order, future = pending.popleft()
+            order_products = future.result()
+            submit_next()
+            yield order, order_products
 
-    # Loop over all the raw order data and do the ETL bits
-    memberships = []
-    for subscription_order in subscription_orders:
-        # subscription_order['products'] = bigcommerce_client.OrderProducts.all(subscription_order['id'])
-        # order_product_names = [p["name"] for p in subscription_order['products']]
-        # if not any(p["sku"] in membership_skus for p in subscription_order['products']):
-        #     logger.debug(
-        #         f"{subscription_order['id']=} (#{subscription_order['orderNumber']}) DOES NOT INCLUDE {membership_skus=} in {order_product_names=}"
-        #     )
-        #     continue
-        # logger.debug(
-        #     f"#{order['orderNumber']} has no {membership_sku=} in {order_product_names=}"
-        # )
-        order = deepcopy(subscription_order)
-        order_products = [
-            dict(p) for p in bigcommerce_client.OrderProducts.all(order["id"])
-        ]
-        membership_orders = insert_order_as_membership(
-            order=order,
-            order_products=order_products,
-            membership_skus=membership_skus,
-        )
 
+def generate_membership_batches(
+    membership_skus,
+    subscription_orders,
+    batch_size=None,
+    max_workers=None,
+):
+    """Stream `subscription_orders` through the ETL, yielding the AnnualMembership instances written per batch.
+
+    Only one batch of orders (plus the order products fetched ahead of it) is held in memory at a time.
+    """
+    if batch_size is None:
+        batch_size = current_app.config["ETL_UPSERT_BATCH_SIZE"]
+
+    orders_with_products = generate_orders_with_products(
+        orders=subscription_orders,
+        max_workers=max_workers,
+    )
+
+    # Loop over all the raw order data in batches (with order products fetched concurrently ahead of us), transforming
+    # each order into membership rows before writing the whole batch out via a single bulk upsert (and commit)
+    num_orders = 0
+    for orders_batch in chunked(orders_with_products, batch_size):
+        num_orders += len(orders_batch)
+        membership_rows = []
+        customer_ids = []
+        for subscription_order, order_products in orders_batch:
+            order = deepcopy(subscription_order)
+            order_membership_rows = membership_rows_from_order(
+                order=order,
+                order_products=order_products,
+                membership_skus=membership_skus,
+            )
+            membership_rows += order_membership_rows
+            customer_ids += [order["customer_id"]] * len(order_membership_rows)
+
+        ensure_membership_row_users(
+            membership_rows=membership_rows,
+            customer_ids=customer_ids,
+        )
+        memberships = upsert_memberships(
+            membership_rows=membership_rows,
+            batch_size=batch_size,
+        )
+        record_upserted_memberships(memberships)
+        # Each batch is written (users, memberships and all they feed into) as a whole or not at all
         db.session.commit()
-        memberships += membership_orders
+        ensure_membership_cards(user_ids=[m.user_id for m in memberships])
+        yield memberships
+    logger.info(f"{num_orders=} retrieved from Bigcommerce and processed...")
+
+
+def parse_subscription_orders(
+    membership_skus,
+    subscription_orders,
+    batch_size=None,
+    max_workers=None,
+):
+    memberships = []
+    for memberships_batch in generate_membership_batches(
+        membership_skus=membership_skus,
+        subscription_orders=subscription_orders,
+        batch_size=batch_size,
+        max_workers=max_workers,
+    ):
+        memberships += memberships_batch
     return memberships
 
 
@@ -311,9 +458,14 @@ def load_all_bigcommerce_orders(
         membership_skus=membership_skus,
     )
 
-    memberships = parse_subscription_orders(bigcommerce_client, membership_skus, orders)
+    membership_stats = tally_membership_batches(
+        generate_membership_batches(
+            membership_skus=membership_skus,
+            subscription_orders=orders,
+        )
+    )
 
-    return memberships
+    return membership_stats
 
 
 def load_single_order(
@@ -322,7 +474,6 @@ def load_single_order(
     subscription_order = bigcommerce_client.Orders.get(order_id)
     logger.debug(f"API response for {order_id=}: {subscription_order=}")
     memberships = parse_subscription_orders(
-        bigcommerce_client=bigcommerce_client,
         membership_skus=membership_skus,
         subscription_orders=[subscription_order],
     )
@@ -349,11 +500,16 @@ def bigcommerce_orders_etl(
         max_date_created=modified_before,
     )
 
-    memberships = parse_subscription_orders(bigcommerce_client, membership_skus, orders)
+    membership_stats = tally_membership_batches(
+        generate_membership_batches(
+            membership_skus=membership_skus,
+            subscription_orders=orders,
+        )
+    )
 
     table_metadata.set_last_run_start_time(membership_table_name, etl_start_time)
 
-    return memberships
+    return membership_stats
 
 
 def load_orders(
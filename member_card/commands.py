@@ -1,7 +1,10 @@
 #!/usr/bin/env python
+import json
 import logging
+import uuid
 
 import click
+from concurrent import futures
 from sqlalchemy.exc import NoResultFound
 from sqlalchemy.sql import func
 from flask import url_for
@@ -9,14 +12,31 @@ from member_card import worker
 
 from member_card import bigcommerce
 from member_card.app import app
-from member_card.db import db
-from member_card.gcp import get_bucket, publish_message
+from member_card.db import db, use_read_replica
+from member_card.gcp import get_bucket
 from member_card.image import generate_card_image
 from member_card.minibc import Minibc, parse_subscriptions, find_missing_shipping
 from member_card.models import AnnualMembership, User
-from member_card.models.membership_card import get_or_create_membership_card
-from member_card.models.user import add_role_to_user_by_email, edit_user_name
+from member_card.models.dashboard_stats import recompute_dashboard_stats
+from member_card.models.membership_card import (
+    ensure_membership_cards,
+    get_membership_cards_by_user_id,
+    get_or_create_membership_card,
+)
+from member_card.models.user import (
+    add_role_to_user_by_email,
+    backfill_membership_summaries,
+    edit_user_name,
+    get_active_members_after,
+)
 from member_card.passes import gpay
+from member_card.queues import (
+    get_queue_backend,
+    publish_many,
+    publish_message,
+    run_local_consumer,
+)
+from member_card.reissue import run_card_reissue
 from member_card.sendgrid import update_sendgrid_template
 
 logger = logging.getLogger(__name__)
@@ -30,35 +50,108 @@ def cards():
 @cards.command("detect-missing-card-images")
 def cards_detect_missing_card_images():
     image_bucket = get_bucket()
-    users = User.query.all()
-    users_missing_card_image = []
-    users_with_card_image = []
-    for num, user in enumerate(users):
-        membership_card = get_or_create_membership_card(
-            user=user,
-        )
-        blob = image_bucket.blob(membership_card.remote_image_path)
-        if blob.exists():
-            users_with_card_image.append(user)
-        else:
-            users_missing_card_image.append(user)
-        if users_missing_card_image:
-            break
-    print(f"#{len(users_missing_card_image)} => {users_missing_card_image}")
-    print(f"#{len(users_with_card_image)}")
     topic_id = app.config["GCLOUD_PUBSUB_TOPIC_ID"]
-    for user_missing_card_image in users_missing_card_image:
+    num_missing_card_image = 0
+    num_with_card_image = 0
+    publish_futures = []
+    # Only active members have (dated) cards whose images are worth generating
+    after_user_id = 0
+    while True:
+        users = get_active_members_after(after_user_id=after_user_id, limit=100)
+        if not users:
+            break
+        after_user_id = users[-1].id
+        ensure_membership_cards(user_ids=[user.id for user in users])
+        membership_cards_by_user_id = get_membership_cards_by_user_id(users)
+
+        users_missing_card_image = []
+        for user in users:
+            membership_card = membership_cards_by_user_id.get(user.id)
+            if membership_card is not None and (
+                image_bucket.blob(membership_card.remote_image_path).exists()
+            ):
+                num_with_card_image += 1
+            else:
+                users_missing_card_image.append(user)
+        if not users_missing_card_image:
+            continue
+
+        num_missing_card_image += len(users_missing_card_image)
+        print(f"#{len(users_missing_card_image)} => {users_missing_card_image}")
         logger.info(
-            f"publishing ensure_uploaded_card_image_request message for {user_missing_card_image} to pubsub {topic_id=}"
+            f"publishing {len(users_missing_card_image)} ensure_uploaded_card_image_request messages to pubsub {topic_id=}"
         )
-        publish_message(
+        publish_futures += publish_many(
             project_id=app.config["GCLOUD_PROJECT"],
             topic_id=topic_id,
-            message_data=dict(
-                type="ensure_uploaded_card_image_request",
-                member_email_address=user_missing_card_image.email,
-            ),
+            messages=[
+                dict(
+                    type="ensure_uploaded_card_image_request",
+                    member_email_address=user_missing_card_image.email,
+                )
+                for user_missing_card_image in users_missing_card_image
+            ],
         )
+    print(f"#{num_missing_card_image} missing / #{num_with_card_image} with card image")
+    futures.wait(publish_futures, return_when=futures.ALL_COMPLETED)
+
+
+@cards.command("reissue")
+@click.argument("reissue_id")
+@click.option("--batch-size", default=100)
+@click.option("--concurrency", default=4)
+@click.option("--num-shards", default=1)
+@click.option("--shard-index", default=0)
+@click.option(
+    "--force/--no-force",
+    default=False,
+    help="Regenerate images and Apple passes even if their content is unchanged",
+)
+@click.option("--report-interval-secs", default=10.0)
+def cards_reissue(
+    reissue_id,
+    batch_size,
+    concurrency,
+    num_shards,
+    shard_index,
+    force,
+    report_interval_secs,
+):
+    reissue_stats = run_card_reissue(
+        reissue_id=reissue_id,
+        batch_size=batch_size,
+        concurrency=concurrency,
+        num_shards=num_shards,
+        shard_index=shard_index,
+        force=force,
+        report_interval_secs=report_interval_secs,
+    )
+    print(f"cards_reissue(): {reissue_stats=}")
+
+
+@cards.command("send-bulk-email")
+@click.argument("distribution_id")
+@click.option("--subject", default=None)
+@click.option(
+    "--publish/--no-publish",
+    default=False,
+    help="Hand the distribution off to the worker via the message queue rather than sending from here",
+)
+def cards_send_bulk_email(distribution_id, subject, publish):
+    message = dict(
+        type="bulk_email_distribution_request",
+        distribution_id=distribution_id,
+        subject=subject,
+    )
+    if publish:
+        publish_message(
+            project_id=app.config["GCLOUD_PROJECT"],
+            topic_id=app.config["GCLOUD_PUBSUB_TOPIC_ID"],
+            message_data=message,
+        )
+        return
+    distribution_stats = worker.process_bulk_email_distribution_request(message=message)
+    print(f"cards_send_bulk_email(): {distribution_stats=}")
 
 
 @app.cli.command("sync-subscriptions")
@@ -110,6 +203,7 @@ def generate_card_image_cli(email):
 
 @app.cli.command("query-db")
 @click.argument("email")
+@use_read_replica()
 def query_db(email):
     memberships = (
         AnnualMembership.query.filter_by(customer_email=func.lower(email))
@@ -134,6 +228,7 @@ def query_db(email):
 
 @app.cli.command("query-order-num")
 @click.argument("order_num")
+@use_read_replica()
 def query_order_num(order_num):
     memberships = (
         AnnualMembership.query.filter_by(order_number=order_num)
@@ -201,6 +296,7 @@ def add_memberships_to_user_email(order_email, user_email):
         setattr(membership, "user_id", user.id)
         db.session.add(membership)
         db.session.commit()
+    ensure_membership_cards(user_ids=[user.id])
 
 
 @app.cli.command("update-user-name")
@@ -233,6 +329,21 @@ def add_role_to_user_cmd(user_email, role_name):
     return role
 
 
+@app.cli.command("recompute-dashboard-stats")
+def recompute_dashboard_stats_cmd():
+    dashboard_stats = recompute_dashboard_stats()
+    logger.info(f"Admin dashboard stats recomputed: {dashboard_stats=}")
+    return dashboard_stats
+
+
+@app.cli.command("backfill-membership-summaries")
+@click.option("--batch-size", default=1000, show_default=True)
+def backfill_membership_summaries_cmd(batch_size):
+    num_users = backfill_membership_summaries(batch_size=batch_size)
+    logger.info(f"Membership summaries backfilled for {num_users} user(s)")
+    return num_users
+
+
 @app.cli.group()
 def slack():
     pass
@@ -534,3 +645,67 @@ def bigcomm_sync_customers():
         message=dict(type="cli-sync-customers"),
     )
     logger.info(f"bigcomm_sync_customers() => {etl_results=}")
+
+
+@app.cli.group("worker")
+def worker_cli():
+    pass
+
+
+@worker_cli.command("run")
+@click.option("--subscription-id", default=None)
+@click.option("--max-messages", type=int, default=None)
+@click.option("--max-bytes", type=int, default=None)
+@click.option("--num-handler-threads", type=int, default=None)
+def worker_run(subscription_id, max_messages, max_bytes, num_handler_threads):
+    worker.run_streaming_pull_worker(
+        subscription_id=subscription_id or app.config["PUBSUB_SUBSCRIPTION_ID"],
+        max_messages=max_messages or app.config["PUBSUB_FLOW_CONTROL_MAX_MESSAGES"],
+        max_bytes=max_bytes or app.config["PUBSUB_FLOW_CONTROL_MAX_BYTES"],
+        num_handler_threads=num_handler_threads
+        or app.config["PUBSUB_SUBSCRIBER_HANDLER_THREADS"],
+    )
+
+
+@app.cli.group()
+def queue():
+    pass
+
+
+@queue.command("publish")
+@click.argument("message_json")
+@click.option("--count", default=1, help="Number of copies of the message to publish")
+def queue_publish(message_json, count):
+    message_data = json.loads(message_json)
+    topic_id = app.config["GCLOUD_PUBSUB_TOPIC_ID"]
+    logger.info(
+        f"publishing {count} {message_data['type']} message(s) to {app.config['QUEUE_BACKEND']} queue {topic_id=}"
+    )
+    messages = [dict(message_data) for _ in range(count)]
+    if count > 1:
+        # Tag each copy so they don't share an idempotency key and get deduplicated
+        for message in messages:
+            message["load_test_id"] = uuid.uuid4().hex
+    publish_futures = publish_many(
+        project_id=app.config["GCLOUD_PROJECT"],
+        topic_id=topic_id,
+        messages=messages,
+    )
+    futures.wait(publish_futures, return_when=futures.ALL_COMPLETED)
+    print(f"Published {len(publish_futures)} message(s)")
+
+
+@queue.command("consume")
+@click.option("--max-messages", type=int, default=None)
+@click.option("--batch-size", default=10)
+@click.option("--idle-timeout-secs", default=5.0)
+def queue_consume(max_messages, batch_size, idle_timeout_secs):
+    consumer_stats = run_local_consumer(
+        dispatch_func=worker.dispatch_message,
+        queue_backend=get_queue_backend(),
+        topic_id=app.config["GCLOUD_PUBSUB_TOPIC_ID"],
+        max_messages=max_messages,
+        batch_size=batch_size,
+        idle_timeout_secs=idle_timeout_secs,
+    )
+    print(f"queue_consume(): {consumer_stats=}")
@@ -1,19 +1,251 @@
 #!/usr/bin/env python
 import logging
-from functools import partial
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from functools import partial, wraps
+from time import monotonic
 from typing import TYPE_CHECKING
 
+from flask import current_app
 from flask_migrate import Migrate
-from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy import SignallingSession, SQLAlchemy
 from google.cloud.sql.connector import connector
+from sqlalchemy import create_engine, event, orm, text
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.sql import func
 
 if TYPE_CHECKING:
     from pg8000 import dbapi
 
-db = SQLAlchemy()
-migrate = Migrate(compare_type=True)
 logger = logging.getLogger(__name__)
 
+_sql_connector = None
+_sql_connector_lock = threading.Lock()
+
+_replica_router = None
+_replica_router_lock = threading.Lock()
+
+REPLICATION_LAG_SQL = text(
+    "SELECT CASE WHEN pg_is_in_recovery() "
+    "THEN COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) "
+    "ELSE 0 END"
+)
+
+
+class ReplicaRouter(object):
+    """Decides whether reads may go to the read replica engine, based on its availability and replication lag.
+
+    The replica is (re)checked at most every `check_interval_secs`; reads are routed to the primary whenever it is
+    unreachable or more than `max_lag_secs` behind. Each routing decision is tallied by reason for `stats()`.
+    """
+
+    def __init__(self, engine, max_lag_secs=5, check_interval_secs=10):
+        self.engine = engine
+        self.max_lag_secs = max_lag_secs
+        self.check_interval_secs = check_interval_secs
+        self.decisions = Counter()
+        self.last_lag_secs = None
+        self._route_reason = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+        event.listen(engine, "handle_error", self._handle_replica_error)
+
+    def _handle_replica_error(self, exception_context):
+        if exception_context.is_disconnect:
+            logger.warning(
+                f"Lost connection to read replica, routing reads to primary: {exception_context.original_exception=}"
+            )
+            self.mark_unavailable()
+
+    def mark_unavailable(self):
+        with self._lock:
+            self._route_reason = "primary_replica_unavailable"
+            self._checked_at = monotonic()
+
+    def measure_lag_secs(self):
+        with self.engine.connect() as connection:
+            if connection.dialect.name != "postgresql":
+                return 0.0
+            return float(connection.execute(REPLICATION_LAG_SQL).scalar())
+
+    def check(self):
+        try:
+            lag_secs = self.measure_lag_secs()
+        except Exception as err:
+            logger.warning(
+                f"Read replica unavailable, routing reads to primary: {err=}"
+            )
+            return "primary_replica_unavailable"
+        self.last_lag_secs = lag_secs
+        if lag_secs > self.max_lag_secs:
+            logger.warning(
+                f"Read replica is {lag_secs:.1f}s behind ({self.max_lag_secs=}), routing reads to primary"
+            )
+            return "primary_replica_lagging"
+        return "replica"
+
+    def route(self):
+        """Returns the replica engine if reads should go to it at the moment, otherwise None"""
+        with self._lock:
+            if (
+                self._checked_at is None
+                or monotonic() - self._checked_at >= self.check_interval_secs
+            ):
+                self._route_reason = self.check()
+                self._checked_at = monotonic()
+            self.decisions[self._route_reason] += 1
+            return self.engine if self._route_reason == "replica" else None
+
+    def stats(self):
+        with self._lock:
+            return dict(
+                decisions=dict(self.decisions),
+                last_lag_secs=self.last_lag_secs,
+                max_lag_secs=self.max_lag_secs,
+                current_route=self._route_reason,
+            )
+
+
+def get_replica_router():
+    """Process-wide router for the configured read replica, or None if no replica is configured"""
+    global _replica_router
+    replica_uri = current_app.config.get("SQLALCHEMY_REPLICA_DATABASE_URI")
+    if not replica_uri:
+        return None
+    with _replica_router_lock:
+        if _replica_router is None:
+            logger.debug("Initializing read replica engine and router")
+            _replica_router = ReplicaRouter(
+                engine=create_engine(
+                    replica_uri,
+                    **current_app.config.get("SQLALCHEMY_REPLICA_ENGINE_OPTIONS", {}),
+                ),
+                max_lag_secs=current_app.config["DB_REPLICA_MAX_LAG_SECS"],
+                check_interval_secs=current_app.config[
+                    "DB_REPLICA_LAG_CHECK_INTERVAL_SECS"
+                ],
+            )
+        return _replica_router
+
+
+class RoutingSession(SignallingSession):
+    """Session that sends SELECTs to the read replica while `use_read_replica()` is in effect.
+
+    Flushes (and any other non-SELECT statements) always go to the primary, as does everything when the replica is
+    unconfigured, unreachable or lagging.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if (
+            self.info.get("use_read_replica")
+            and not self.info.get("wrote_to_primary")
+            and not self._flushing
+            and getattr(clause, "is_select", False)
+        ):
+            replica_router = get_replica_router()
+            replica_engine = replica_router and replica_router.route()
+            if replica_engine is not None:
+                return replica_engine
+        return super().get_bind(mapper=mapper, clause=clause, **kwargs)
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def pin_session_to_primary(session, flush_context):
+    # Reads following a write need to see it, which a lagging replica can't promise
+    session.info["wrote_to_primary"] = True
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+db = RoutingSQLAlchemy()
+migrate = Migrate(compare_type=True)
+
+
+@contextmanager
+def use_read_replica(session=None):
+    if session is None:
+        session = db.session
+    previous_use_read_replica = session.info.get("use_read_replica", False)
+    session.info["use_read_replica"] = True
+    try:
+        yield session
+    finally:
+        session.info["use_read_replica"] = previous_use_read_replica
+
+
+def read_replica_route(f):
+    """Route decorator for read-only endpoints, letting their queries be served by the read replica"""
+
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        with use_read_replica():
+            return f(*args, **kwargs)
+
+    return decorated_function
+
+
+def get_sql_connector(enable_iam_auth=False):
+    """Process-wide Cloud SQL connector; it caches instance metadata / ephemeral certs and refreshes them in the background"""
+    global _sql_connector
+    with _sql_connector_lock:
+        if _sql_connector is None:
+            logger.debug(
+                f"Initializing shared Cloud SQL connector ({enable_iam_auth=})"
+            )
+            _sql_connector = connector.Connector(enable_iam_auth=enable_iam_auth)
+        return _sql_connector
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that also keeps track of how long each checkout spent waiting on a connection"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._checkout_stats_lock = threading.Lock()
+        self.num_checkouts = 0
+        self.total_checkout_wait_secs = 0.0
+        self.max_checkout_wait_secs = 0.0
+
+    def connect(self):
+        started_at = monotonic()
+        connection = super().connect()
+        checkout_wait_secs = monotonic() - started_at
+        with self._checkout_stats_lock:
+            self.num_checkouts += 1
+            self.total_checkout_wait_secs += checkout_wait_secs
+            self.max_checkout_wait_secs = max(
+                self.max_checkout_wait_secs, checkout_wait_secs
+            )
+        return connection
+
+    def stats(self):
+        with self._checkout_stats_lock:
+            avg_checkout_wait_secs = (
+                self.total_checkout_wait_secs / self.num_checkouts
+                if self.num_checkouts
+                else 0.0
+            )
+            return dict(
+                pool_size=self.size(),
+                checked_in=self.checkedin(),
+                checked_out=self.checkedout(),
+                overflow=self.overflow(),
+                num_checkouts=self.num_checkouts,
+                avg_checkout_wait_ms=avg_checkout_wait_secs * 1000,
+                max_checkout_wait_ms=self.max_checkout_wait_secs * 1000,
+            )
+
+
+def get_pool_stats(engine):
+    pool = engine.pool
+    if isinstance(pool, InstrumentedQueuePool):
+        return pool.stats()
+    return dict(status=pool.status())
+
 
 def get_gcp_sql_engine_creator(
     instance_connection_string, db_name, db_user, db_pass=None
@@ -44,12 +276,9 @@ def get_gcp_sql_engine_creator(
             # enable_iam_auth=True,
         )
 
-        conn_obj = connector.Connector()
         if db_pass:
             conn_kwargs["password"] = db_pass
-        else:
-            # TODO: drop this kludge pending release of https://github.com/GoogleCloudPlatform/cloud-sql-python-connector/pull/273
-            conn_obj._enable_iam_auth = not db_pass
+        conn_obj = get_sql_connector(enable_iam_auth=not db_pass)
         conn: "dbapi.Connection" = conn_obj.connect(
             instance_connection_string,
             "pg8000",
@@ -79,6 +308,94 @@ def get_or_update(session, model, filters, kwargs):
         return instance
 
 
+def chunked(iterable, chunk_size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def get_instances_by_key(session, model, key, values, chunk_size=500):
+    """Load existing `model` rows whose `key` column is in `values`, keyed by that column's value.
+
+    Lookups are issued as one `IN` query per chunk of `chunk_size` values rather than one query per value.
+    """
+    key_column = getattr(model, key)
+    instances_by_key = {}
+    for values_chunk in chunked(set(values), chunk_size):
+        for instance in session.query(model).filter(key_column.in_(values_chunk)):
+            instances_by_key[getattr(instance, key)] = instance
+    return instances_by_key
+
+
+def get_upsert_insert_func(session):
+    dialect_name = session.connection().dialect.name
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"No bulk upsert support for {dialect_name=}")
+    return insert
+
+
+def bulk_upsert(
+    session, model, rows, index_elements, batch_size=500, preserve_existing=None
+):
+    """INSERT ... ON CONFLICT DO UPDATE `rows` into `model`'s table in batches of `batch_size`.
+
+    Mirrors `get_or_update()`'s semantics: `None` values never overwrite an existing column value. Columns listed in
+    `preserve_existing` are only written when the existing row has no value set for them. Rows sharing the same
+    `index_elements` values are collapsed (last one wins) as Postgres refuses to update one row twice per statement.
+    Nothing is committed, so a failed batch doesn't leave earlier ones written. Returns the number of rows written.
+    """
+    if preserve_existing is None:
+        preserve_existing = []
+    insert = get_upsert_insert_func(session)
+    table = model.__table__
+
+    num_rows_written = 0
+    for rows_batch in chunked(rows, batch_size):
+        rows_by_index = {tuple(r[i] for i in index_elements): r for r in rows_batch}
+        # Rows only insert the columns they provide so any others still get their column defaults, rather than NULLs
+        rows_by_column_names = defaultdict(list)
+        for row in rows_by_index.values():
+            column_names = tuple(sorted(k for k in row.keys() if k in table.c))
+            rows_by_column_names[column_names].append(row)
+
+        for column_names, column_rows in rows_by_column_names.items():
+            values = [{c: row[c] for c in column_names} for row in column_rows]
+            logger.debug(
+                f"Upserting {len(values)} {model.__name__} row(s) on {index_elements=}"
+            )
+
+            insert_stmt = insert(table).values(values)
+            update_columns = {}
+            for column_name in column_names:
+                if column_name in index_elements:
+                    continue
+                if column_name in preserve_existing:
+                    update_columns[column_name] = func.coalesce(
+                        table.c[column_name], insert_stmt.excluded[column_name]
+                    )
+                else:
+                    update_columns[column_name] = func.coalesce(
+                        insert_stmt.excluded[column_name], table.c[column_name]
+                    )
+            upsert_stmt = insert_stmt.on_conflict_do_update(
+                index_elements=index_elements,
+                set_=update_columns,
+            )
+            session.execute(upsert_stmt)
+            num_rows_written += len(values)
+
+    return num_rows_written
+
+
 def get_or_create(session, model, **kwargs):
     kwargs = {k: v for k, v in kwargs.items() if v is not None}
 
@@ -1,15 +1,21 @@
 """Publishes multiple messages to a Pub/Sub topic with an error handler."""
+import atexit
 import json
 import logging
 import os
-from concurrent import futures
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 from flask import current_app
 from google.cloud.secretmanager import SecretManagerServiceClient
 from google.cloud import pubsub_v1, storage
+from google.cloud.pubsub_v1.subscriber.scheduler import ThreadScheduler
 
 logger = logging.getLogger(__name__)
 
+_publisher = None
+_publisher_lock = threading.Lock()
+
 
 DEFAULT_GCP_SCOPES = [
     "https://www.googleapis.com/auth/cloud-platform",
@@ -45,16 +51,79 @@ DEFAULT_SECRET_PLACEHOLDERS = {
 #     return credentials
 
 
-def publish_message(project_id, topic_id, message_data):
-    publisher = pubsub_v1.PublisherClient()
-    topic_path = publisher.topic_path(project_id, topic_id)
-    data = json.dumps(message_data).encode("utf-8")
-    publish_future = publisher.publish(topic_path, data)
+def get_publisher():
+    global _publisher
+    with _publisher_lock:
+        if _publisher is None:
+            batch_settings = pubsub_v1.types.BatchSettings(
+                max_messages=current_app.config["PUBSUB_BATCH_MAX_MESSAGES"],
+                max_bytes=current_app.config["PUBSUB_BATCH_MAX_BYTES"],
+                max_latency=current_app.config["PUBSUB_BATCH_MAX_LATENCY_SECS"],
+            )
+            logger.debug(f"Initializing shared Pub/Sub publisher: {batch_settings=}")
+            _publisher = pubsub_v1.PublisherClient(batch_settings=batch_settings)
+            atexit.register(flush_publisher)
+        return _publisher
+
+
+def flush_publisher():
+    """Publish any still-batched messages and release the shared publisher (a new one is created on next use)"""
+    global _publisher
+    with _publisher_lock:
+        if _publisher is None:
+            return
+        logger.debug("Flushing shared Pub/Sub publisher...")
+        _publisher.stop()
+        _publisher = None
+
+
+def subscribe(
+    project_id,
+    subscription_id,
+    callback,
+    max_messages,
+    max_bytes,
+    num_handler_threads,
+):
+    """Start a streaming pull on `subscription_id`, running `callback` for each message on a pool of handler threads.
+
+    Flow control caps how many messages (and bytes) are leased at once; the returned future's result() only
+    returns after a cancel() once any callbacks still running have finished.
+    """
+    subscriber = pubsub_v1.SubscriberClient()
+    subscription_path = subscriber.subscription_path(project_id, subscription_id)
+    flow_control = pubsub_v1.types.FlowControl(
+        max_messages=max_messages,
+        max_bytes=max_bytes,
+    )
+    scheduler = ThreadScheduler(
+        executor=ThreadPoolExecutor(
+            max_workers=num_handler_threads,
+            thread_name_prefix="pubsub-handler",
+        )
+    )
+    logger.info(
+        f"Starting streaming pull from {subscription_path=} ({flow_control=}, {num_handler_threads=})"
+    )
+    return subscriber.subscribe(
+        subscription_path,
+        callback=callback,
+        flow_control=flow_control,
+        scheduler=scheduler,
+        await_callbacks_on_shutdown=True,
+    )
 
-    # Wait for all the publish futures to resolve before exiting.
-    futures.wait([publish_future], return_when=futures.ALL_COMPLETED)
 
-    logger.info(f"Published messages with error handler to {topic_path}.")
+def publish_many(project_id, topic_id, messages):
+    """Queue up each of `messages` for publishing, returning the corresponding publish futures without waiting on them"""
+    publisher = get_publisher()
+    topic_path = publisher.topic_path(project_id, topic_id)
+    publish_futures = []
+    for message_data in messages:
+        data = json.dumps(message_data).encode("utf-8")
+        publish_futures.append(publisher.publish(topic_path, data))
+    logger.debug(f"Queued {len(publish_futures)} messages for {topic_path}.")
+    return publish_futures
 
 
 def retrieve_app_secrets(secret_name, defaults=DEFAULT_SECRET_PLACEHOLDERS):
@@ -96,6 +165,17 @@ def upload_file_to_gcs(bucket, local_file, remote_path, content_type=None):
     return blob
 
 
+def upload_bytes_to_gcs(bucket, data, remote_path, content_type=None):
+    blob = bucket.blob(remote_path)
+    blob.cache_control = "no-cache"
+
+    logger.debug(f"Uploading {len(data)} bytes to {remote_path=}")
+
+    blob.upload_from_string(data, content_type=content_type)
+
+    return blob
+
+
 # from datetime import timedelta
 # def get_presigned_url(blob, expiration: "timedelta"):
 #     url = blob.generate_signed_url(
@@ -0,0 +1,218 @@
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from time import monotonic
+
+from flask import current_app
+
+from member_card.db import bulk_upsert, db
+
+logger = logging.getLogger(__name__)
+
+_processed_message_ledger = None
+_processed_message_ledger_lock = threading.Lock()
+
+
+def bigcommerce_order_idempotency_key(message):
+    # Webhook payloads only carry the order ID, so key on the hash BigCommerce computes for each webhook event. Without
+    # one there is nothing telling one event from the next, so leave it to the messageId key alone
+    event_hash = message.get("hash")
+    if not event_hash:
+        return None
+    return ":".join(
+        [
+            message["store_hash"],
+            str(message["data"]["id"]),
+            event_hash,
+        ]
+    )
+
+
+def email_distribution_idempotency_key(message):
+    return ":".join(
+        [
+            message["email_distribution_recipient"],
+            str(message.get("submitted_on")),
+        ]
+    )
+
+
+def bulk_email_distribution_idempotency_key(message):
+    return message["distribution_id"]
+
+
+MESSAGE_IDEMPOTENCY_KEY_FUNCS = {
+    "bulk_email_distribution_request": bulk_email_distribution_idempotency_key,
+    "email_distribution_request": email_distribution_idempotency_key,
+    "sync_bigcommerce_order": bigcommerce_order_idempotency_key,
+}
+
+
+def get_message_idempotency_keys(message, message_id=None):
+    """Every key a redelivery of `message` would share: its Pub/Sub messageId plus any per-type idempotency key"""
+    message_type = message["type"]
+    idempotency_keys = []
+    if message_id:
+        idempotency_keys.append(f"pubsub:{message_id}")
+    if message_type in MESSAGE_IDEMPOTENCY_KEY_FUNCS:
+        type_key = MESSAGE_IDEMPOTENCY_KEY_FUNCS[message_type](message)
+        if type_key is not None:
+            if "load_test_id" in message:
+                # Copies published by `flask queue publish --count` are deliberately alike, so keep them apart
+                type_key = f"{type_key}:{message['load_test_id']}"
+            idempotency_keys.append(f"{message_type}:{type_key}")
+    return idempotency_keys
+
+
+class ProcessedMessageLedger(object):
+    """Base class for the processed message stores selectable via the `PROCESSED_MESSAGE_LEDGER` setting"""
+
+    def __init__(self, ttl_secs, prune_interval_secs):
+        self.ttl_secs = ttl_secs
+        self.prune_interval_secs = prune_interval_secs
+        self.hits = 0
+        self.misses = 0
+        self.num_recorded = 0
+        self.num_pruned = 0
+        self._last_pruned = monotonic()
+        self._lock = threading.Lock()
+
+    def is_processed(self, idempotency_keys):
+        if not idempotency_keys:
+            return False
+        is_processed = self._any_unexpired(idempotency_keys, now=utcnow())
+        with self._lock:
+            if is_processed:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return is_processed
+
+    def record(self, idempotency_keys, message_type):
+        if not idempotency_keys:
+            return
+        expires_at = utcnow() + timedelta(seconds=self.ttl_secs)
+        self._record(idempotency_keys, message_type, expires_at)
+        with self._lock:
+            self.num_recorded += len(idempotency_keys)
+            prune_due = monotonic() - self._last_pruned >= self.prune_interval_secs
+            if prune_due:
+                self._last_pruned = monotonic()
+        if prune_due:
+            self.prune()
+
+    def prune(self):
+        num_pruned = self._prune(now=utcnow())
+        logger.debug(f"Pruned {num_pruned} expired processed message ledger entries")
+        with self._lock:
+            self.num_pruned += num_pruned
+        return num_pruned
+
+    def stats(self):
+        with self._lock:
+            return dict(
+                hits=self.hits,
+                misses=self.misses,
+                num_recorded=self.num_recorded,
+                num_pruned=self.num_pruned,
+            )
+
+    def _any_unexpired(self, idempotency_keys, now):
+        raise NotImplementedError
+
+    def _record(self, idempotency_keys, message_type, expires_at):
+        raise NotImplementedError
+
+    def _prune(self, now):
+        raise NotImplementedError
+
+
+class InMemoryProcessedMessageLedger(ProcessedMessageLedger):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._expiries = {}
+
+    def _any_unexpired(self, idempotency_keys, now):
+        with self._lock:
+            return any(self._expiries.get(k, now) > now for k in idempotency_keys)
+
+    def _record(self, idempotency_keys, message_type, expires_at):
+        with self._lock:
+            for idempotency_key in idempotency_keys:
+                self._expiries[idempotency_key] = expires_at
+
+    def _prune(self, now):
+        with self._lock:
+            expired_keys = [k for k, v in self._expiries.items() if v <= now]
+            for idempotency_key in expired_keys:
+                del self._expiries[idempotency_key]
+        return len(expired_keys)
+
+
+class SqlProcessedMessageLedger(ProcessedMessageLedger):
+    def _any_unexpired(self, idempotency_keys, now):
+        from member_card.models import ProcessedMessage
+
+        return db.session.query(
+            db.session.query(ProcessedMessage)
+            .filter(ProcessedMessage.idempotency_key.in_(idempotency_keys))
+            .filter(ProcessedMessage.expires_at > now)
+            .exists()
+        ).scalar()
+
+    def _record(self, idempotency_keys, message_type, expires_at):
+        from member_card.models import ProcessedMessage
+
+        bulk_upsert(
+            session=db.session,
+            model=ProcessedMessage,
+            rows=[
+                dict(
+                    idempotency_key=idempotency_key,
+                    message_type=message_type,
+                    expires_at=expires_at,
+                )
+                for idempotency_key in idempotency_keys
+            ],
+            index_elements=["idempotency_key"],
+        )
+        db.session.commit()
+
+    def _prune(self, now):
+        from member_card.models import ProcessedMessage
+
+        num_pruned = (
+            db.session.query(ProcessedMessage)
+            .filter(ProcessedMessage.expires_at <= now)
+            .delete(synchronize_session=False)
+        )
+        db.session.commit()
+        return num_pruned
+
+
+PROCESSED_MESSAGE_LEDGERS = {
+    "memory": InMemoryProcessedMessageLedger,
+    "sql": SqlProcessedMessageLedger,
+}
+
+
+def utcnow():
+    return datetime.now(tz=timezone.utc)
+
+
+def get_processed_message_ledger():
+    global _processed_message_ledger
+    with _processed_message_ledger_lock:
+        if _processed_message_ledger is None:
+            ledger_name = current_app.config["PROCESSED_MESSAGE_LEDGER"]
+            if ledger_name not in PROCESSED_MESSAGE_LEDGERS:
+                raise NotImplementedError(
+                    f"No processed message ledger available for {ledger_name=}"
+                )
+            _processed_message_ledger = PROCESSED_MESSAGE_LEDGERS[ledger_name](
+                ttl_secs=current_app.config["PROCESSED_MESSAGE_TTL_SECS"],
+                prune_interval_secs=current_app.config[
+                    "PROCESSED_MESSAGE_PRUNE_INTERVAL_SECS"
+                ],
+            )
+        return _processed_message_ledger
@@ -1,32 +1,42 @@
 import logging
 import os
+from functools import lru_cache
+from io import BytesIO
 from tempfile import TemporaryDirectory
 
+import qrcode
 from flask import current_app
 from html2image import Html2Image
-from PIL import Image, ImageChops
+from PIL import Image, ImageChops, ImageDraw, ImageFont
 
 from member_card.gcp import upload_file_to_gcs, get_bucket
+from member_card.models.card_artifact import get_card_artifact, record_card_artifact
+from member_card.renderer import get_renderer_pool
 from member_card.utils import get_jinja_template
 
 logger = logging.getLogger(__name__)
 
+CARD_IMAGE_ARTIFACT_TYPE = "card_image"
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
 
-def remove_image_background(img):
-    img = img.convert("RGBA")
-
-    img_data = img.getdata()
 
-    updated_img_data = []
+def remove_image_background(img, tolerance=0):
+    """Make white (or near-white, within `tolerance` of 255 on each RGB channel) pixels fully transparent white."""
+    img = img.convert("RGBA")
 
-    for pixel in img_data:
-        if pixel[0] == 255 and pixel[1] == 255 and pixel[2] == 255:
-            updated_img_data.append((255, 255, 255, 0))
-        else:
-            updated_img_data.append(pixel)
+    # Build a mask (255 => background) via per-channel lookup tables rather than visiting each pixel in Python
+    threshold = 255 - tolerance
+    channel_masks = [
+        channel.point(lambda v: 255 if v >= threshold else 0)
+        for channel in img.split()[:3]
+    ]
+    background_mask = ImageChops.multiply(
+        ImageChops.multiply(channel_masks[0], channel_masks[1]),
+        channel_masks[2],
+    )
 
-    img.putdata(updated_img_data)
-    return img
+    transparent_img = Image.new("RGBA", img.size, (255, 255, 255, 0))
+    return Image.composite(transparent_img, img, background_mask)
 
 
 def trim(im):
@@ -40,19 +50,35 @@ def trim(im):
 
 
 def ensure_uploaded_card_image(membership_card):
+    remote_image_path = membership_card.remote_image_path
+    card_artifact = get_card_artifact(
+        content_hash=membership_card.content_hash,
+        artifact_type=CARD_IMAGE_ARTIFACT_TYPE,
+    )
+    if card_artifact is not None:
+        logger.info(
+            f"{remote_image_path} previously generated for {membership_card=} (content unchanged), skipping render"
+        )
+        return f"{current_app.config['GCS_BUCKET_ID']}/{remote_image_path}"
+
     image_bucket = get_bucket()
-    blob = image_bucket.blob(membership_card.remote_image_path)
+    blob = image_bucket.blob(remote_image_path)
     if blob.exists():
         logger.info(
-            f"{membership_card.remote_image_path} already present / previously uploaded for {membership_card=}: {blob=})"
+            f"{remote_image_path} already present / previously uploaded for {membership_card=}: {blob=})"
         )
     else:
         generate_and_upload_card_image(
             image_bucket=image_bucket,
             membership_card=membership_card,
         )
+    record_card_artifact(
+        membership_card=membership_card,
+        artifact_type=CARD_IMAGE_ARTIFACT_TYPE,
+        remote_path=remote_image_path,
+    )
 
-    return f"{image_bucket.id}/{membership_card.remote_image_path}"
+    return f"{image_bucket.id}/{remote_image_path}"
 
 
 def generate_and_upload_card_image(image_bucket, membership_card):
@@ -75,37 +101,235 @@ def generate_and_upload_card_image(image_bucket, membership_card):
 
 
 def generate_card_image(membership_card, output_path, card_image_filename):
+    card_image_renderer = get_card_image_renderer()
+    img = card_image_renderer.render(membership_card)
+    image_path = os.path.join(output_path, card_image_filename)
+    img.save(image_path)
+    return image_path
+
+
+def get_card_image_renderer():
+    renderer_name = current_app.config["CARD_IMAGE_RENDERER"]
+    if renderer_name not in CARD_IMAGE_RENDERERS:
+        raise NotImplementedError(
+            f"No card image renderer available for {renderer_name=}"
+        )
+    return CARD_IMAGE_RENDERERS[renderer_name]()
+
+
+class CardImageRenderer(object):
+    """Base class for the card image rendering backends selectable via the `CARD_IMAGE_RENDERER` setting"""
+
     img_aspect_ratio = 1.586
     img_height = 500
-    img_width = int(img_height * img_aspect_ratio)
-    image_template = get_jinja_template("card_image.html.j2")
-    html_content = image_template.render(
-        membership_card=membership_card,
-        card_height=img_height,
-        card_width=img_width,
-        static_base_url=current_app.config["STATIC_ASSET_BASE_URL"],
+
+    @property
+    def img_width(self):
+        return int(self.img_height * self.img_aspect_ratio)
+
+    def render(self, membership_card) -> Image.Image:
+        raise NotImplementedError
+
+
+class HtmlCardImageRenderer(CardImageRenderer):
+    """Screenshots the `card_image.html.j2` template with headless Chrome"""
+
+    def render(self, membership_card):
+        image_template = get_jinja_template("card_image.html.j2")
+        html_content = image_template.render(
+            membership_card=membership_card,
+            card_height=self.img_height,
+            card_width=self.img_width,
+            static_base_url=current_app.config["STATIC_ASSET_BASE_URL"],
+        )
+
+        if current_app.config["CARD_RENDERER_POOL_SIZE"] > 0:
+            png_bytes = get_renderer_pool().render(
+                html_content=html_content,
+                width=self.img_width,
+                height=self.img_height,
+            )
+            img = Image.open(BytesIO(png_bytes))
+        else:
+            img = self.screenshot_with_html2image(
+                html_content=html_content,
+                screenshot_filename=f"screenshot_{membership_card.image_filename}",
+            )
+
+        img = remove_image_background(img)
+        return trim(img)
+
+    def screenshot_with_html2image(self, html_content, screenshot_filename):
+        with TemporaryDirectory() as td:
+            hti = Html2Image(
+                output_path=td,
+                temp_path=td,
+                size=(self.img_width, self.img_height),
+                custom_flags=[
+                    "--no-sandbox",
+                    "--hide-scrollbars",
+                ],
+            )
+            hti.screenshot(
+                html_str=html_content,
+                save_as=screenshot_filename,
+            )
+            screenshot_path = os.path.join(td, screenshot_filename)
+            img = Image.open(screenshot_path)
+            img.load()
+        return img
+
+
+@lru_cache(maxsize=None)
+def load_static_image(filename):
+    img = Image.open(os.path.join(STATIC_DIR, filename)).convert("RGBA")
+    img.load()
+    return img
+
+
+@lru_cache(maxsize=None)
+def load_card_font(font_path, size):
+    if not font_path:
+        return ImageFont.load_default()
+    try:
+        return ImageFont.truetype(font_path, size)
+    except OSError as err:
+        logger.warning(f"Unable to load {font_path=} ({err=}), using default font")
+        return ImageFont.load_default()
+
+
+def measure_text(font, text):
+    """`(width, height)` of `text` drawn in `font`, measured from the drawing origin"""
+    if not hasattr(font, "getbbox"):
+        # Bitmap fonts only gained getbbox() in Pillow 9.2
+        return font.getsize(text)
+    _, _, right, bottom = font.getbbox(text)
+    return right, bottom
+
+
+@lru_cache(maxsize=None)
+def compose_card_background(
+    width, height, border_color, border_width, corner_radius, padding
+):
+    # "cover" the card with our background pattern, cropping whatever overflows
+    pattern = load_static_image("sangramos_pattern_small_clip.png")
+    scale = max(width / pattern.width, height / pattern.height)
+    pattern = pattern.resize(
+        (round(pattern.width * scale), round(pattern.height * scale)),
+        Image.LANCZOS,
+    )
+    left = (pattern.width - width) // 2
+    top = (pattern.height - height) // 2
+    background = pattern.crop((left, top, left + width, top + height))
+
+    ImageDraw.Draw(background).rounded_rectangle(
+        (0, 0, width - 1, height - 1),
+        radius=corner_radius,
+        outline=border_color,
+        width=border_width,
+    )
+
+    mask = Image.new("L", (width, height), 0)
+    ImageDraw.Draw(mask).rounded_rectangle(
+        (0, 0, width - 1, height - 1), radius=corner_radius, fill=255
+    )
+    card = Image.new("RGBA", (width, height), (255, 255, 255, 0))
+    card.paste(background, (0, 0), mask)
+
+    # LV crest up in the top-left third of the card
+    crest_size = width // 3 - 2 * padding
+    crest = load_static_image("lv_onverde.png").resize(
+        (crest_size, crest_size), Image.LANCZOS
     )
+    card.alpha_composite(crest, (padding, padding))
+    return card
+
 
-    screenshot_filename = f"screenshot_{card_image_filename}"
-
-    with TemporaryDirectory() as td:
-        hti = Html2Image(
-            output_path=output_path,
-            temp_path=td,
-            size=(img_width, img_height),
-            custom_flags=[
-                "--no-sandbox",
-                "--hide-scrollbars",
-            ],
+class PillowCardImageRenderer(CardImageRenderer):
+    """Composes the card directly with Pillow, approximating the layout of the `card_image.html.j2` template"""
+
+    bright_verde = (0, 177, 64)
+    text_color = (254, 254, 254)
+    border_width = 11
+    corner_radius = 20
+    padding = 28
+
+    def font(self, size):
+        return load_card_font(current_app.config["CARD_IMAGE_FONT_PATH"], size)
+
+    def card_background(self):
+        return compose_card_background(
+            width=self.img_width,
+            height=self.img_height,
+            border_color=(*self.bright_verde, 153),
+            border_width=self.border_width,
+            corner_radius=self.corner_radius,
+            padding=self.padding,
         )
-        hti.screenshot(
-            html_str=html_content,
-            save_as=screenshot_filename,
+
+    def draw_right_aligned_lines(self, draw, lines, right, top, font, spacing=4):
+        for line in lines:
+            line_width, line_height = measure_text(font, line)
+            draw.text((right - line_width, top), line, font=font, fill=self.text_color)
+            top += line_height + spacing
+
+    def qr_code_img(self, membership_card, size):
+        qr = qrcode.QRCode(border=1)
+        qr.add_data(membership_card.qr_code_message)
+        qr_img = qr.make_image(back_color="white").convert("RGBA")
+        return qr_img.resize((size, size), Image.NEAREST)
+
+    def render(self, membership_card):
+        card = self.card_background().copy()
+        draw = ImageDraw.Draw(card)
+        inner_right = self.img_width - self.padding
+        inner_bottom = self.img_height - self.padding
+
+        # Top-right: card title
+        self.draw_right_aligned_lines(
+            draw=draw,
+            lines=["Los Verdes", "Membership Card"],
+            right=inner_right,
+            top=self.padding,
+            font=self.font(44),
         )
-        screenshot_path = os.path.join(output_path, screenshot_filename)
-        img = Image.open(screenshot_path)
-        img = remove_image_background(img)
-        image_path = os.path.join(output_path, card_image_filename)
-        img = trim(img)
-        img.save(image_path)
-    return image_path
+
+        # Bottom-right: QR code for card verification
+        qr_size = self.img_width // 3 - 2 * self.padding
+        card.alpha_composite(
+            self.qr_code_img(membership_card, qr_size),
+            (inner_right - qr_size, inner_bottom - qr_size),
+        )
+
+        # Bottom-left: member details, stacked up from the bottom edge
+        detail_lines = [(membership_card.user.fullname or "", self.font(42))]
+        # Cards for users without any memberships have no dates to show
+        if membership_card.member_since:
+            detail_lines.append(
+                (
+                    f"Member Since {membership_card.member_since.strftime('%b %Y')}",
+                    self.font(30),
+                )
+            )
+        if membership_card.member_until:
+            detail_lines.append(
+                (
+                    f"Good through {membership_card.member_until.strftime('%b %d, %Y')}",
+                    self.font(20),
+                )
+            )
+        line_heights = [
+            measure_text(font, text or " ")[1] + 6 for text, font in detail_lines
+        ]
+        top = inner_bottom - sum(line_heights)
+        for (text, font), line_height in zip(detail_lines, line_heights):
+            draw.text((self.padding, top), text, font=font, fill=self.text_color)
+            top += line_height
+
+        return card
+
+
+CARD_IMAGE_RENDERERS = {
+    "html": HtmlCardImageRenderer,
+    "pillow": PillowCardImageRenderer,
+}
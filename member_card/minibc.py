@@ -273,6 +273,28 @@ def parse_weird_dates(date_str):
         return None
 
 
+def generate_subscription_pages(
+    minibc_client: Minibc, skus, start_page_num, max_pages, polling_interval_secs=1
+):
+    """Lazily yield `(page_num, subscriptions)` for each page of subscriptions, stopping at the first empty page."""
+    end_page_num = start_page_num + max_pages + 1
+    for page_num in range(start_page_num, end_page_num):
+        logger.info(f"Sync at {page_num=}")
+        subscriptions = minibc_client.search_subscriptions(
+            product_sku=skus[0],
+            page_num=page_num,
+        )
+        if subscriptions is None:
+            logger.debug(f"{page_num=} returned no results!")
+            return
+
+        yield page_num, subscriptions
+        logger.debug(
+            f"after {page_num=} sleeping for {polling_interval_secs} second..."
+        )
+        sleep(polling_interval_secs)
+
+
 def minibc_subscriptions_etl(minibc_client: Minibc, skus, load_all=False):
     from member_card import models
 
@@ -287,32 +309,27 @@ def minibc_subscriptions_etl(minibc_client: Minibc, skus, load_all=False):
         )
         max_pages = 20
 
-    subscription_objs = list()
-
-    last_page_num = start_page_num
-    end_page_num = start_page_num + max_pages + 1
-
     logger.debug(
-        f"search_subscriptions() => starting to paginate subscriptions and such: {start_page_num=} {end_page_num=}"
+        f"search_subscriptions() => starting to paginate subscriptions and such: {start_page_num=} {max_pages=}"
     )
 
-    for page_num in range(start_page_num, end_page_num):
-        logger.info(f"Sync at {page_num=}")
-        subscriptions = minibc_client.search_subscriptions(
-            product_sku=skus[0],
-            page_num=page_num,
-        )
-        if subscriptions is None:
-            logger.debug(
-                f"{last_page_num=} returned no results!. Setting `last_page_num` back to 1"
-            )
-            last_page_num = 1
-            break
-
+    # Only keep running counts around (rather than every Subscription) so memory use is bounded by a single page
+    num_subscriptions = 0
+    last_page_num = start_page_num
+    for page_num, subscriptions in generate_subscription_pages(
+        minibc_client=minibc_client,
+        skus=skus,
+        start_page_num=start_page_num,
+        max_pages=max_pages,
+    ):
         last_page_num = page_num
-        subscription_objs += parse_subscriptions(subscriptions)
-        logger.debug(f"after {page_num=} sleeping for 1 second...")
-        sleep(1)
+        num_subscriptions += len(parse_subscriptions(subscriptions))
+
+    if last_page_num != start_page_num + max_pages:
+        logger.debug(
+            f"{last_page_num=} was followed by a page with no results! Setting `last_page_num` back to 1"
+        )
+        last_page_num = 1
 
     if not load_all:
         logger.debug(
@@ -322,7 +339,10 @@ def minibc_subscriptions_etl(minibc_client: Minibc, skus, load_all=False):
             subscriptions_table_name, max(1, last_page_num - 1)
         )
 
-    return subscription_objs
+    return dict(
+        num_subscriptions=num_subscriptions,
+        last_page_num=last_page_num,
+    )
 
 
 def load_single_subscription(minibc_client: Minibc, skus, order_id):
@@ -3,7 +3,12 @@ from social_flask_sqlalchemy import models
 
 from member_card.models.annual_membership import AnnualMembership
 from member_card.models.apple_device_registration import AppleDeviceRegistration
+from member_card.models.card_artifact import CardArtifact
+from member_card.models.card_reissue import CardReissue
+from member_card.models.dashboard_stats import DashboardStats
 from member_card.models.membership_card import MembershipCard
+from member_card.models.pending_order_sync import PendingOrderSync
+from member_card.models.processed_message import ProcessedMessage
 from member_card.models.slack_user import SlackUser
 from member_card.models.squarespace_webhook import SquarespaceWebhook
 from member_card.models.store import Store
@@ -15,9 +20,14 @@ from member_card.models.user import Role, User
 __all__ = (
     "AnnualMembership",
     "AppleDeviceRegistration",
+    "CardArtifact",
+    "CardReissue",
+    "DashboardStats",
     "MembershipCard",
     "User",
     "Role",
+    "PendingOrderSync",
+    "ProcessedMessage",
     "SlackUser",
     "SquarespaceWebhook",
     "Store",
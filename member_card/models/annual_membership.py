@@ -4,11 +4,22 @@ from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
 
 from dateutil.parser import parse
-from member_card.db import db
+from member_card.db import bulk_upsert, db, get_instances_by_key
+from sqlalchemy import and_, not_
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import relationship
 
 logger = logging.getLogger(__name__)
 
+MEMBERSHIP_DURATION = timedelta(days=365)
+# Memberships count as active for a day beyond their expiry date
+ACTIVE_MEMBERSHIP_DURATION = timedelta(days=366)
+
+
+def get_active_membership_cutoff():
+    """Memberships created on or before this (naive UTC) datetime are no longer active"""
+    return datetime.utcnow() - ACTIVE_MEMBERSHIP_DURATION
+
 
 membership_card_to_membership_assoc_table = db.Table(
     "membership_cards_to_memberships",
@@ -28,15 +39,94 @@ membership_card_to_membership_assoc_table = db.Table(
 )
 
 
-class AnnualMembership(db.Model):
-    __tablename__ = "annual_membership"
+class UpsertedMemberships(list):
+    """The AnnualMembership instances written by `upsert_memberships()`, along with what they were before the upsert"""
+
+    def __init__(self, memberships, previously_canceled_by_order_id):
+        super().__init__(memberships)
+        # Pre-upsert `is_canceled` for each of the memberships that already existed
+        self.previously_canceled_by_order_id = previously_canceled_by_order_id
+
+
+def upsert_memberships(membership_rows, batch_size=500, preserve_existing=None):
+    """Bulk upsert a list of AnnualMembership column dicts keyed on `order_id`.
+
+    Returns the resulting AnnualMembership instances (in the same order as the provided rows) as `UpsertedMemberships`.
+    Nothing is committed; the caller owns the transaction and follows up with `record_upserted_memberships()`.
+    """
+    if not membership_rows:
+        return UpsertedMemberships([], previously_canceled_by_order_id={})
+
+    order_ids = [r["order_id"] for r in membership_rows]
+    previously_canceled_by_order_id = dict(
+        db.session.query(
+            AnnualMembership.order_id, AnnualMembership.is_canceled
+        ).filter(AnnualMembership.order_id.in_(order_ids))
+    )
+    bulk_upsert(
+        session=db.session,
+        model=AnnualMembership,
+        rows=membership_rows,
+        index_elements=["order_id"],
+        batch_size=batch_size,
+        preserve_existing=preserve_existing,
+    )
+    memberships_by_order_id = get_instances_by_key(
+        session=db.session,
+        model=AnnualMembership,
+        key="order_id",
+        values=order_ids,
+        chunk_size=batch_size,
+    )
+    return UpsertedMemberships(
+        [memberships_by_order_id[o] for o in dict.fromkeys(order_ids)],
+        previously_canceled_by_order_id=previously_canceled_by_order_id,
+    )
+
 
-    one_year_ago = (datetime.utcnow() - timedelta(days=366)).replace(
-        tzinfo=timezone.utc
+def record_upserted_memberships(upserted_memberships):
+    """Update everything derived from memberships returned by `upsert_memberships()`, within the caller's transaction.
+
+    Bulk upserts bypass the ORM flush that would otherwise refresh the affected users' membership summaries, so that's
+    done here along with tallying the memberships into the admin dashboard stats. Once committed, follow up with
+    `ensure_membership_cards()` for the memberships' users.
+    """
+    from member_card.models.dashboard_stats import update_dashboard_stats
+    from member_card.models.user import refresh_membership_summaries
+
+    refresh_membership_summaries(user_ids=[m.user_id for m in upserted_memberships])
+    update_dashboard_stats(
+        memberships=upserted_memberships,
+        previously_canceled_by_order_id=(
+            upserted_memberships.previously_canceled_by_order_id
+        ),
+    )
+
+
+def tally_membership_batches(membership_batches):
+    """Consume an iterable of AnnualMembership batches, returning running counts rather than the memberships.
+
+    Only one batch is referenced at a time so ETL runs needn't hold every membership in memory to report on them.
+    """
+    stats = dict(
+        num_membership=0,
+        num_active_membership=0,
+        num_inactive_membership=0,
     )
+    for memberships in membership_batches:
+        num_active = sum(1 for m in memberships if m.is_active)
+        stats["num_membership"] += len(memberships)
+        stats["num_active_membership"] += num_active
+        stats["num_inactive_membership"] += len(memberships) - num_active
+        logger.debug(f"Membership batch processed, running totals: {stats=}")
+    return stats
+
+
+class AnnualMembership(db.Model):
+    __tablename__ = "annual_membership"
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    user_id = db.Column(db.Integer, db.ForeignKey("users.id"))
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), index=True)
     user = relationship(
         "User", back_populates="annual_memberships", cascade="save-update"
     )
@@ -57,7 +147,7 @@ class AnnualMembership(db.Model):
     created_on = db.Column(db.DateTime, nullable=False)
     modified_on = db.Column(db.DateTime)
     fulfilled_on = db.Column(db.DateTime, nullable=True)
-    customer_email = db.Column(db.String(120))
+    customer_email = db.Column(db.String(120), index=True)
     line_item_id = db.Column(db.String(32))
     sku = db.Column(db.String(20))
     variant_id = db.Column(db.String(36))
@@ -100,17 +190,29 @@ class AnnualMembership(db.Model):
             ) />",
         )
 
-    @property
+    @hybrid_property
     def is_canceled(self):
         return self.fulfillment_status == "CANCELED"
 
-    @property
+    @is_canceled.expression
+    def is_canceled(cls):
+        # Spelled out so rows without a fulfillment status come out false rather than NULL
+        return and_(
+            cls.fulfillment_status.isnot(None),
+            cls.fulfillment_status == "CANCELED",
+        )
+
+    @hybrid_property
     def expiry_date(self):
         if not self.created_on:
             return None
-        return self.created_on + timedelta(days=365)
+        return self.created_on + MEMBERSHIP_DURATION
 
-    @property
+    @expiry_date.expression
+    def expiry_date(cls):
+        return cls.created_on + MEMBERSHIP_DURATION
+
+    @hybrid_property
     def is_active(self):
         if self.is_canceled:
             return False
@@ -123,7 +225,15 @@ class AnnualMembership(db.Model):
             created_on = parse(created_on)
         if created_on.tzinfo is None:
             created_on = created_on.replace(tzinfo=timezone.utc)
-        if created_on <= self.one_year_ago:
+        active_cutoff = get_active_membership_cutoff().replace(tzinfo=timezone.utc)
+        if created_on <= active_cutoff:
             return False
 
         return True
+
+    @is_active.expression
+    def is_active(cls):
+        return and_(
+            cls.created_on > get_active_membership_cutoff(),
+            not_(cls.is_canceled),
+        )
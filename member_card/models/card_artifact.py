@@ -0,0 +1,42 @@
+from member_card.db import db
+from sqlalchemy.sql import func
+
+
+def get_card_artifact(content_hash, artifact_type):
+    from member_card.models import CardArtifact
+
+    return (
+        db.session.query(CardArtifact)
+        .filter_by(
+            content_hash=content_hash,
+            artifact_type=artifact_type,
+        )
+        .first()
+    )
+
+
+def record_card_artifact(membership_card, artifact_type, remote_path):
+    from member_card.models import CardArtifact
+
+    card_artifact = CardArtifact(
+        content_hash=membership_card.content_hash,
+        artifact_type=artifact_type,
+        membership_card_id=membership_card.id,
+        remote_path=remote_path,
+    )
+    card_artifact = db.session.merge(card_artifact)
+    db.session.commit()
+    return card_artifact
+
+
+class CardArtifact(db.Model):
+    """Index of uploaded card images / passes, keyed by the hash of the card content they were rendered from"""
+
+    __tablename__ = "card_artifacts"
+    content_hash = db.Column(db.String(64), primary_key=True)
+    artifact_type = db.Column(db.String(32), primary_key=True)
+    membership_card_id = db.Column(
+        db.Integer, db.ForeignKey("membership_cards.id", ondelete="CASCADE")
+    )
+    remote_path = db.Column(db.String)
+    time_created = db.Column(db.DateTime(timezone=True), server_default=func.now())
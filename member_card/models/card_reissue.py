@@ -0,0 +1,66 @@
+from member_card.db import db
+from sqlalchemy.sql import func
+
+CARD_REISSUE_COMPLETED = "completed"
+CARD_REISSUE_FAILED = "failed"
+
+
+def get_reissued_user_ids(reissue_id, user_ids):
+    """Subset of `user_ids` whose cards have already been successfully reissued as part of `reissue_id`"""
+    from member_card.models import CardReissue
+
+    completed_reissues = db.session.query(CardReissue.user_id).filter(
+        CardReissue.reissue_id == reissue_id,
+        CardReissue.user_id.in_(user_ids),
+        CardReissue.status == CARD_REISSUE_COMPLETED,
+    )
+    return {user_id for user_id, in completed_reissues}
+
+
+def count_reissued_cards(reissue_id, num_shards=1, shard_index=0):
+    from member_card.models import CardReissue
+
+    completed_reissues = db.session.query(CardReissue.user_id).filter_by(
+        reissue_id=reissue_id,
+        status=CARD_REISSUE_COMPLETED,
+    )
+    if num_shards > 1:
+        completed_reissues = completed_reissues.filter(
+            CardReissue.user_id % num_shards == shard_index
+        )
+    return completed_reissues.count()
+
+
+def record_card_reissue(reissue_id, user_id, status, membership_card=None, error=None):
+    from member_card.models import CardReissue
+
+    card_reissue = CardReissue(
+        reissue_id=reissue_id,
+        user_id=user_id,
+        membership_card_id=membership_card and membership_card.id,
+        content_hash=membership_card and membership_card.content_hash,
+        status=status,
+        error=error,
+    )
+    card_reissue = db.session.merge(card_reissue)
+    db.session.commit()
+    return card_reissue
+
+
+class CardReissue(db.Model):
+    """Per-member progress of a `cards reissue` run, so an interrupted (or sharded) run can pick up where it left off"""
+
+    __tablename__ = "card_reissues"
+    reissue_id = db.Column(db.String(64), primary_key=True)
+    user_id = db.Column(
+        db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    membership_card_id = db.Column(
+        db.Integer, db.ForeignKey("membership_cards.id", ondelete="CASCADE")
+    )
+    content_hash = db.Column(db.String(64))
+    status = db.Column(db.String(16), index=True)
+    error = db.Column(db.String)
+    time_updated = db.Column(
+        db.DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
@@ -0,0 +1,211 @@
+import logging
+from datetime import datetime, timedelta
+
+from member_card.db import RoutingSession, db
+from member_card.models.annual_membership import (
+    ACTIVE_MEMBERSHIP_DURATION,
+    get_active_membership_cutoff,
+)
+from sqlalchemy import event, func, not_
+
+logger = logging.getLogger(__name__)
+
+DASHBOARD_STATS_ID = 1
+
+# An extra day of daily counts is kept to cover the active membership cutoff's (partially active) day itself
+DAILY_COUNT_RETENTION = ACTIVE_MEMBERSHIP_DURATION + timedelta(days=1)
+
+
+def get_dashboard_stats():
+    """The current admin dashboard stats snapshot.
+
+    Only ever reads, as this backs a replica-routed page. The snapshot is first computed by the migration adding its
+    table; should the row have since been removed, an empty (unsaved) one is returned until a recompute runs.
+    """
+    from member_card.models import DashboardStats
+
+    dashboard_stats = db.session.get(DashboardStats, DASHBOARD_STATS_ID)
+    if dashboard_stats is None:
+        dashboard_stats = DashboardStats(
+            id=DASHBOARD_STATS_ID,
+            num_memberships=0,
+            num_users=0,
+            daily_membership_counts={},
+        )
+    return dashboard_stats
+
+
+def get_daily_membership_counts(since):
+    """Number of (non-canceled) memberships created per day since `since`, keyed by ISO date"""
+    from member_card.models import AnnualMembership
+
+    created_on_day = func.date(AnnualMembership.created_on)
+    daily_counts = (
+        db.session.query(created_on_day, func.count(AnnualMembership.id))
+        .filter(
+            AnnualMembership.created_on >= since,
+            not_(AnnualMembership.is_canceled),
+        )
+        .group_by(created_on_day)
+    )
+    return {day.isoformat(): num_memberships for day, num_memberships in daily_counts}
+
+
+def compute_dashboard_stats():
+    """Build the admin dashboard stats snapshot from a full scan of annual_membership and users (without saving it)"""
+    from member_card.models import AnnualMembership, DashboardStats, User
+
+    logger.info("Recomputing admin dashboard stats from scratch...")
+    newest_membership = AnnualMembership.query.order_by(
+        AnnualMembership.created_on.desc()
+    ).first()
+    oldest_membership = AnnualMembership.query.order_by(
+        AnnualMembership.created_on.asc()
+    ).first()
+    dashboard_stats = DashboardStats(
+        id=DASHBOARD_STATS_ID,
+        num_memberships=AnnualMembership.query.count(),
+        num_users=User.query.count(),
+        daily_membership_counts=get_daily_membership_counts(
+            since=datetime.utcnow() - DAILY_COUNT_RETENTION
+        ),
+        time_recomputed=datetime.utcnow(),
+    )
+    dashboard_stats.set_newest_membership(newest_membership)
+    dashboard_stats.set_oldest_membership(oldest_membership)
+    return db.session.merge(dashboard_stats)
+
+
+def recompute_dashboard_stats():
+    """Rebuild and save the admin dashboard stats snapshot from a full scan of annual_membership and users"""
+    dashboard_stats = compute_dashboard_stats()
+    db.session.commit()
+    logger.debug(f"{dashboard_stats=}")
+    return dashboard_stats
+
+
+def update_dashboard_stats(memberships, previously_canceled_by_order_id):
+    """Fold freshly upserted AnnualMembership rows into the admin dashboard stats snapshot, without committing.
+
+    `previously_canceled_by_order_id` holds the pre-upsert `is_canceled` value of any memberships that already
+    existed; those are only counted as new if they weren't, and their daily counts follow any change in cancellation.
+    The snapshot row is locked for the update so concurrent ETL runs don't clobber each other's counts. If no snapshot
+    exists yet, one is computed from scratch instead (by which point it includes `memberships`).
+    """
+    from member_card.models import DashboardStats
+
+    memberships = [m for m in memberships if m.created_on is not None]
+    new_memberships = [
+        m for m in memberships if m.order_id not in previously_canceled_by_order_id
+    ]
+    daily_count_changes = {}
+    for membership in memberships:
+        was_counted = previously_canceled_by_order_id.get(membership.order_id) is False
+        is_counted = not membership.is_canceled
+        if was_counted != is_counted:
+            day = membership.created_on.date().isoformat()
+            daily_count_changes[day] = daily_count_changes.get(day, 0) + (
+                1 if is_counted else -1
+            )
+    if not new_memberships and not any(daily_count_changes.values()):
+        return None
+
+    dashboard_stats = (
+        db.session.query(DashboardStats)
+        .filter_by(id=DASHBOARD_STATS_ID)
+        .with_for_update()
+        .populate_existing()
+        .first()
+    )
+    if dashboard_stats is None:
+        return compute_dashboard_stats()
+
+    daily_membership_counts = dict(dashboard_stats.daily_membership_counts or {})
+    for day, num_memberships in daily_count_changes.items():
+        daily_membership_counts[day] = max(
+            daily_membership_counts.get(day, 0) + num_memberships, 0
+        )
+    for membership in new_memberships:
+        if (
+            dashboard_stats.newest_membership_created_on is None
+            or membership.created_on > dashboard_stats.newest_membership_created_on
+        ):
+            dashboard_stats.set_newest_membership(membership)
+        if (
+            dashboard_stats.oldest_membership_created_on is None
+            or membership.created_on < dashboard_stats.oldest_membership_created_on
+        ):
+            dashboard_stats.set_oldest_membership(membership)
+
+    retention_cutoff = (datetime.utcnow() - DAILY_COUNT_RETENTION).date()
+    dashboard_stats.daily_membership_counts = {
+        day: num_memberships
+        for day, num_memberships in daily_membership_counts.items()
+        if day >= retention_cutoff.isoformat()
+    }
+    dashboard_stats.num_memberships += len(new_memberships)
+    db.session.add(dashboard_stats)
+    logger.debug(
+        f"Recorded {len(new_memberships)} new membership(s) in admin dashboard stats"
+    )
+    return dashboard_stats
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def count_flushed_users(session, flush_context):
+    """Keep the dashboard stats' user count current as users are created and deleted through the app's ORM sessions"""
+    from member_card.models import DashboardStats, User
+
+    num_new_users = sum(1 for i in session.new if isinstance(i, User))
+    num_deleted_users = sum(1 for i in session.deleted if isinstance(i, User))
+    if num_new_users == num_deleted_users:
+        return
+    stats_table = DashboardStats.__table__
+    session.execute(
+        stats_table.update()
+        .where(stats_table.c.id == DASHBOARD_STATS_ID)
+        .values(num_users=stats_table.c.num_users + num_new_users - num_deleted_users)
+    )
+
+
+class DashboardStats(db.Model):
+    """Single-row snapshot of the admin dashboard's statistics, kept current by the membership ETL.
+
+    `daily_membership_counts` maps ISO dates to the number of memberships created that day, covering just enough days
+    to tally active memberships. Rebuild from scratch with `flask recompute-dashboard-stats` if it ever drifts.
+    """
+
+    __tablename__ = "dashboard_stats"
+    id = db.Column(db.Integer, primary_key=True)
+    num_memberships = db.Column(db.Integer, nullable=False, default=0)
+    num_users = db.Column(db.Integer, nullable=False, default=0)
+    daily_membership_counts = db.Column(db.JSON, nullable=False, default=dict)
+    newest_membership_id = db.Column(db.Integer)
+    newest_membership_created_on = db.Column(db.DateTime)
+    oldest_membership_id = db.Column(db.Integer)
+    oldest_membership_created_on = db.Column(db.DateTime)
+    time_recomputed = db.Column(db.DateTime)
+    time_updated = db.Column(
+        db.DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
+
+    def __repr__(self):
+        return f"<DashboardStats {self.num_memberships=} {self.num_users=} {self.time_updated=} >"
+
+    def set_newest_membership(self, membership):
+        self.newest_membership_id = membership and membership.id
+        self.newest_membership_created_on = membership and membership.created_on
+
+    def set_oldest_membership(self, membership):
+        self.oldest_membership_id = membership and membership.id
+        self.oldest_membership_created_on = membership and membership.created_on
+
+    @property
+    def num_active_memberships(self):
+        # Counts are per day, so memberships from the cutoff's own day (only some of which are still active) are left out
+        active_cutoff = get_active_membership_cutoff().date()
+        return sum(
+            num_memberships
+            for day, num_memberships in (self.daily_membership_counts or {}).items()
+            if day > active_cutoff.isoformat()
+        )
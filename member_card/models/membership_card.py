@@ -1,4 +1,6 @@
 # from logzero import logger
+import hashlib
+import json
 import logging
 import uuid
 from base64 import b64encode as b64e
@@ -16,52 +18,155 @@ from member_card.models.apple_device_registration import (
     membership_card_to_apple_device_assoc_table,
 )
 from member_card.utils import sign
+from sqlalchemy import inspect
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
 logger = logging.getLogger("member_card")
 REMOTE_CARD_IMAGE_BASE_PATH = "membership-cards/images"
+REMOTE_APPLE_PASS_BASE_PATH = "membership-cards/apple-passes"
 
 
-def get_or_create_membership_card(user):
+def get_membership_card_attrs(user):
     app = flask.current_app
     base_url = app.config["BASE_URL"]
-    web_service_url = f"{base_url}/passkit"
-    membership_card = get_or_create(
-        session=db.session,
-        model=MembershipCard,
+    return dict(
         user_id=user.id,
         apple_organization_name=app.config["APPLE_DEVELOPER_TEAM_ID"],
         apple_pass_type_identifier=app.config["APPLE_DEVELOPER_PASS_TYPE_ID"],
         apple_team_identifier=app.config["APPLE_DEVELOPER_TEAM_ID"],
         member_since=user.member_since,
         member_until=user.membership_expiry,
-        web_service_url=web_service_url,
+        web_service_url=f"{base_url}/passkit",
+    )
+
+
+def set_qr_code_message(membership_card):
+    if membership_card.serial_number is None:
+        membership_card.serial_number = uuid.uuid4()
+    qr_code_message = f"Content: {membership_card.verify_pass_url}"
+    logger.debug(f"{qr_code_message=}")
+    setattr(membership_card, "qr_code_message", qr_code_message)
+
+
+def get_membership_card(user):
+    """Read-only lookup of `user`'s card for their current membership period (or None if it hasn't been created yet).
+
+    Cards are created as memberships are written (see `ensure_membership_cards()`), so page views only need this one
+    query on the indexed user_id column.
+    """
+    return (
+        MembershipCard.query.filter_by(
+            user_id=user.id,
+            member_since=user.member_since,
+            member_until=user.membership_expiry,
+        )
+        .filter(MembershipCard.qr_code_message.isnot(None))
+        .order_by(MembershipCard.id.desc())
+        .first()
     )
-    db.session.add(membership_card)
-    db.session.commit()
 
-    # TODO: do this more efficient like:
+
+def get_membership_cards_by_user_id(users):
+    """Batched (read-only) `get_membership_card()`: each of `users`' current period card, keyed by user ID.
+
+    Users whose card hasn't been created yet are left out.
+    """
+    users_by_id = {user.id: user for user in users}
+    if not users_by_id:
+        return {}
+
+    membership_cards = (
+        MembershipCard.query.filter(
+            MembershipCard.user_id.in_(users_by_id),
+            MembershipCard.qr_code_message.isnot(None),
+        )
+        .order_by(MembershipCard.id.desc())
+        .all()
+    )
+    membership_cards_by_user_id = {}
+    for membership_card in membership_cards:
+        user = users_by_id[membership_card.user_id]
+        if (
+            membership_card.member_since == user.member_since
+            and membership_card.member_until == user.membership_expiry
+        ):
+            membership_cards_by_user_id.setdefault(user.id, membership_card)
+    return membership_cards_by_user_id
+
+
+def get_or_create_membership_card(user):
+    membership_card = get_or_create(
+        session=db.session,
+        model=MembershipCard,
+        **get_membership_card_attrs(user),
+    )
     if not membership_card.qr_code_message:
         logger.debug("generating QR code for message")
-        qr_code_message = f"Content: {membership_card.verify_pass_url}"
-        logger.debug(f"{qr_code_message=}")
-        setattr(membership_card, "qr_code_message", qr_code_message)
+        set_qr_code_message(membership_card)
+    if not inspect(membership_card).persistent or db.session.is_modified(
+        membership_card
+    ):
         db.session.add(membership_card)
         db.session.commit()
 
     return membership_card
 
 
+def ensure_membership_cards(user_ids):
+    """Create any missing current-period cards for those of `user_ids` with an active membership, committing once.
+
+    Called from the membership write paths (ETL runs and renewals) so page views can stick to `get_membership_card()`.
+    """
+    from member_card.models import User
+
+    user_ids = {i for i in user_ids if i is not None}
+    if not user_ids:
+        return []
+
+    members = User.query.filter(
+        User.id.in_(user_ids),
+        User.has_active_membership.is_(True),
+    ).all()
+    existing_cards = MembershipCard.query.filter(
+        MembershipCard.user_id.in_([m.id for m in members]),
+        MembershipCard.qr_code_message.isnot(None),
+    )
+    existing_card_keys = {
+        (c.user_id, c.member_since, c.member_until) for c in existing_cards
+    }
+
+    new_cards = []
+    for member in members:
+        if (
+            member.id,
+            member.member_since,
+            member.membership_expiry,
+        ) in existing_card_keys:
+            continue
+        membership_card = MembershipCard(**get_membership_card_attrs(member))
+        set_qr_code_message(membership_card)
+        db.session.add(membership_card)
+        new_cards.append(membership_card)
+
+    if new_cards:
+        db.session.commit()
+        logger.info(f"Created {len(new_cards)} new membership card(s)")
+    return new_cards
+
+
 class MembershipCard(db.Model):
     __tablename__ = "membership_cards"
 
     _google_pay_jwt = None
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True, unique=True)
-    serial_number = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    user_id = db.Column(db.Integer, db.ForeignKey("users.id"))
+    # Part of the composite primary key, but passkit / verify-pass lookups filter on it alone
+    serial_number = db.Column(
+        UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True
+    )
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), index=True)
     user = relationship(
         "User",
         back_populates="membership_cards",
@@ -156,14 +261,39 @@ class MembershipCard(db.Model):
     def serial_number_hex(self):
         return str(getattr(self.serial_number, "hex"))
 
+    @property
+    def content_hash_fields(self):
+        # Everything that ends up rendered on the card image / pass; any change here => new artifacts get generated
+        return dict(
+            name=self.user.fullname,
+            member_since=self.member_since and self.member_since.isoformat(),
+            member_until=self.member_until and self.member_until.isoformat(),
+            serial_number=self.serial_number_hex,
+            qr_code_message=self.qr_code_message,
+            template_version=flask.current_app.config["CARD_TEMPLATE_VERSION"],
+        )
+
+    @property
+    def content_hash(self):
+        serialized_fields = json.dumps(self.content_hash_fields, sort_keys=True)
+        return hashlib.sha256(serialized_fields.encode("utf-8")).hexdigest()
+
     @property
     def image_filename(self):
-        return f"{self.serial_number.hex}.png"
+        return f"{self.content_hash}.png"
 
     @property
     def remote_image_path(self):
         return f"{REMOTE_CARD_IMAGE_BASE_PATH}/{self.image_filename}"
 
+    @property
+    def apple_pass_filename(self):
+        return f"{self.content_hash}.pkpass"
+
+    @property
+    def remote_apple_pass_path(self):
+        return f"{REMOTE_APPLE_PASS_BASE_PATH}/{self.apple_pass_filename}"
+
     @property
     def qr_code_b64_png(self):
         qr = qrcode.QRCode()
@@ -0,0 +1,108 @@
+import uuid
+from datetime import timedelta
+
+from member_card.db import db, get_upsert_insert_func
+from sqlalchemy.sql import func
+
+
+def register_order_event(store_hash, order_id):
+    """Note another webhook event for the given order, returning an ID that identifies it as that order's latest event"""
+    from member_card.models import PendingOrderSync
+
+    event_id = uuid.uuid4().hex
+    table = PendingOrderSync.__table__
+    insert_stmt = get_upsert_insert_func(db.session)(table).values(
+        store_hash=store_hash,
+        order_id=str(order_id),
+        last_event_id=event_id,
+        num_events=1,
+    )
+    db.session.execute(
+        insert_stmt.on_conflict_do_update(
+            index_elements=["store_hash", "order_id"],
+            set_=dict(
+                last_event_id=insert_stmt.excluded.last_event_id,
+                num_events=table.c.num_events + 1,
+                last_event_at=func.now(),
+            ),
+        )
+    )
+    db.session.commit()
+    return event_id
+
+
+def claim_order_sync(store_hash, order_id, event_id):
+    """Claim the pending sync for an order if `event_id` is still its latest event.
+
+    Returns the number of events coalesced into this sync, or None if a later event has since superseded this one.
+    """
+    from member_card.models import PendingOrderSync
+
+    pending_order_sync = (
+        db.session.query(PendingOrderSync)
+        .filter_by(
+            store_hash=store_hash, order_id=str(order_id), last_event_id=event_id
+        )
+        .first()
+    )
+    if pending_order_sync is None:
+        return None
+    num_events = pending_order_sync.num_events
+
+    # Only delete the row if no other event has come in since we looked it up
+    num_deleted = (
+        db.session.query(PendingOrderSync)
+        .filter_by(
+            store_hash=store_hash, order_id=str(order_id), last_event_id=event_id
+        )
+        .delete(synchronize_session=False)
+    )
+    db.session.commit()
+    if not num_deleted:
+        return None
+    return num_events
+
+
+def get_due_order_syncs(store_hash, quiet_window_secs):
+    """Pending syncs for the store's orders that have not seen another event within the last `quiet_window_secs`"""
+    from member_card.models import PendingOrderSync
+
+    quiet_since = func.now() - timedelta(seconds=quiet_window_secs)
+    return (
+        db.session.query(PendingOrderSync)
+        .filter(
+            PendingOrderSync.store_hash == store_hash,
+            PendingOrderSync.last_event_at <= quiet_since,
+        )
+        .order_by(PendingOrderSync.last_event_at)
+        .all()
+    )
+
+
+def expire_stale_order_syncs(max_age_secs):
+    """Drop pending syncs first noted more than `max_age_secs` ago (e.g. orders that keep failing to load).
+
+    The regularly scheduled orders ETL picks up anything dropped here. Returns the number of expired rows.
+    """
+    from member_card.models import PendingOrderSync
+
+    expire_before = func.now() - timedelta(seconds=max_age_secs)
+    num_expired = (
+        db.session.query(PendingOrderSync)
+        .filter(PendingOrderSync.first_event_at < expire_before)
+        .delete(synchronize_session=False)
+    )
+    db.session.commit()
+    return num_expired
+
+
+class PendingOrderSync(db.Model):
+    """Webhook events received for an order that haven't yet been coalesced into a single sync of that order"""
+
+    __tablename__ = "pending_order_syncs"
+    store_hash = db.Column(db.String(32), primary_key=True)
+    order_id = db.Column(db.String(32), primary_key=True)
+    last_event_id = db.Column(db.String(32))
+    num_events = db.Column(db.Integer, default=1)
+    first_event_at = db.Column(db.DateTime(timezone=True), server_default=func.now())
+    last_event_at = db.Column(db.DateTime(timezone=True), server_default=func.now())
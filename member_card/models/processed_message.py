@@ -0,0 +1,12 @@
+from member_card.db import db
+from sqlalchemy.sql import func
+
+
+class ProcessedMessage(db.Model):
+    """Ledger of worker messages already handled, keyed by Pub/Sub message ID and/or a per-type idempotency key"""
+
+    __tablename__ = "processed_messages"
+    idempotency_key = db.Column(db.String, primary_key=True)
+    message_type = db.Column(db.String(64))
+    processed_at = db.Column(db.DateTime(timezone=True), server_default=func.now())
+    expires_at = db.Column(db.DateTime(timezone=True), index=True)
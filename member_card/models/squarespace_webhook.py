@@ -3,6 +3,11 @@ from sqlalchemy.dialects.postgresql import JSON
 
 
 class SquarespaceWebhook(db.Model):
+    __table_args__ = (
+        db.Index(
+            "ix_squarespace_webhook_webhook_id_website_id", "webhook_id", "website_id"
+        ),
+    )
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     webhook_id = db.Column(db.String, primary_key=True)
     account_id = db.Column(db.String)
@@ -68,6 +68,72 @@ def set_last_run_start_page(table_name, last_run_start_page):
     db.session.commit()
 
 
+def get_last_processed_id(table_name):
+    from member_card.models import TableMetadata
+
+    last_processed_id = (
+        db.session.query(TableMetadata)
+        .filter_by(
+            table_name=table_name,
+            attribute_name="last_processed_id",
+        )
+        .first()
+    )
+    if last_processed_id:
+        return int(last_processed_id.attribute_value)
+
+    return 0
+
+
+def set_last_processed_id(table_name, last_processed_id):
+    from member_card.models import TableMetadata
+
+    cursor_metadata = get_or_create(
+        session=db.session,
+        model=TableMetadata,
+        **dict(
+            table_name=table_name,
+            attribute_name="last_processed_id",
+        ),
+    )
+    setattr(cursor_metadata, "attribute_value", str(last_processed_id))
+    db.session.add(cursor_metadata)
+    db.session.commit()
+
+
+def get_failed_ids(table_name):
+    from member_card.models import TableMetadata
+
+    failed_ids = (
+        db.session.query(TableMetadata)
+        .filter_by(
+            table_name=table_name,
+            attribute_name="failed_ids",
+        )
+        .first()
+    )
+    if failed_ids and failed_ids.attribute_value:
+        return [int(i) for i in failed_ids.attribute_value.split(",")]
+
+    return []
+
+
+def set_failed_ids(table_name, failed_ids):
+    from member_card.models import TableMetadata
+
+    cursor_metadata = get_or_create(
+        session=db.session,
+        model=TableMetadata,
+        **dict(
+            table_name=table_name,
+            attribute_name="failed_ids",
+        ),
+    )
+    setattr(cursor_metadata, "attribute_value", ",".join(str(i) for i in failed_ids))
+    db.session.add(cursor_metadata)
+    db.session.commit()
+
+
 class TableMetadata(db.Model):
     __tablename__ = "table_metadata"
     table_name = db.Column(db.String, primary_key=True)
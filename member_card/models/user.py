@@ -1,7 +1,7 @@
-from datetime import timedelta
 import logging
-from member_card.db import db, get_or_create
-from sqlalchemy.orm import relationship, backref
+from member_card.db import db, get_instances_by_key, get_or_create
+from sqlalchemy import bindparam, case, event, false, func, inspect, not_
+from sqlalchemy.orm import Session, relationship, backref
 from flask_security import UserMixin, RoleMixin
 
 from flask_security import SQLAlchemySessionUserDatastore
@@ -22,22 +22,16 @@ def edit_user_name(user, new_first_name, new_last_name):
     return user
 
 
-def ensure_user(
-    email,
+def update_user_details(
+    user,
     first_name=None,
     last_name=None,
     username=None,
     password=None,
     bigcommerce_id=None,
 ):
-    user = get_or_create(
-        session=db.session,
-        model=User,
-        email=email,
-    )
-
     log_extra = dict(
-        email=email,
+        email=user.email,
         first_name=first_name,
         username=username,
         password=password,
@@ -76,11 +70,95 @@ def ensure_user(
         logger.debug(f"Setting bigcommerce_id for {user=} => {bigcommerce_id=}")
         setattr(user, "bigcommerce_id", bigcommerce_id)
 
+    return user
+
+
+def ensure_user(
+    email,
+    first_name=None,
+    last_name=None,
+    username=None,
+    password=None,
+    bigcommerce_id=None,
+):
+    user = get_or_create(
+        session=db.session,
+        model=User,
+        email=email,
+    )
+
+    update_user_details(
+        user=user,
+        first_name=first_name,
+        last_name=last_name,
+        username=username,
+        password=password,
+        bigcommerce_id=bigcommerce_id,
+    )
+
     db.session.add(user)
     db.session.commit()
     return user
 
 
+class UserResolver:
+    """Batch-friendly stand-in for `ensure_user()` used during ETL runs.
+
+    Users for a batch's emails are preloaded with a single `IN` query, missing users are created in-session, and
+    everything is flushed once via `flush()` (rather than a SELECT + COMMIT per row). Committing is left to the caller.
+    """
+
+    def __init__(self, session=None):
+        if session is None:
+            session = db.session
+        self.session = session
+        self.users_by_email = {}
+
+    def preload(self, emails):
+        emails_to_load = {e for e in emails if e not in self.users_by_email}
+        if not emails_to_load:
+            return
+        logger.debug(f"Preloading users for {len(emails_to_load)} email(s)...")
+        self.users_by_email.update(
+            get_instances_by_key(
+                session=self.session,
+                model=User,
+                key="email",
+                values=emails_to_load,
+            )
+        )
+
+    def resolve(
+        self,
+        email,
+        first_name=None,
+        last_name=None,
+        username=None,
+        password=None,
+        bigcommerce_id=None,
+    ):
+        if email not in self.users_by_email:
+            self.preload([email])
+        user = self.users_by_email.get(email)
+        if user is None:
+            logger.debug(f"Creating User with {email=}")
+            user = User(email=email)
+            self.session.add(user)
+            self.users_by_email[email] = user
+
+        return update_user_details(
+            user=user,
+            first_name=first_name,
+            last_name=last_name,
+            username=username,
+            password=password,
+            bigcommerce_id=bigcommerce_id,
+        )
+
+    def flush(self):
+        self.session.flush()
+
+
 roles_users = db.Table(
     "roles_users",
     db.Column("user_id", db.Integer(), db.ForeignKey("users.id")),
@@ -102,6 +180,161 @@ def get_user_or_none(email_address, log_extra=None):
     return user
 
 
+def get_active_member_ids_query(num_shards=1, shard_index=0):
+    """Distinct IDs of users with at least one active membership, optionally limited to one of `num_shards` shards"""
+    from member_card.models import AnnualMembership
+
+    active_member_ids = db.session.query(AnnualMembership.user_id).filter(
+        AnnualMembership.is_active
+    )
+    if num_shards > 1:
+        active_member_ids = active_member_ids.filter(
+            AnnualMembership.user_id % num_shards == shard_index
+        )
+    return active_member_ids.distinct()
+
+
+def count_active_members(num_shards=1, shard_index=0):
+    return get_active_member_ids_query(
+        num_shards=num_shards,
+        shard_index=shard_index,
+    ).count()
+
+
+def get_active_members_after(after_user_id, limit, num_shards=1, shard_index=0):
+    """Next `limit` users (ordered by ID, starting after `after_user_id`) with at least one active membership"""
+    from member_card.models import AnnualMembership
+
+    active_member_ids = (
+        get_active_member_ids_query(num_shards=num_shards, shard_index=shard_index)
+        .filter(AnnualMembership.user_id > after_user_id)
+        .order_by(AnnualMembership.user_id)
+        .limit(limit)
+    )
+    return User.query.filter(User.id.in_(active_member_ids)).order_by(User.id).all()
+
+
+def refresh_membership_summaries(user_ids, session=None):
+    """Recompute the denormalized membership summary columns for each of `user_ids` from their AnnualMembership rows.
+
+    Runs one aggregate query and one batched UPDATE; committing is left to the caller.
+    """
+    from member_card.models import AnnualMembership
+
+    if session is None:
+        session = db.session
+    user_ids = sorted({i for i in user_ids if i is not None})
+    if not user_ids:
+        return
+
+    summaries = session.query(
+        AnnualMembership.user_id,
+        func.min(AnnualMembership.created_on).label("oldest_created_on"),
+        # Canceled orders never extend a membership
+        func.max(
+            case(
+                (not_(AnnualMembership.is_canceled), AnnualMembership.expiry_date),
+                else_=None,
+            )
+        ).label("membership_expiry"),
+        func.count(AnnualMembership.id).label("membership_count"),
+        func.max(case((AnnualMembership.is_active, 1), else_=0)).label("num_active"),
+    ).filter(AnnualMembership.user_id.in_(user_ids))
+    summaries_by_user_id = {
+        s.user_id: s for s in summaries.group_by(AnnualMembership.user_id)
+    }
+
+    summary_rows = []
+    for user_id in user_ids:
+        summary = summaries_by_user_id.get(user_id)
+        summary_rows.append(
+            dict(
+                summary_user_id=user_id,
+                member_since=summary and summary.oldest_created_on,
+                membership_expiry=summary and summary.membership_expiry,
+                has_active_membership=bool(summary and summary.num_active),
+                membership_count=summary.membership_count if summary else 0,
+            )
+        )
+    users_table = User.__table__
+    session.execute(
+        users_table.update().where(users_table.c.id == bindparam("summary_user_id")),
+        summary_rows,
+    )
+
+    # Any of these users already loaded into the session now hold stale summary values
+    summary_attrs = [
+        "member_since",
+        "membership_expiry",
+        "has_active_membership",
+        "membership_count",
+    ]
+    for user_id in user_ids:
+        user = session.identity_map.get(session.identity_key(User, user_id))
+        if user is not None:
+            session.expire(user, summary_attrs)
+    logger.debug(f"Refreshed membership summaries for {len(user_ids)} user(s)")
+
+
+def backfill_membership_summaries(batch_size=1000):
+    """Refresh every user's membership summary, `batch_size` users (and one commit) at a time"""
+    num_users = 0
+    last_user_id = 0
+    while True:
+        user_ids = [
+            i
+            for (i,) in db.session.query(User.id)
+            .filter(User.id > last_user_id)
+            .order_by(User.id)
+            .limit(batch_size)
+        ]
+        if not user_ids:
+            break
+        refresh_membership_summaries(user_ids=user_ids)
+        db.session.commit()
+        num_users += len(user_ids)
+        last_user_id = user_ids[-1]
+        logger.info(f"Membership summaries backfilled for {num_users} user(s)...")
+    return num_users
+
+
+@event.listens_for(Session, "before_flush")
+def stash_flushed_membership_owners(session, flush_context, instances):
+    """Note which users own any existing memberships about to be modified or deleted, before the flush changes that"""
+    from member_card.models import AnnualMembership
+
+    membership_ids = [
+        m.id
+        for m in (*session.dirty, *session.deleted)
+        if isinstance(m, AnnualMembership) and m.id is not None
+    ]
+    if not membership_ids:
+        return
+    previous_user_ids = session.query(AnnualMembership.user_id).filter(
+        AnnualMembership.id.in_(membership_ids)
+    )
+    session.info.setdefault("membership_summary_user_ids", set()).update(
+        i for (i,) in previous_user_ids
+    )
+
+
+@event.listens_for(Session, "after_flush")
+def refresh_flushed_membership_summaries(session, flush_context):
+    """Keep User membership summaries current for AnnualMembership rows written through the ORM.
+
+    Core-level bulk writes (e.g. `upsert_memberships()`) bypass the flush and have `refresh_membership_summaries()`
+    called for them via `record_upserted_memberships()`.
+    """
+    from member_card.models import AnnualMembership
+
+    user_ids = session.info.pop("membership_summary_user_ids", set())
+    for instance in (*session.new, *session.dirty):
+        if isinstance(instance, AnnualMembership):
+            user_ids.update(inspect(instance).attrs.user_id.history.added)
+    if user_ids:
+        refresh_membership_summaries(user_ids=user_ids, session=session)
+
+
 class Role(db.Model, RoleMixin):
     id = db.Column(db.Integer(), primary_key=True)
     name = db.Column(db.String(80), unique=True)
@@ -127,7 +360,16 @@ class User(db.Model, UserMixin):
     membership_cards = relationship("MembershipCard", back_populates="user")
     slack_user = relationship("SlackUser", back_populates="user", uselist=False)
     store_users = relationship("StoreUser", backref="user")
-    bigcommerce_id = db.Column(db.Integer, nullable=True)
+    bigcommerce_id = db.Column(db.Integer, nullable=True, index=True)
+    # Denormalized from annual_memberships by `refresh_membership_summaries()` so page renders needn't load them
+    member_since = db.Column(db.DateTime, nullable=True)
+    membership_expiry = db.Column(db.DateTime, nullable=True)
+    has_active_membership = db.Column(
+        db.Boolean, nullable=False, default=False, server_default=false()
+    )
+    membership_count = db.Column(
+        db.Integer, nullable=False, default=0, server_default="0"
+    )
     roles = relationship(
         "Role",
         secondary="roles_users",
@@ -155,12 +397,20 @@ class User(db.Model, UserMixin):
 
     @property
     def has_active_memberships(self):
-        if not self.annual_memberships:
+        from member_card.models.annual_membership import (
+            MEMBERSHIP_DURATION,
+            get_active_membership_cutoff,
+        )
+
+        if not self.has_active_membership or self.membership_expiry is None:
             return False
-        return any(m.is_active for m in self.annual_memberships)
+        # The summary is only refreshed when memberships are written, so also check it hasn't lapsed since (by the same
+        # cutoff, grace period included, as AnnualMembership.is_active)
+        newest_created_on = self.membership_expiry - MEMBERSHIP_DURATION
+        return newest_created_on > get_active_membership_cutoff()
 
     def has_memberships(self):
-        return len(self.annual_memberships) > 0
+        return bool(self.membership_count)
 
     @property
     def latest_membership_card(self):
@@ -180,18 +430,6 @@ class User(db.Model, UserMixin):
             return None
         return sorted(self.annual_memberships, key=lambda x: x.created_on)[-1]
 
-    @property
-    def member_since(self):
-        if not self.oldest_membership:
-            return None
-        return self.oldest_membership.created_on
-
-    @property
-    def membership_expiry(self):
-        if not self.newest_membership:
-            return None
-        return self.newest_membership.created_on + timedelta(days=365)
-
 
 def add_role_to_user_by_email(user_email, role_name):
     logger.debug(f"{user_email=} => {role_name=}")
@@ -1,17 +1,21 @@
 import logging
-import tempfile
-from os.path import join
+import threading
 
-import flask
 from flask import current_app
-from member_card.db import db
-from member_card.passes.apple_wallet import tmp_apple_developer_key
-from member_card.gcp import upload_file_to_gcs, get_bucket
+from member_card.passes.apple_wallet import PassSigner
+from member_card.passes.cache import CachedPkpass, get_pkpass_cache
+from member_card.gcp import upload_bytes_to_gcs, get_bucket
+from member_card.models.card_artifact import get_card_artifact, record_card_artifact
 from member_card.utils import sign
 from wallet.models import Barcode, BarcodeFormat, Generic, Pass
 
 logger = logging.getLogger(__name__)
 
+APPLE_PASS_ARTIFACT_TYPE = "apple_pass"
+
+_pass_signer = None
+_pass_signer_lock = threading.Lock()
+
 
 class MemberCardPass(object):
     header = "Los Verdes Membership Card"
@@ -322,15 +326,6 @@ def create_passfile(membership_card):
             attr_value,
         )
 
-    # Including the icon and logo is necessary for the passbook to be valid.
-    static_dir = join(current_app.config["BASE_DIR"], "static")
-    for passfile_filename, local_filename in AppleWalletPass.passfile_files.items():
-        file_path = join(static_dir, local_filename)
-        logger.debug(
-            f"adding {file_path} as pass file: {passfile_filename}", extra=log_extra
-        )
-        passfile.addFile(passfile_filename, open(file_path, "rb"))
-
     logger.debug(
         f"Pass() for {membership_card.apple_pass_serial_number} ({str(membership_card.serial_number)}) successfully created!",
         extra=log_extra,
@@ -338,69 +333,91 @@ def create_passfile(membership_card):
     return passfile
 
 
-def create_pkpass(membership_card, key_filepath, key_password, pkpass_out_path=None):
-    serial_number = membership_card.id
-    cert_dir = join(current_app.config["BASE_DIR"], "certificates")
-    cert_filepath = join(cert_dir, "certificate.pem")
-    wwdr_cert_filepath = join(cert_dir, "wwdr.pem")
+def get_pass_signer():
+    global _pass_signer
+    with _pass_signer_lock:
+        if _pass_signer is None:
+            # Including the icon and logo is necessary for the passbook to be valid.
+            _pass_signer = PassSigner.from_app_config(
+                config=current_app.config,
+                passfile_files=AppleWalletPass.passfile_files,
+            )
+        return _pass_signer
+
+
+def create_pkpass(membership_card, pass_signer=None):
+    if pass_signer is None:
+        pass_signer = get_pass_signer()
     log_extra = dict(
         apple_serial_number=membership_card.apple_pass_serial_number,
         serial_number=membership_card.serial_number_hex,
         pass_type_identifier=membership_card.apple_pass_type_identifier,
-        signing_cert_details=dict(
-            cert_filepath=cert_filepath,
-            key_filepath=key_filepath,
-            wwdr_cert_filepath=wwdr_cert_filepath,
-        ),
     )
     logger.debug(
-        f"Creating passfile with {membership_card.apple_pass_type_identifier=} {serial_number=}",
+        f"Creating passfile with {membership_card.apple_pass_type_identifier=} {membership_card.id=}",
         extra=log_extra,
     )
     passfile = create_passfile(membership_card)
-    pkpass_string_buffer = passfile.create(
-        certificate=cert_filepath,
-        key=key_filepath,
-        wwdr_certificate=wwdr_cert_filepath,
-        password=key_password,
-        zip_file=pkpass_out_path,
-    )
-    return pkpass_string_buffer
+    return pass_signer.create_pkpass(passfile)
 
 
-def get_apple_pass_from_card(membership_card):
-    db.session.add(membership_card)
-    db.session.commit()
+def create_cached_pkpass(membership_card):
+    return CachedPkpass(
+        data=create_pkpass(membership_card),
+        last_modified=membership_card.time_updated or membership_card.time_created,
+    )
 
-    _, pkpass_out_path = tempfile.mkstemp()
-    with tmp_apple_developer_key() as key_filepath:
-        create_pkpass(
-            membership_card=membership_card,
-            key_filepath=key_filepath,
-            key_password=flask.current_app.config["APPLE_PASS_PRIVATE_KEY_PASSWORD"],
-            pkpass_out_path=pkpass_out_path,
-        )
-    return pkpass_out_path
+
+def get_cached_apple_pass(membership_card):
+    cache_key = (
+        membership_card.serial_number_hex,
+        membership_card.time_updated,
+        membership_card.content_hash,
+    )
+    return get_pkpass_cache().get_or_create(
+        key=cache_key,
+        create_func=lambda: create_cached_pkpass(membership_card),
+    )
 
 
 def generate_and_upload_apple_pass(membership_card):
-    local_apple_pass_path = get_apple_pass_from_card(membership_card)
-    remote_apple_pass_path = f"membership-cards/apple-passes/{membership_card.apple_pass_serial_number}.pkpass"
-    blob = upload_file_to_gcs(
+    cached_pkpass = get_cached_apple_pass(membership_card)
+    remote_apple_pass_path = membership_card.remote_apple_pass_path
+    blob = upload_bytes_to_gcs(
         bucket=get_bucket(),
-        local_file=local_apple_pass_path,
+        data=cached_pkpass.data,
         remote_path=remote_apple_pass_path,
         content_type="application/vnd.apple.pkpass",
     )
     apple_pass_url = f"{blob.bucket.id}/{remote_apple_pass_path}"
     logger.info(
-        f"{local_apple_pass_path=} uploaded for {membership_card.apple_pass_serial_number} ({str(membership_card.serial_number)})",
+        f"{remote_apple_pass_path=} uploaded for {membership_card.apple_pass_serial_number} ({str(membership_card.serial_number)})",
         extra=dict(
             bucket=str(blob.bucket),
-            local_apple_pass_path=local_apple_pass_path,
             remote_apple_pass_path=remote_apple_pass_path,
             apple_pass_url=apple_pass_url,
             blob=str(blob),
         ),
     )
     return apple_pass_url
+
+
+def ensure_uploaded_apple_pass(membership_card):
+    remote_apple_pass_path = membership_card.remote_apple_pass_path
+    card_artifact = get_card_artifact(
+        content_hash=membership_card.content_hash,
+        artifact_type=APPLE_PASS_ARTIFACT_TYPE,
+    )
+    if card_artifact is not None:
+        logger.info(
+            f"{remote_apple_pass_path} previously generated for {membership_card.apple_pass_serial_number} (content unchanged), skipping signing"
+        )
+        return f"{current_app.config['GCS_BUCKET_ID']}/{remote_apple_pass_path}"
+
+    apple_pass_url = generate_and_upload_apple_pass(membership_card)
+    record_card_artifact(
+        membership_card=membership_card,
+        artifact_type=APPLE_PASS_ARTIFACT_TYPE,
+        remote_path=remote_apple_pass_path,
+    )
+    return apple_pass_url
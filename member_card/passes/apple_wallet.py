@@ -1,27 +1,112 @@
+import hashlib
+import json
 import logging
 import os
-import tempfile
-from contextlib import contextmanager
+import zipfile
+from io import BytesIO
 
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.serialization import pkcs7
 from flask import current_app
+from wallet.models import PassHandler
 
 logger = logging.getLogger(__name__)
 
 
-@contextmanager
-def tmp_apple_developer_key():
+def apple_developer_key_configured():
+    return os.path.exists(current_app.config["APPLE_KEY_FILEPATH"]) or bool(
+        current_app.config.get("APPLE_DEVELOPER_PRIVATE_KEY")
+    )
+
+
+def load_apple_developer_key():
     key_filepath = current_app.config["APPLE_KEY_FILEPATH"]
     if os.path.exists(key_filepath):
-        yield key_filepath
-        return
+        with open(key_filepath, "rb") as key_fp:
+            return key_fp.read()
 
+    logger.info("Loading Apple developer key from app config")
     unformatted_key = current_app.config.get("APPLE_DEVELOPER_PRIVATE_KEY")
-    with tempfile.NamedTemporaryFile(mode="w", suffix=".key") as key_fp:
-        logger.info(
-            f"Stashing Apple developer key under a temporary file {key_fp.name=}"
+    formatted_key = "\n".join(unformatted_key.split("\\n"))
+    return formatted_key.encode("utf-8")
+
+
+class PassSigner(object):
+    """Holds the parsed pass signing certificates / key and pass asset bytes so .pkpass files can be built in memory"""
+
+    def __init__(
+        self,
+        certificate_pem,
+        wwdr_certificate_pem,
+        private_key_pem,
+        private_key_password,
+        passfile_assets,
+    ):
+        self.certificate = x509.load_pem_x509_certificate(certificate_pem)
+        self.wwdr_certificate = x509.load_pem_x509_certificate(wwdr_certificate_pem)
+        self.private_key = serialization.load_pem_private_key(
+            private_key_pem,
+            password=private_key_password.encode("utf-8")
+            if private_key_password
+            else None,
+        )
+        self.passfile_assets = dict(passfile_assets)
+        # The asset portion of each pass' manifest never changes, so hash those files up front
+        self.asset_hashes = {
+            filename: hashlib.sha1(filedata).hexdigest()
+            for filename, filedata in self.passfile_assets.items()
+        }
+
+    @classmethod
+    def from_app_config(cls, config, passfile_files):
+        cert_dir = os.path.join(config["BASE_DIR"], "certificates")
+        static_dir = os.path.join(config["BASE_DIR"], "static")
+
+        def read_file(file_path):
+            logger.debug(f"Loading {file_path} for pass signing")
+            with open(file_path, "rb") as fp:
+                return fp.read()
+
+        return cls(
+            certificate_pem=read_file(os.path.join(cert_dir, "certificate.pem")),
+            wwdr_certificate_pem=read_file(os.path.join(cert_dir, "wwdr.pem")),
+            private_key_pem=load_apple_developer_key(),
+            private_key_password=config["APPLE_PASS_PRIVATE_KEY_PASSWORD"],
+            passfile_assets={
+                passfile_filename: read_file(os.path.join(static_dir, local_filename))
+                for passfile_filename, local_filename in passfile_files.items()
+            },
         )
-        formatted_key = "\n".join(unformatted_key.split("\\n"))
-        key_fp.write(formatted_key)
-        key_fp.seek(0)
-        yield key_fp.name
-        return
+
+    def create_manifest(self, pass_json):
+        manifest = dict(self.asset_hashes)
+        manifest["pass.json"] = hashlib.sha1(pass_json).hexdigest()
+        return json.dumps(manifest).encode("utf-8")
+
+    def sign_manifest(self, manifest):
+        return (
+            pkcs7.PKCS7SignatureBuilder()
+            .set_data(manifest)
+            .add_signer(self.certificate, self.private_key, hashes.SHA256())
+            .add_certificate(self.wwdr_certificate)
+            .sign(
+                serialization.Encoding.DER,
+                [pkcs7.PKCS7Options.DetachedSignature, pkcs7.PKCS7Options.Binary],
+            )
+        )
+
+    def create_pkpass(self, passfile):
+        """Return the signed .pkpass (zip archive) bytes for a `wallet.models.Pass` instance"""
+        pass_json = json.dumps(passfile, default=PassHandler).encode("utf-8")
+        manifest = self.create_manifest(pass_json)
+        signature = self.sign_manifest(manifest)
+
+        pkpass_buffer = BytesIO()
+        with zipfile.ZipFile(pkpass_buffer, "w") as zf:
+            zf.writestr("signature", signature)
+            zf.writestr("manifest.json", manifest)
+            zf.writestr("pass.json", pass_json)
+            for filename, filedata in self.passfile_assets.items():
+                zf.writestr(filename, filedata)
+        return pkpass_buffer.getvalue()
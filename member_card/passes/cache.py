@@ -0,0 +1,119 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from time import monotonic
+
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+_pkpass_cache = None
+_pkpass_cache_lock = threading.Lock()
+
+
+class CachedPkpass(object):
+    def __init__(self, data, last_modified):
+        self.data = data
+        self.last_modified = last_modified
+        self.etag = hashlib.sha256(data).hexdigest()
+        self.cached_at = monotonic()
+
+    @property
+    def size(self):
+        return len(self.data)
+
+
+class PkpassCache(object):
+    """LRU cache of signed .pkpass bytes, bounded by total size in bytes with entries expiring after `ttl_secs`"""
+
+    def __init__(self, max_bytes, ttl_secs):
+        self.max_bytes = max_bytes
+        self.ttl_secs = ttl_secs
+        self.num_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            cached_pkpass = self._entries.get(key)
+            if cached_pkpass is not None and self._is_expired(cached_pkpass):
+                self._remove(key)
+                self.expirations += 1
+                cached_pkpass = None
+            if cached_pkpass is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return cached_pkpass
+
+    def set(self, key, cached_pkpass):
+        if cached_pkpass.size > self.max_bytes:
+            logger.warning(
+                f"Not caching {key=}: {cached_pkpass.size=} exceeds {self.max_bytes=}"
+            )
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            while (
+                self._entries and self.num_bytes + cached_pkpass.size > self.max_bytes
+            ):
+                evicted_key, evicted_pkpass = self._entries.popitem(last=False)
+                self.num_bytes -= evicted_pkpass.size
+                self.evictions += 1
+                logger.debug(f"Evicted {evicted_key=} from pkpass cache")
+            self._entries[key] = cached_pkpass
+            self.num_bytes += cached_pkpass.size
+
+    def get_or_create(self, key, create_func):
+        cached_pkpass = self.get(key)
+        if cached_pkpass is None:
+            # Signing happens outside of the lock so concurrent misses for other passes aren't held up behind it
+            cached_pkpass = create_func()
+            self.set(key, cached_pkpass)
+        return cached_pkpass
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.num_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return dict(
+                entries=len(self._entries),
+                num_bytes=self.num_bytes,
+                max_bytes=self.max_bytes,
+                ttl_secs=self.ttl_secs,
+                hits=self.hits,
+                misses=self.misses,
+                evictions=self.evictions,
+                expirations=self.expirations,
+            )
+
+    def _is_expired(self, cached_pkpass):
+        return monotonic() - cached_pkpass.cached_at > self.ttl_secs
+
+    def _remove(self, key):
+        cached_pkpass = self._entries.pop(key)
+        self.num_bytes -= cached_pkpass.size
+
+
+def get_pkpass_cache():
+    global _pkpass_cache
+    with _pkpass_cache_lock:
+        if _pkpass_cache is None:
+            _pkpass_cache = PkpassCache(
+                max_bytes=current_app.config["PKPASS_CACHE_MAX_BYTES"],
+                ttl_secs=current_app.config["PKPASS_CACHE_TTL_SECS"],
+            )
+        return _pkpass_cache
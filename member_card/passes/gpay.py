@@ -265,6 +265,22 @@ class GooglePayApiClient(object):
             vertical_type=vertical_type,
         )
 
+    def patch_object(self, object_id, payload, vertical_type="loyalty"):
+        logger.debug(
+            f"Making REST call to patch object {object_id=}",
+            extra=dict(
+                object_id=object_id, payload=payload, vertical_type=vertical_type
+            ),
+        )
+
+        return self.request(
+            method="patch",
+            resource_type="object",
+            resource_id=object_id,
+            json_payload=payload,
+            vertical_type=vertical_type,
+        )
+
 
 def modify_pass_class(pass_class=GooglePayPassClass, operation="patch"):
     class_id = current_app.config["GOOGLE_PAY_PASS_CLASS_ID"]
@@ -352,3 +368,25 @@ def generate_pass_jwt(membership_card):
 
     # See https://developers.google.com/pay/passes/guides/get-started/implementing-the-api/save-to-google-pay#add-link-to-email
     return signed_jwt
+
+
+def upsert_pass_object(membership_card, gpay_client=None):
+    """Insert the card's Google pass object, or patch it in place if it already exists (e.g., when reissuing cards)"""
+    if gpay_client is None:
+        gpay_client = new_client()
+
+    class_id = current_app.config["GOOGLE_PAY_PASS_CLASS_ID"]
+    pass_object_payload = GooglePayPassObject(class_id, membership_card).to_dict()
+    object_id = pass_object_payload["id"]
+    response = gpay_client.insert_object(
+        object_id=object_id,
+        payload=pass_object_payload,
+    )
+    if response.status_code == 409:
+        logger.debug(f"{object_id=} already exists, patching it instead")
+        response = gpay_client.patch_object(
+            object_id=object_id,
+            payload=pass_object_payload,
+        )
+    response.raise_for_status()
+    return response
@@ -0,0 +1,113 @@
+import logging
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+_current_query_stats = ContextVar("current_query_stats", default=None)
+
+
+class QueryStats(object):
+    """Running tally of the SQL statements (and time spent on them) issued while tracking a request or worker message.
+
+    Statements are also recorded against any enclosing `QueryStats` (`parent`), so outer tracking (e.g. a test's query
+    budget) still sees everything issued by tracking nested within it (e.g. the request it makes).
+    """
+
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.num_statements = 0
+        self.total_duration_secs = 0.0
+        self.statement_counts = Counter()
+
+    def record(self, statement, duration_secs):
+        self.num_statements += 1
+        self.total_duration_secs += duration_secs
+        self.statement_counts[statement] += 1
+        if self.parent is not None:
+            self.parent.record(statement, duration_secs)
+
+    @property
+    def total_duration_ms(self):
+        return self.total_duration_secs * 1000
+
+    def repeated_statements(self, threshold):
+        """Statements issued at least `threshold` times; usually a relationship being lazy-loaded one row at a time"""
+        return {
+            statement: num_executions
+            for statement, num_executions in self.statement_counts.most_common()
+            if num_executions >= threshold
+        }
+
+    def to_log_extra(self):
+        return dict(
+            db_num_statements=self.num_statements,
+            db_total_duration_ms=round(self.total_duration_ms, 3),
+        )
+
+    def log(self, description, n_plus_one_threshold, log_extra=None):
+        log_extra = dict(log_extra or {}, **self.to_log_extra())
+        logger.info(
+            f"{description} issued {self.num_statements} SQL statement(s) in {self.total_duration_ms:.1f}ms",
+            extra=log_extra,
+        )
+        repeated_statements = self.repeated_statements(threshold=n_plus_one_threshold)
+        for statement, num_executions in repeated_statements.items():
+            logger.warning(
+                f"Possible N+1 query: {description} issued the same statement {num_executions} times: {statement}",
+                extra=dict(
+                    log_extra,
+                    db_repeated_statement=statement,
+                    db_num_repeats=num_executions,
+                ),
+            )
+
+
+def get_query_stats():
+    return _current_query_stats.get()
+
+
+def start_tracking_queries():
+    """Begin tracking statements in the current context; returns a token for `stop_tracking_queries()`"""
+    return _current_query_stats.set(QueryStats(parent=_current_query_stats.get()))
+
+
+def stop_tracking_queries(token):
+    _current_query_stats.reset(token)
+
+
+@contextmanager
+def track_queries():
+    token = start_tracking_queries()
+    try:
+        yield get_query_stats()
+    finally:
+        stop_tracking_queries(token)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def start_statement_timer(conn, cursor, statement, parameters, context, executemany):
+    if _current_query_stats.get() is not None:
+        conn.info.setdefault("query_stats_started_at", []).append(perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def record_statement(conn, cursor, statement, parameters, context, executemany):
+    query_stats = _current_query_stats.get()
+    started_at = conn.info.get("query_stats_started_at")
+    if query_stats is None or not started_at:
+        return
+    query_stats.record(statement, perf_counter() - started_at.pop())
+
+
+@event.listens_for(Engine, "handle_error")
+def discard_statement_timer(exception_context):
+    conn = exception_context.connection
+    started_at = conn is not None and conn.info.get("query_stats_started_at")
+    if started_at:
+        started_at.pop()
@@ -0,0 +1,288 @@
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import uuid
+from collections import defaultdict
+from concurrent import futures
+from time import monotonic, sleep, time
+
+from flask import current_app
+
+from member_card import gcp
+
+logger = logging.getLogger(__name__)
+
+_queue_backend = None
+_queue_backend_lock = threading.Lock()
+
+
+class QueuedMessage(object):
+    def __init__(self, message_id, message_data, attempts=0):
+        self.message_id = message_id
+        self.message_data = message_data
+        self.attempts = attempts
+
+
+def completed_future(result):
+    future = futures.Future()
+    future.set_result(result)
+    return future
+
+
+class QueueBackend(object):
+    """Base class for the message queue backends selectable via the `QUEUE_BACKEND` setting"""
+
+    def publish_many(self, project_id, topic_id, messages):
+        raise NotImplementedError
+
+    def receive(self, topic_id, max_messages=1, timeout_secs=1):
+        raise NotImplementedError(
+            f"{self.__class__.__name__} messages are consumed via push subscriptions"
+        )
+
+    def ack(self, topic_id, message_id):
+        raise NotImplementedError
+
+    def nack(self, topic_id, message_id):
+        raise NotImplementedError
+
+
+class GcpQueueBackend(QueueBackend):
+    def publish_many(self, project_id, topic_id, messages):
+        return gcp.publish_many(
+            project_id=project_id,
+            topic_id=topic_id,
+            messages=messages,
+        )
+
+
+class InMemoryQueueBackend(QueueBackend):
+    """Per-process queues; handy for tests and benchmarking the worker handlers without any I/O of our own"""
+
+    def __init__(self):
+        self._queues = defaultdict(queue.Queue)
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def publish_many(self, project_id, topic_id, messages):
+        publish_futures = []
+        for message_data in messages:
+            message_id = uuid.uuid4().hex
+            self._queues[topic_id].put(
+                QueuedMessage(
+                    message_id=message_id,
+                    message_data=json.loads(json.dumps(message_data)),
+                )
+            )
+            publish_futures.append(completed_future(message_id))
+        return publish_futures
+
+    def receive(self, topic_id, max_messages=1, timeout_secs=1):
+        received = []
+        topic_queue = self._queues[topic_id]
+        try:
+            received.append(topic_queue.get(timeout=timeout_secs))
+            while len(received) < max_messages:
+                received.append(topic_queue.get_nowait())
+        except queue.Empty:
+            pass
+        with self._lock:
+            for queued_message in received:
+                queued_message.attempts += 1
+                self._in_flight[queued_message.message_id] = queued_message
+        return received
+
+    def ack(self, topic_id, message_id):
+        with self._lock:
+            self._in_flight.pop(message_id, None)
+
+    def nack(self, topic_id, message_id):
+        with self._lock:
+            queued_message = self._in_flight.pop(message_id, None)
+        if queued_message is not None:
+            self._queues[topic_id].put(queued_message)
+
+
+class SqliteQueueBackend(QueueBackend):
+    """Durable local queue stored in a SQLite database file; received messages are leased until acked / nacked.
+
+    Messages get uuid4 IDs rather than exposing their rowids, which SQLite reuses once the queue file is recreated and
+    would otherwise look like redeliveries to the processed message ledger.
+    """
+
+    def __init__(self, database_path, lease_secs=60):
+        self.database_path = database_path
+        self.lease_secs = lease_secs
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(database_path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS queued_messages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    message_id TEXT NOT NULL UNIQUE,
+                    topic_id TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    leased_until REAL NOT NULL DEFAULT 0
+                )
+                """
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS ix_queued_messages_topic_lease ON queued_messages (topic_id, leased_until)"
+            )
+
+    def publish_many(self, project_id, topic_id, messages):
+        message_ids = []
+        with self._lock, self._connection:
+            for message_data in messages:
+                message_id = uuid.uuid4().hex
+                self._connection.execute(
+                    "INSERT INTO queued_messages (message_id, topic_id, data) VALUES (?, ?, ?)",
+                    (message_id, topic_id, json.dumps(message_data)),
+                )
+                message_ids.append(message_id)
+        return [completed_future(message_id) for message_id in message_ids]
+
+    def receive(self, topic_id, max_messages=1, timeout_secs=1):
+        deadline = monotonic() + timeout_secs
+        while True:
+            received = self._lease(topic_id, max_messages)
+            if received or monotonic() >= deadline:
+                return received
+            sleep(min(0.05, max(0, deadline - monotonic())))
+
+    def ack(self, topic_id, message_id):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "DELETE FROM queued_messages WHERE message_id = ?", (message_id,)
+            )
+
+    def nack(self, topic_id, message_id):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "UPDATE queued_messages SET leased_until = 0 WHERE message_id = ?",
+                (message_id,),
+            )
+
+    def _lease(self, topic_id, max_messages):
+        now = time()
+        with self._lock, self._connection:
+            rows = self._connection.execute(
+                "SELECT id, message_id, data, attempts FROM queued_messages WHERE topic_id = ? AND leased_until < ? ORDER BY id LIMIT ?",
+                (topic_id, now, max_messages),
+            ).fetchall()
+            self._connection.executemany(
+                "UPDATE queued_messages SET leased_until = ?, attempts = attempts + 1 WHERE id = ?",
+                [(now + self.lease_secs, row[0]) for row in rows],
+            )
+        return [
+            QueuedMessage(
+                message_id=row[1],
+                message_data=json.loads(row[2]),
+                attempts=row[3] + 1,
+            )
+            for row in rows
+        ]
+
+
+QUEUE_BACKENDS = {
+    "gcp": GcpQueueBackend,
+    "memory": InMemoryQueueBackend,
+    "sqlite": SqliteQueueBackend,
+}
+
+
+def get_queue_backend():
+    global _queue_backend
+    with _queue_backend_lock:
+        if _queue_backend is None:
+            backend_name = current_app.config["QUEUE_BACKEND"]
+            if backend_name not in QUEUE_BACKENDS:
+                raise NotImplementedError(
+                    f"No queue backend available for {backend_name=}"
+                )
+            backend_kwargs = {}
+            if backend_name == "sqlite":
+                backend_kwargs["database_path"] = current_app.config[
+                    "QUEUE_SQLITE_PATH"
+                ]
+            _queue_backend = QUEUE_BACKENDS[backend_name](**backend_kwargs)
+        return _queue_backend
+
+
+def publish_many(project_id, topic_id, messages):
+    return get_queue_backend().publish_many(
+        project_id=project_id,
+        topic_id=topic_id,
+        messages=messages,
+    )
+
+
+def publish_message(project_id, topic_id, message_data):
+    publish_futures = publish_many(
+        project_id=project_id,
+        topic_id=topic_id,
+        messages=[message_data],
+    )
+
+    # Wait for all the publish futures to resolve before exiting.
+    futures.wait(publish_futures, return_when=futures.ALL_COMPLETED)
+
+    logger.info(f"Published message to {topic_id=}.")
+
+
+def run_local_consumer(
+    dispatch_func,
+    queue_backend,
+    topic_id,
+    max_messages=None,
+    batch_size=10,
+    idle_timeout_secs=5,
+    max_attempts=5,
+):
+    """Pull messages off of `queue_backend` and hand each to `dispatch_func` until `max_messages` have been handled or
+    the queue has sat empty for `idle_timeout_secs`. Returns throughput stats for the run.
+    """
+    stats = dict(num_processed=0, num_failed=0, num_dropped=0)
+    start_time = monotonic()
+    while max_messages is None or stats["num_processed"] < max_messages:
+        if max_messages is not None:
+            batch_size = min(batch_size, max_messages - stats["num_processed"])
+        received = queue_backend.receive(
+            topic_id=topic_id,
+            max_messages=batch_size,
+            timeout_secs=idle_timeout_secs,
+        )
+        if not received:
+            logger.info(f"No messages received in {idle_timeout_secs=}, stopping...")
+            break
+        for queued_message in received:
+            try:
+                dispatch_func(
+                    message=queued_message.message_data,
+                    message_id=queued_message.message_id,
+                )
+            except Exception as err:
+                logger.exception(
+                    f"Failed to process {queued_message.message_id=} ({queued_message.attempts=}): {err=}"
+                )
+                stats["num_failed"] += 1
+                if queued_message.attempts >= max_attempts:
+                    stats["num_dropped"] += 1
+                    queue_backend.ack(topic_id, queued_message.message_id)
+                else:
+                    queue_backend.nack(topic_id, queued_message.message_id)
+                continue
+            queue_backend.ack(topic_id, queued_message.message_id)
+            stats["num_processed"] += 1
+
+    elapsed_secs = monotonic() - start_time
+    stats["elapsed_secs"] = round(elapsed_secs, 3)
+    stats["messages_per_sec"] = (
+        round(stats["num_processed"] / elapsed_secs, 2) if elapsed_secs else 0
+    )
+    logger.info(f"Local consumer finished: {stats=}")
+    return stats
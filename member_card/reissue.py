@@ -0,0 +1,236 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import partial
+from time import monotonic
+
+from flask import current_app
+
+from member_card.db import db
+from member_card.gcp import get_bucket
+from member_card.image import (
+    CARD_IMAGE_ARTIFACT_TYPE,
+    ensure_uploaded_card_image,
+    generate_and_upload_card_image,
+)
+from member_card.models import User
+from member_card.models.card_artifact import record_card_artifact
+from member_card.models.card_reissue import (
+    CARD_REISSUE_COMPLETED,
+    CARD_REISSUE_FAILED,
+    count_reissued_cards,
+    get_reissued_user_ids,
+    record_card_reissue,
+)
+from member_card.models.membership_card import (
+    ensure_membership_cards,
+    get_membership_card,
+)
+from member_card.models.user import count_active_members, get_active_members_after
+from member_card.passes import (
+    APPLE_PASS_ARTIFACT_TYPE,
+    ensure_uploaded_apple_pass,
+    generate_and_upload_apple_pass,
+    gpay,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class ReissueProgress(object):
+    """Running tally of a reissue run, with throughput and an ETA for whatever remains of it"""
+
+    def __init__(self, num_total, num_previously_completed=0, report_interval_secs=10):
+        self.num_total = num_total
+        self.num_previously_completed = num_previously_completed
+        self.report_interval_secs = report_interval_secs
+        self.num_completed = 0
+        self.num_failed = 0
+        self.started_at = monotonic()
+        self._last_reported_at = self.started_at
+
+    @property
+    def num_processed(self):
+        return self.num_completed + self.num_failed
+
+    @property
+    def num_remaining(self):
+        return max(
+            0, self.num_total - self.num_previously_completed - self.num_processed
+        )
+
+    @property
+    def cards_per_sec(self):
+        elapsed_secs = monotonic() - self.started_at
+        if elapsed_secs <= 0:
+            return 0.0
+        return self.num_processed / elapsed_secs
+
+    @property
+    def eta(self):
+        cards_per_sec = self.cards_per_sec
+        if not cards_per_sec:
+            return None
+        return timedelta(seconds=round(self.num_remaining / cards_per_sec))
+
+    def record(self, status):
+        if status == CARD_REISSUE_COMPLETED:
+            self.num_completed += 1
+        else:
+            self.num_failed += 1
+
+    def report(self, force=False):
+        now = monotonic()
+        if not force and now - self._last_reported_at < self.report_interval_secs:
+            return
+        self._last_reported_at = now
+        logger.info(
+            f"Reissued {self.num_previously_completed + self.num_completed}/{self.num_total} cards "
+            f"({self.num_failed} failed) at {self.cards_per_sec:.2f} cards/sec, ETA: {self.eta}",
+            extra=self.to_dict(),
+        )
+
+    def to_dict(self):
+        return dict(
+            num_total=self.num_total,
+            num_previously_completed=self.num_previously_completed,
+            num_completed=self.num_completed,
+            num_failed=self.num_failed,
+            num_remaining=self.num_remaining,
+            cards_per_sec=self.cards_per_sec,
+            eta_secs=None if self.eta is None else self.eta.total_seconds(),
+        )
+
+
+def reissue_card_artifacts(membership_card, force=False, gpay_client=None):
+    """Regenerate and upload the card's image, Apple pass and Google pass object.
+
+    Without `force`, images and passes whose content hash has already been uploaded are left as-is.
+    """
+    if force:
+        generate_and_upload_card_image(
+            image_bucket=get_bucket(),
+            membership_card=membership_card,
+        )
+        record_card_artifact(
+            membership_card=membership_card,
+            artifact_type=CARD_IMAGE_ARTIFACT_TYPE,
+            remote_path=membership_card.remote_image_path,
+        )
+        generate_and_upload_apple_pass(membership_card)
+        record_card_artifact(
+            membership_card=membership_card,
+            artifact_type=APPLE_PASS_ARTIFACT_TYPE,
+            remote_path=membership_card.remote_apple_pass_path,
+        )
+    else:
+        ensure_uploaded_card_image(membership_card)
+        ensure_uploaded_apple_pass(membership_card)
+
+    gpay.upsert_pass_object(membership_card, gpay_client=gpay_client)
+
+
+def reissue_member_card(app, reissue_id, user_id, force=False, gpay_client=None):
+    # Runs on a reissue pool thread, so needs an app context (and thus a DB session) of its own
+    with app.app_context():
+        user = None
+        membership_card = None
+        try:
+            user = db.session.get(User, user_id)
+            if user is None:
+                raise LookupError(f"No user found for {user_id=}")
+            membership_card = get_membership_card(user)
+            if membership_card is None:
+                raise LookupError(f"No current membership card found for {user=}")
+            reissue_card_artifacts(
+                membership_card=membership_card,
+                force=force,
+                gpay_client=gpay_client,
+            )
+        except Exception as err:
+            logger.exception(f"Unable to reissue card for {user_id=} ({user=}): {err=}")
+            db.session.rollback()
+            if user is not None:
+                record_card_reissue(
+                    reissue_id=reissue_id,
+                    user_id=user_id,
+                    membership_card=membership_card,
+                    status=CARD_REISSUE_FAILED,
+                    error=str(err),
+                )
+            return CARD_REISSUE_FAILED
+
+        record_card_reissue(
+            reissue_id=reissue_id,
+            user_id=user_id,
+            membership_card=membership_card,
+            status=CARD_REISSUE_COMPLETED,
+        )
+        return CARD_REISSUE_COMPLETED
+
+
+def run_card_reissue(
+    reissue_id,
+    batch_size=100,
+    concurrency=4,
+    num_shards=1,
+    shard_index=0,
+    force=False,
+    report_interval_secs=10,
+):
+    """Reissue every active member's card artifacts, `batch_size` members at a time across `concurrency` threads.
+
+    Progress is recorded per member under `reissue_id`; rerunning with the same ID skips members already reissued.
+    Several instances can split the work by each taking a different `shard_index` of `num_shards`.
+    """
+    app = current_app._get_current_object()
+    progress = ReissueProgress(
+        num_total=count_active_members(num_shards=num_shards, shard_index=shard_index),
+        num_previously_completed=count_reissued_cards(
+            reissue_id=reissue_id,
+            num_shards=num_shards,
+            shard_index=shard_index,
+        ),
+        report_interval_secs=report_interval_secs,
+    )
+    logger.info(
+        f"Starting card reissue {reissue_id=} (shard {shard_index + 1}/{num_shards})",
+        extra=progress.to_dict(),
+    )
+    reissue_func = partial(
+        reissue_member_card,
+        app,
+        reissue_id,
+        force=force,
+        gpay_client=gpay.new_client(),
+    )
+
+    after_user_id = 0
+    with ThreadPoolExecutor(
+        max_workers=concurrency, thread_name_prefix="card-reissue"
+    ) as executor:
+        while True:
+            users = get_active_members_after(
+                after_user_id=after_user_id,
+                limit=batch_size,
+                num_shards=num_shards,
+                shard_index=shard_index,
+            )
+            if not users:
+                break
+            after_user_id = users[-1].id
+
+            user_ids = [user.id for user in users]
+            reissued_user_ids = get_reissued_user_ids(
+                reissue_id=reissue_id,
+                user_ids=user_ids,
+            )
+            pending_user_ids = [i for i in user_ids if i not in reissued_user_ids]
+            # Create any missing cards for the page up front, so the reissue threads only ever read them
+            ensure_membership_cards(user_ids=pending_user_ids)
+            for status in executor.map(reissue_func, pending_user_ids):
+                progress.record(status)
+                progress.report()
+
+    progress.report(force=True)
+    return progress.to_dict()
@@ -0,0 +1,377 @@
+import atexit
+import base64
+import json
+import logging
+import os
+import queue
+import select
+import subprocess
+import sys
+import threading
+from collections import deque
+from concurrent.futures import Future
+from tempfile import TemporaryDirectory
+from time import monotonic
+
+from flask import current_app
+from html2image.browsers.chrome import _find_chrome
+
+logger = logging.getLogger(__name__)
+
+# Chrome's --remote-debugging-pipe mode reads DevTools commands from fd 3 and writes responses to fd 4
+CHROME_PIPE_READ_FD = 3
+CHROME_PIPE_WRITE_FD = 4
+
+# Popen can only remap fds onto 3 / 4 via a preexec_fn, which isn't safe to use from our pool threads. So chrome is
+# launched through this minimal shim instead; it gets just the two pipe ends (via pass_fds, with every other fd closed)
+# and shifts them into place before exec'ing chrome. Both ends are first moved clear of 3 / 4 so neither dup2() clobbers
+# the other.
+CHROME_PIPE_LAUNCHER = f"""
+import fcntl, os, sys
+passed_fds = [int(fd) for fd in sys.argv[1:3]]
+read_fd, write_fd = [fcntl.fcntl(fd, fcntl.F_DUPFD_CLOEXEC, 10) for fd in passed_fds]
+for fd in passed_fds:
+    os.close(fd)
+os.dup2(read_fd, {CHROME_PIPE_READ_FD})
+os.dup2(write_fd, {CHROME_PIPE_WRITE_FD})
+os.execv(sys.argv[3], sys.argv[3:])
+"""
+
+DEFAULT_CHROME_FLAGS = [
+    "--headless",
+    "--no-sandbox",
+    "--hide-scrollbars",
+    "--disable-gpu",
+    "--no-first-run",
+    "--no-default-browser-check",
+    "--disable-extensions",
+]
+
+_renderer_pool = None
+_renderer_pool_lock = threading.Lock()
+
+
+class ChromeRendererError(Exception):
+    pass
+
+
+class ChromeBrowser(object):
+    """A single long-lived headless Chrome process, driven over the DevTools protocol via --remote-debugging-pipe"""
+
+    def __init__(self, executable=None, flags=None, command_timeout_secs=30):
+        self.executable = _find_chrome(executable)
+        self.flags = flags if flags is not None else DEFAULT_CHROME_FLAGS
+        self.command_timeout_secs = command_timeout_secs
+        self.num_renders = 0
+        self._process = None
+        self._user_data_dir = None
+        self._read_fd = None
+        self._write_fd = None
+        self._read_buffer = b""
+        self._events = deque()
+        self._next_message_id = 0
+
+    def start(self):
+        self._user_data_dir = TemporaryDirectory(prefix="card-renderer-")
+        chrome_read_fd, self._write_fd = os.pipe()
+        self._read_fd, chrome_write_fd = os.pipe()
+
+        command = [
+            self.executable,
+            "--remote-debugging-pipe",
+            f"--user-data-dir={self._user_data_dir.name}",
+            *self.flags,
+            "about:blank",
+        ]
+        logger.debug(f"Starting headless chrome: {command=}")
+        self._process = subprocess.Popen(
+            [
+                sys.executable,
+                "-I",
+                "-c",
+                CHROME_PIPE_LAUNCHER,
+                str(chrome_read_fd),
+                str(chrome_write_fd),
+                *command,
+            ],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            pass_fds=(chrome_read_fd, chrome_write_fd),
+        )
+        os.close(chrome_read_fd)
+        os.close(chrome_write_fd)
+        self.num_renders = 0
+
+        version = self.send_command("Browser.getVersion")
+        logger.info(
+            f"Headless chrome started: {version.get('product')} ({self._process.pid=})"
+        )
+        return self
+
+    def is_running(self):
+        return self._process is not None and self._process.poll() is None
+
+    def is_healthy(self):
+        if not self.is_running():
+            return False
+        try:
+            self.send_command("Browser.getVersion")
+        except Exception as err:
+            logger.warning(f"Headless chrome health check failed: {err=}")
+            return False
+        return True
+
+    def close(self):
+        if self._process is not None:
+            if self.is_running():
+                try:
+                    self.send_command("Browser.close")
+                    self._process.wait(timeout=5)
+                except Exception as err:
+                    logger.debug(f"Unable to gracefully close chrome ({err=}), killing")
+                    self._process.kill()
+                    self._process.wait()
+            self._process = None
+        for fd in (self._read_fd, self._write_fd):
+            if fd is not None:
+                os.close(fd)
+        self._read_fd = self._write_fd = None
+        self._read_buffer = b""
+        self._events.clear()
+        if self._user_data_dir is not None:
+            self._user_data_dir.cleanup()
+            self._user_data_dir = None
+
+    def _write_message(self, message):
+        data = json.dumps(message).encode("utf-8") + b"\0"
+        while data:
+            num_bytes_written = os.write(self._write_fd, data)
+            data = data[num_bytes_written:]
+
+    def _read_message(self, deadline):
+        while b"\0" not in self._read_buffer:
+            remaining_secs = deadline - monotonic()
+            if remaining_secs <= 0:
+                raise ChromeRendererError(
+                    "Timed out waiting on chrome DevTools message"
+                )
+            readable, _, _ = select.select([self._read_fd], [], [], remaining_secs)
+            if not readable:
+                continue
+            chunk = os.read(self._read_fd, 65536)
+            if not chunk:
+                raise ChromeRendererError("Chrome DevTools pipe closed unexpectedly")
+            self._read_buffer += chunk
+        raw_message, self._read_buffer = self._read_buffer.split(b"\0", 1)
+        return json.loads(raw_message)
+
+    def send_command(self, method, params=None, session_id=None):
+        self._next_message_id += 1
+        message_id = self._next_message_id
+        message = dict(id=message_id, method=method, params=params or {})
+        if session_id is not None:
+            message["sessionId"] = session_id
+        self._write_message(message)
+
+        deadline = monotonic() + self.command_timeout_secs
+        while True:
+            response = self._read_message(deadline)
+            if "method" in response:
+                # Hang on to events that show up in the meantime for any subsequent wait_for_event() calls
+                self._events.append(response)
+                continue
+            if response.get("id") != message_id:
+                continue
+            if "error" in response:
+                raise ChromeRendererError(f"{method} failed: {response['error']}")
+            return response.get("result", {})
+
+    def wait_for_event(self, method, session_id=None):
+        deadline = monotonic() + self.command_timeout_secs
+        while True:
+            message = self._events.popleft() if self._events else None
+            if message is None:
+                message = self._read_message(deadline)
+            if (
+                message.get("method") == method
+                and message.get("sessionId") == session_id
+            ):
+                return message.get("params", {})
+
+    def render(self, html_content, width, height):
+        """Render `html_content` in a fresh tab sized `width`x`height`, returning the screenshot as PNG bytes"""
+        self._events.clear()
+        target = self.send_command("Target.createTarget", dict(url="about:blank"))
+        target_id = target["targetId"]
+        try:
+            attached = self.send_command(
+                "Target.attachToTarget", dict(targetId=target_id, flatten=True)
+            )
+            session_id = attached["sessionId"]
+            self.send_command(
+                "Emulation.setDeviceMetricsOverride",
+                dict(width=width, height=height, deviceScaleFactor=1, mobile=False),
+                session_id=session_id,
+            )
+            self.send_command("Page.enable", session_id=session_id)
+            encoded_html = base64.b64encode(html_content.encode("utf-8")).decode()
+            self.send_command(
+                "Page.navigate",
+                dict(url=f"data:text/html;charset=utf-8;base64,{encoded_html}"),
+                session_id=session_id,
+            )
+            self.wait_for_event("Page.loadEventFired", session_id=session_id)
+            screenshot = self.send_command(
+                "Page.captureScreenshot",
+                dict(format="png"),
+                session_id=session_id,
+            )
+        finally:
+            self.send_command("Target.closeTarget", dict(targetId=target_id))
+        self.num_renders += 1
+        return base64.b64decode(screenshot["data"])
+
+
+class RenderJob(object):
+    def __init__(self, html_content, width, height):
+        self.html_content = html_content
+        self.width = width
+        self.height = height
+        self.future = Future()
+
+
+class ChromeRendererPool(object):
+    """Keeps `pool_size` headless Chrome instances warm, each fed render jobs off of a shared queue by its own thread.
+
+    Browsers are recycled after `max_renders_per_browser` renders and health checked whenever their thread has sat
+    idle for `health_check_interval_secs`.
+    """
+
+    def __init__(
+        self,
+        pool_size=1,
+        max_renders_per_browser=100,
+        health_check_interval_secs=60,
+        render_timeout_secs=60,
+        executable=None,
+        flags=None,
+        browser_class=ChromeBrowser,
+    ):
+        self.pool_size = pool_size
+        self.max_renders_per_browser = max_renders_per_browser
+        self.health_check_interval_secs = health_check_interval_secs
+        self.render_timeout_secs = render_timeout_secs
+        self.executable = executable
+        self.flags = flags
+        self.browser_class = browser_class
+        self.jobs = queue.Queue()
+        self._threads = []
+        self._started = False
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return self
+            for num in range(self.pool_size):
+                thread = threading.Thread(
+                    target=self._run_browser,
+                    name=f"card-renderer-{num}",
+                    daemon=True,
+                )
+                thread.start()
+                self._threads.append(thread)
+            self._started = True
+        return self
+
+    def shutdown(self, timeout=10):
+        with self._lock:
+            if not self._started:
+                return
+            for _ in self._threads:
+                self.jobs.put(None)
+            for thread in self._threads:
+                thread.join(timeout=timeout)
+            self._threads = []
+            self._started = False
+
+    def render(self, html_content, width, height):
+        if not self._started:
+            self.start()
+        job = RenderJob(html_content=html_content, width=width, height=height)
+        self.jobs.put(job)
+        return job.future.result(timeout=self.render_timeout_secs)
+
+    def _new_browser(self):
+        return self.browser_class(executable=self.executable, flags=self.flags).start()
+
+    def _run_browser(self):
+        # Get chrome started ahead of the first render job so it is ready and waiting
+        try:
+            browser = self._new_browser()
+        except Exception as err:
+            logger.exception(f"Unable to start headless chrome renderer: {err=}")
+            browser = None
+
+        while True:
+            try:
+                job = self.jobs.get(timeout=self.health_check_interval_secs)
+            except queue.Empty:
+                if browser is not None and not browser.is_healthy():
+                    logger.warning("Restarting unhealthy headless chrome renderer...")
+                    browser.close()
+                    browser = None
+                continue
+
+            if job is None:
+                break
+
+            if not job.future.set_running_or_notify_cancel():
+                continue
+            try:
+                if browser is None:
+                    browser = self._new_browser()
+                job.future.set_result(
+                    browser.render(
+                        html_content=job.html_content,
+                        width=job.width,
+                        height=job.height,
+                    )
+                )
+            except Exception as err:
+                logger.exception(f"Card render failed: {err=}")
+                job.future.set_exception(err)
+                # Whatever state the browser is now in can't be trusted; start fresh next time around
+                if browser is not None:
+                    browser.close()
+                    browser = None
+                continue
+
+            if browser.num_renders >= self.max_renders_per_browser:
+                logger.debug(
+                    f"Recycling headless chrome renderer after {browser.num_renders} renders"
+                )
+                browser.close()
+                browser = None
+
+        if browser is not None:
+            browser.close()
+
+
+def get_renderer_pool():
+    global _renderer_pool
+    with _renderer_pool_lock:
+        if _renderer_pool is None:
+            _renderer_pool = ChromeRendererPool(
+                pool_size=current_app.config["CARD_RENDERER_POOL_SIZE"],
+                max_renders_per_browser=current_app.config[
+                    "CARD_RENDERER_MAX_RENDERS_PER_BROWSER"
+                ],
+                health_check_interval_secs=current_app.config[
+                    "CARD_RENDERER_HEALTH_CHECK_INTERVAL_SECS"
+                ],
+                executable=current_app.config["CARD_RENDERER_CHROME_EXECUTABLE"],
+            ).start()
+            atexit.register(_renderer_pool.shutdown)
+        return _renderer_pool
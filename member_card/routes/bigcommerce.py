@@ -15,7 +15,7 @@ from flask import (
 )
 
 from member_card.db import db
-from member_card.gcp import publish_message
+from member_card.queues import publish_message
 from member_card.models import Store, StoreUser, User
 from member_card.models.user import add_role_to_user, ensure_user
 from member_card.utils import sign
@@ -118,6 +118,7 @@ def order_webhook():
     if data_type == "order":
         message_data = dict(
             type="sync_bigcommerce_order",
+            created_at=webhook_payload.get("created_at"),
             data=data,
             data_type=data_type,
             hash=hash,
@@ -2,12 +2,13 @@ import logging
 import re
 from datetime import timezone
 from functools import wraps
+from io import BytesIO
 from uuid import UUID
 
 from dateutil.parser import parse
 from flask import jsonify, request, send_file
 from member_card.app import app
-from member_card.db import db, get_or_create
+from member_card.db import db, get_or_create, read_replica_route
 from member_card.models import AppleDeviceRegistration, MembershipCard
 from member_card.utils import verify
 
@@ -175,6 +176,7 @@ def passkit_register_device_for_pass_push_notifications(
 @app.route(
     "/passkit/v1/devices/<device_library_identifier>/registrations/<pass_type_identifier>"
 )
+@read_replica_route
 def get_serial_numbers_for_device_passes(
     device_library_identifier, pass_type_identifier
 ):
@@ -251,6 +253,7 @@ def get_serial_numbers_for_device_passes(
 
 
 @app.route("/passkit/v1/passes/<pass_type_identifier>/<serial_number>")
+@read_replica_route
 @applepass_auth_token_required
 def passkit_get_latest_version_of_pass(membership_card_pass, device_library_identifier):
     """
@@ -283,7 +286,7 @@ def passkit_get_latest_version_of_pass(membership_card_pass, device_library_iden
 
     logger.debug(f"found in {membership_card_pass=} ({device_library_identifier=}).")
 
-    from member_card.passes import get_apple_pass_from_card
+    from member_card.passes import get_cached_apple_pass
 
     attachment_filename = (
         f"lv_apple_pass-{membership_card_pass.user.last_name.lower()}.pkpass"
@@ -293,7 +296,7 @@ def passkit_get_latest_version_of_pass(membership_card_pass, device_library_iden
         extra=log_extra,
     )
 
-    pkpass_out_path = get_apple_pass_from_card(
+    cached_pkpass = get_cached_apple_pass(
         membership_card=membership_card_pass,
     )
     logger.info(
@@ -301,10 +304,12 @@ def passkit_get_latest_version_of_pass(membership_card_pass, device_library_iden
         extra=log_extra,
     )
     return send_file(
-        pkpass_out_path,
+        BytesIO(cached_pkpass.data),
         attachment_filename=attachment_filename,
         mimetype="application/vnd.apple.pkpass",
         as_attachment=True,
+        etag=cached_pkpass.etag,
+        last_modified=cached_pkpass.last_modified,
     )
 
 
@@ -1,5 +1,8 @@
 import json
 import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 import flask
@@ -10,6 +13,22 @@ from sendgrid.helpers.mail import Mail
 
 logger = logging.getLogger(__name__)
 
+# SendGrid's v3 mail send endpoint accepts at most this many personalizations per request
+SENDGRID_MAX_PERSONALIZATIONS = 1000
+
+_sendgrid_client = None
+_sendgrid_client_lock = threading.Lock()
+
+
+def get_sendgrid_client():
+    global _sendgrid_client
+    with _sendgrid_client_lock:
+        if _sendgrid_client is None:
+            _sendgrid_client = SendGridAPIClient(
+                flask.current_app.config["SENDGRID_API_KEY"]
+            )
+        return _sendgrid_client
+
 
 def generate_email_message(
     membership_card,
@@ -59,7 +78,7 @@ def send_email_message(email_message):
         f"sending email message to: {tos}",
         extra=dict(tos=tos, template_id=email_message.template_id),
     )
-    sg = SendGridAPIClient(flask.current_app.config["SENDGRID_API_KEY"])
+    sg = get_sendgrid_client()
     message_json = json.dumps(email_message.get(), sort_keys=True, indent=4)
     logger.debug(f"Outgoing email message {message_json=}")
     response = sg.send(email_message)
@@ -67,6 +86,88 @@ def send_email_message(email_message):
     return response
 
 
+def build_bulk_email_messages(email_messages, max_personalizations=None):
+    """Fold single-recipient messages from generate_email_message() into as few multi-personalization Mails as possible.
+
+    Every recipient keeps their own personalization (and so their own dynamic template data); the sender, template and
+    unsubscribe group are taken from the first message in each batch.
+    """
+    if max_personalizations is None:
+        max_personalizations = SENDGRID_MAX_PERSONALIZATIONS
+    max_personalizations = min(max_personalizations, SENDGRID_MAX_PERSONALIZATIONS)
+
+    bulk_messages = []
+    bulk_message = None
+    for email_message in email_messages:
+        for personalization in email_message.personalizations:
+            if (
+                bulk_message is None
+                or len(bulk_message.personalizations) >= max_personalizations
+            ):
+                bulk_message = Mail(from_email=email_message.from_email)
+                bulk_message.asm = email_message.asm
+                bulk_message.template_id = email_message.template_id
+                bulk_messages.append(bulk_message)
+            bulk_message.add_personalization(
+                personalization,
+                index=len(bulk_message.personalizations),
+            )
+
+    return bulk_messages
+
+
+def send_bulk_email_messages(bulk_message_batches, concurrency, on_batch_sent=None):
+    """Send each `(checkpoint, bulk_messages)` batch, with at most `concurrency` batches in flight at once.
+
+    `on_batch_sent(checkpoint)` is called in batch order as each batch (and every batch before it) completes, so
+    a caller persisting `checkpoint` never skips past a batch that didn't make it out.
+    """
+    sg = get_sendgrid_client()
+    stats = dict(num_requests=0, num_personalizations=0)
+
+    def send_batch(bulk_messages):
+        for bulk_message in bulk_messages:
+            tos = [p.tos for p in bulk_message.personalizations]
+            logger.info(
+                f"sending bulk email message to {len(tos)} recipient(s)",
+                extra=dict(tos=tos, template_id=bulk_message.template_id),
+            )
+            response = sg.send(bulk_message)
+            logger.debug(f"SendGrid response: {response=}")
+
+    def complete_batch(checkpoint, bulk_messages, send_future):
+        send_future.result()
+        stats["num_requests"] += len(bulk_messages)
+        stats["num_personalizations"] += sum(
+            len(m.personalizations) for m in bulk_messages
+        )
+        if on_batch_sent is not None:
+            on_batch_sent(checkpoint)
+
+    in_flight = deque()
+    with ThreadPoolExecutor(
+        max_workers=concurrency, thread_name_prefix="sendgrid-bulk"
+    ) as executor:
+        try:
+            for checkpoint, bulk_messages in bulk_message_batches:
+                if len(in_flight) >= concurrency:
+                    complete_batch(*in_flight.popleft())
+                in_flight.append(
+                    (
+                        checkpoint,
+                        bulk_messages,
+                        executor.submit(send_batch, bulk_messages),
+                    )
+                )
+            while in_flight:
+                complete_batch(*in_flight.popleft())
+        finally:
+            for _, _, send_future in in_flight:
+                send_future.cancel()
+
+    return stats
+
+
 def update_sendgrid_template():
     app = flask.current_app
 
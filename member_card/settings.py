@@ -76,6 +76,30 @@ class Settings(object):
     GCLOUD_PUBSUB_TOPIC_ID: str = os.getenv(
         "GCLOUD_PUBSUB_TOPIC_ID", "digital-membership"
     )
+    # Message queue backend: "gcp" (Pub/Sub), "memory" (per-process) or "sqlite" (durable local file @ QUEUE_SQLITE_PATH)
+    QUEUE_BACKEND: str = os.getenv("QUEUE_BACKEND", "gcp")
+    QUEUE_SQLITE_PATH: str = os.getenv("QUEUE_SQLITE_PATH", "member-card-queue.db")
+    # Batching settings for the shared (process-wide) Pub/Sub publisher client
+    PUBSUB_BATCH_MAX_MESSAGES: int = int(os.getenv("PUBSUB_BATCH_MAX_MESSAGES", "100"))
+    PUBSUB_BATCH_MAX_BYTES: int = int(
+        os.getenv("PUBSUB_BATCH_MAX_BYTES", str(1024 * 1024))
+    )
+    PUBSUB_BATCH_MAX_LATENCY_SECS: float = float(
+        os.getenv("PUBSUB_BATCH_MAX_LATENCY_SECS", "0.05")
+    )
+    # Streaming pull worker (`flask worker run`) subscription and flow control: max leased messages / bytes at once
+    PUBSUB_SUBSCRIPTION_ID: str = os.getenv(
+        "PUBSUB_SUBSCRIPTION_ID", "digital-membership-worker"
+    )
+    PUBSUB_FLOW_CONTROL_MAX_MESSAGES: int = int(
+        os.getenv("PUBSUB_FLOW_CONTROL_MAX_MESSAGES", "100")
+    )
+    PUBSUB_FLOW_CONTROL_MAX_BYTES: int = int(
+        os.getenv("PUBSUB_FLOW_CONTROL_MAX_BYTES", str(100 * 1024 * 1024))
+    )
+    PUBSUB_SUBSCRIBER_HANDLER_THREADS: int = int(
+        os.getenv("PUBSUB_SUBSCRIBER_HANDLER_THREADS", "8")
+    )
 
     BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 
@@ -98,6 +122,23 @@ class Settings(object):
     DB_DATABASE_NAME: str = os.getenv("DIGITAL_MEMBERSHIP_DB_DATABASE_NAME", "")
     DB_PASSWORD: str = os.getenv("DIGITAL_MEMBERSHIP_DB_ACCESS_TOKEN")
 
+    # Per-request / per-worker-message SQL statement tallies (see `member_card.query_stats`): reported via
+    # X-DB-Query-Count / X-DB-Query-Time-Ms response headers outside of production, with a warning logged whenever the
+    # same statement is issued SQL_N_PLUS_ONE_THRESHOLD+ times (i.e., a relationship lazy-loaded row by row)
+    SQL_QUERY_STATS_HEADERS_ENABLED: bool = True
+    SQL_N_PLUS_ONE_THRESHOLD: int = int(os.getenv("SQL_N_PLUS_ONE_THRESHOLD", "5"))
+
+    # Optional read replica that read-only endpoints / CLI queries are routed to (see `member_card.db.RoutingSession`);
+    # reads fall back to the primary while the replica is unreachable or lagging by more than DB_REPLICA_MAX_LAG_SECS
+    SQLALCHEMY_REPLICA_DATABASE_URI: str = os.getenv(
+        "DIGITAL_MEMBERSHIP_DB_REPLICA_URI"
+    )
+    SQLALCHEMY_REPLICA_ENGINE_OPTIONS: dict = {}
+    DB_REPLICA_MAX_LAG_SECS: float = float(os.getenv("DB_REPLICA_MAX_LAG_SECS", "5"))
+    DB_REPLICA_LAG_CHECK_INTERVAL_SECS: float = float(
+        os.getenv("DB_REPLICA_LAG_CHECK_INTERVAL_SECS", "10")
+    )
+
     BASE_URL: str = (
         f'https://{os.getenv("DIGITAL_MEMBERSHIP_BASE_URL", "card.losverd.es")}'
     )
@@ -127,6 +168,12 @@ class Settings(object):
     SENDGRID_TEMPLATE_ID: str = os.getenv(
         "SENDGRID_TEMPLATE_ID", "d-626729a6eed9402fa4ce849d8227afc4"
     )
+    # Recipients (personalizations) per bulk distribution mail send request, capped at SendGrid's limit of 1000
+    SENDGRID_BULK_MAX_PERSONALIZATIONS: int = int(
+        os.getenv("SENDGRID_BULK_MAX_PERSONALIZATIONS", "1000")
+    )
+    # Number of bulk distribution mail send requests allowed in flight at once
+    SENDGRID_BULK_CONCURRENCY: int = int(os.getenv("SENDGRID_BULK_CONCURRENCY", "4"))
     # SERVER_NAME: str = os.getenv("SERVER_NAME", BASE_URL).lstrip("https://").lstrip("http://")
 
     SLACK_BOT_TOKEN: str = os.getenv("SLACK_BOT_TOKEN", "")
@@ -227,6 +274,64 @@ class Settings(object):
         "BIGCOMMERCE_WIDGET_ID", "2871acf4-aa47-425c-bccc-25df8b907b4d"
     )
 
+    # Max concurrent OrderProducts requests issued while loading BigCommerce orders
+    BIGCOMMERCE_FETCH_CONCURRENCY: int = int(
+        os.getenv("BIGCOMMERCE_FETCH_CONCURRENCY", "8")
+    )
+    # Pause until BigCommerce's rate limit window resets once this few requests remain in it
+    BIGCOMMERCE_RATE_LIMIT_MIN_REMAINING: int = int(
+        os.getenv("BIGCOMMERCE_RATE_LIMIT_MIN_REMAINING", "5")
+    )
+    BIGCOMMERCE_RATE_LIMIT_MAX_RETRIES: int = int(
+        os.getenv("BIGCOMMERCE_RATE_LIMIT_MAX_RETRIES", "5")
+    )
+
+    # Bursts of webhook events for the same order within this many seconds are coalesced into a single order sync
+    # (synced by the next scheduled sync_pending_bigcommerce_orders sweep once the order goes quiet)
+    BIGCOMMERCE_ORDER_SYNC_QUIET_WINDOW_SECS: float = float(
+        os.getenv("BIGCOMMERCE_ORDER_SYNC_QUIET_WINDOW_SECS", "5")
+    )
+    # Pending order syncs that still haven't synced after this many seconds are dropped (left to the scheduled orders ETL)
+    BIGCOMMERCE_ORDER_SYNC_MAX_PENDING_SECS: float = float(
+        os.getenv("BIGCOMMERCE_ORDER_SYNC_MAX_PENDING_SECS", "3600")
+    )
+
+    # Number of rows written per bulk upsert statement (and commit) during order ETL runs
+    ETL_UPSERT_BATCH_SIZE: int = int(os.getenv("ETL_UPSERT_BATCH_SIZE", "500"))
+
+    # Folded into each card's content hash; bump this whenever card image / pass layouts change to regenerate them
+    CARD_TEMPLATE_VERSION: str = os.getenv("CARD_TEMPLATE_VERSION", "1")
+    # In-process cache of signed .pkpass files served to wallet devices / members
+    PKPASS_CACHE_MAX_BYTES: int = int(
+        os.getenv("PKPASS_CACHE_MAX_BYTES", str(32 * 1024 * 1024))
+    )
+    PKPASS_CACHE_TTL_SECS: int = int(os.getenv("PKPASS_CACHE_TTL_SECS", "3600"))
+    # Where already-processed worker messages are tracked for deduplication: "sql" or "memory" (per-process)
+    PROCESSED_MESSAGE_LEDGER: str = os.getenv("PROCESSED_MESSAGE_LEDGER", "sql")
+    # Pub/Sub retains unacked messages for up to 7 days, so there's no need to remember them any longer than that
+    PROCESSED_MESSAGE_TTL_SECS: int = int(
+        os.getenv("PROCESSED_MESSAGE_TTL_SECS", str(7 * 24 * 60 * 60))
+    )
+    PROCESSED_MESSAGE_PRUNE_INTERVAL_SECS: int = int(
+        os.getenv("PROCESSED_MESSAGE_PRUNE_INTERVAL_SECS", "3600")
+    )
+    # Card image rendering backend: "html" (headless Chrome screenshots) or "pillow" (composed directly, no Chrome)
+    CARD_IMAGE_RENDERER: str = os.getenv("CARD_IMAGE_RENDERER", "html")
+    # TrueType font used by the "pillow" card image renderer; an empty value => Pillow's built-in bitmap font
+    CARD_IMAGE_FONT_PATH: str = os.getenv(
+        "CARD_IMAGE_FONT_PATH", "LiberationSans-Bold.ttf"
+    )
+    # Number of warm headless Chrome instances kept around for rendering card images; 0 => launch chrome per render.
+    # Enable per deployment (only worth it where card images actually get rendered, since the pool starts on boot)
+    CARD_RENDERER_POOL_SIZE: int = int(os.getenv("CARD_RENDERER_POOL_SIZE", "0"))
+    CARD_RENDERER_MAX_RENDERS_PER_BROWSER: int = int(
+        os.getenv("CARD_RENDERER_MAX_RENDERS_PER_BROWSER", "100")
+    )
+    CARD_RENDERER_HEALTH_CHECK_INTERVAL_SECS: int = int(
+        os.getenv("CARD_RENDERER_HEALTH_CHECK_INTERVAL_SECS", "60")
+    )
+    CARD_RENDERER_CHROME_EXECUTABLE: str = os.getenv("CARD_RENDERER_CHROME_EXECUTABLE")
+
     SESSION_PROTECTION: str = "strong"
     SECRET_KEY: str = os.environ.get("SECRET_KEY", "not-very-secret-at-all")
     SESSION_COOKIE_NAME: str = "psa_session"
@@ -277,13 +382,21 @@ class DockerComposeSettings(Settings):
 
 class ProductionSettings(Settings):
     DEBUG: bool = False
+    SQL_QUERY_STATS_HEADERS_ENABLED: bool = False
     SOCIAL_AUTH_REDIRECT_IS_HTTPS: bool = True
     SQLALCHEMY_DATABASE_URI: str = "postgresql+pg8000://"
     SQLALCHEMY_ECHO: bool = False
     CDN_DEBUG = False
+    # DB connection pool: sized for gunicorn's 8 threads per worker, with connections checked before use and recycled
+    # well ahead of any server-side idle timeouts
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "8"))
+    DB_POOL_MAX_OVERFLOW: int = int(os.getenv("DB_POOL_MAX_OVERFLOW", "2"))
+    DB_POOL_TIMEOUT_SECS: int = int(os.getenv("DB_POOL_TIMEOUT_SECS", "10"))
+    DB_POOL_RECYCLE_SECS: int = int(os.getenv("DB_POOL_RECYCLE_SECS", "1800"))
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
 
     def use_gcp_sql_connector(self) -> None:
-        from member_card.db import get_gcp_sql_engine_creator
+        from member_card.db import InstrumentedQueuePool, get_gcp_sql_engine_creator
 
         engine_creator = get_gcp_sql_engine_creator(
             instance_connection_string=os.environ[
@@ -295,9 +408,30 @@ class ProductionSettings(Settings):
         )
         self.SQLALCHEMY_ENGINE_OPTIONS = dict(
             creator=engine_creator,
+            poolclass=InstrumentedQueuePool,
+            pool_size=self.DB_POOL_SIZE,
+            max_overflow=self.DB_POOL_MAX_OVERFLOW,
+            pool_timeout=self.DB_POOL_TIMEOUT_SECS,
+            pool_recycle=self.DB_POOL_RECYCLE_SECS,
+            pool_pre_ping=self.DB_POOL_PRE_PING,
         )
         logger.debug(f"{self.SQLALCHEMY_ENGINE_OPTIONS=}")
 
+        replica_connection_name = os.getenv(
+            "DIGITAL_MEMBERSHIP_GCP_SQL_REPLICA_CONNECTION_NAME"
+        )
+        if replica_connection_name:
+            self.SQLALCHEMY_REPLICA_DATABASE_URI = "postgresql+pg8000://"
+            self.SQLALCHEMY_REPLICA_ENGINE_OPTIONS = dict(
+                self.SQLALCHEMY_ENGINE_OPTIONS,
+                creator=get_gcp_sql_engine_creator(
+                    instance_connection_string=replica_connection_name,
+                    db_name=self.DB_DATABASE_NAME,
+                    db_user=self.DB_USERNAME,
+                    db_pass=self.DB_PASSWORD,
+                ),
+            )
+
     def __init__(self) -> None:
         super().__init__()
         self.SOCIAL_AUTH_PIPELINE = tuple(
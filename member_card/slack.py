@@ -6,9 +6,9 @@ from time import sleep
 from flask import current_app
 from slack_sdk import WebClient
 
-from member_card.db import db, get_or_update
+from member_card.db import chunked, db, get_or_update
 from member_card.models import SlackUser
-from member_card.models.user import ensure_user
+from member_card.models.user import UserResolver, ensure_user
 
 logger = logging.getLogger(__name__)
 
@@ -47,7 +47,7 @@ def slack_members_generator(client: WebClient, chunk_size=100, polling_interval_
 
 
 # @Timer(name="upsert_slack_member", logger=logger.debug)
-def upsert_slack_member(slack_member):
+def upsert_slack_member(slack_member, user_resolver=None):
     profile_dict = slack_member["profile"]
     slack_member["profile"] = json.dumps(profile_dict)
 
@@ -68,29 +68,47 @@ def upsert_slack_member(slack_member):
         kwargs=slack_member,
     )
 
-    app_user = ensure_user(
-        email=email,
-        first_name=first_name,
-        last_name=last_name,
-    )
-    app_user_id = app_user.id
+    if user_resolver is None:
+        app_user = ensure_user(
+            email=email,
+            first_name=first_name,
+            last_name=last_name,
+        )
+    else:
+        app_user = user_resolver.resolve(
+            email=email,
+            first_name=first_name,
+            last_name=last_name,
+        )
     if not slack_user.user_id:
-        logger.debug(f"No user_id set for {slack_user=}! Setting to: {app_user_id=}")
-        setattr(slack_user, "user_id", app_user_id)
+        logger.debug(f"No user_id set for {slack_user=}! Setting to: {app_user=}")
+        setattr(slack_user, "user", app_user)
 
     return slack_user
 
 
 # @Timer(name="slack_members_etl", logger=logger.debug)
-def slack_members_etl(client: WebClient):
-    slack_users = list()
+def slack_members_etl(client: WebClient, batch_size=None):
+    if batch_size is None:
+        batch_size = current_app.config["ETL_UPSERT_BATCH_SIZE"]
 
-    for slack_member in slack_members_generator(client):
-        # logger.debug(f"slack_members_etl(): {slack_member}")
-        slack_user = upsert_slack_member(slack_member)
-        slack_users.append(slack_user)
-        db.session.add(slack_user)
+    slack_users = list()
 
+    for slack_members_batch in chunked(slack_members_generator(client), batch_size):
+        user_resolver = UserResolver()
+        user_resolver.preload(
+            m["profile"].get("email") for m in slack_members_batch if m.get("profile")
+        )
+        for slack_member in slack_members_batch:
+            # logger.debug(f"slack_members_etl(): {slack_member}")
+            slack_user = upsert_slack_member(
+                slack_member=slack_member,
+                user_resolver=user_resolver,
+            )
+            slack_users.append(slack_user)
+            db.session.add(slack_user)
+
+        user_resolver.flush()
         db.session.commit()
 
     logger.info(f"Total number of slack members processed: {len(slack_users)}")
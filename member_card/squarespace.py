@@ -11,10 +11,16 @@ from flask import current_app, request, session
 from requests.auth import HTTPBasicAuth
 
 from member_card import utils
-from member_card.db import db, get_or_create, get_or_update
+from member_card.db import chunked, db, get_or_create
 from member_card.models import SquarespaceWebhook, table_metadata
-from member_card.models.user import ensure_user
-from member_card.gcp import publish_message
+from member_card.models.annual_membership import (
+    record_upserted_memberships,
+    tally_membership_batches,
+    upsert_memberships,
+)
+from member_card.models.membership_card import ensure_membership_cards
+from member_card.models.user import UserResolver
+from member_card.queues import publish_message
 
 if TYPE_CHECKING:
     from collections.abc import Iterable
@@ -154,10 +160,8 @@ def generate_oauth_authorize_url():
     return authorize_url
 
 
-def insert_order_as_membership(order, membership_skus):
-    from member_card.models import AnnualMembership
-
-    membership_orders = []
+def membership_rows_from_order(order, membership_skus):
+    membership_rows = []
     line_items = order.get("lineItems", [])
     subscription_line_items = [i for i in line_items if i["sku"] in membership_skus]
     ignored_line_items = [i for i in line_items if i["sku"] not in membership_skus]
@@ -189,45 +193,81 @@ def insert_order_as_membership(order, membership_skus):
             product_id=subscription_line_item["productId"],
             product_name=subscription_line_item["productName"],
         )
-        membership = get_or_update(
-            session=db.session,
-            model=AnnualMembership,
-            filters=["order_id", "order_number"],
-            kwargs=membership_kwargs,
+        membership_rows.append(membership_kwargs)
+    return membership_rows
+
+
+def ensure_membership_row_users(membership_rows):
+    user_resolver = UserResolver()
+    user_resolver.preload(r["customer_email"] for r in membership_rows)
+    membership_users = [
+        user_resolver.resolve(
+            email=membership_row["customer_email"],
+            first_name=membership_row["billing_address_first_name"],
+            last_name=membership_row["billing_address_last_name"],
         )
-        membership_orders.append(membership)
+        for membership_row in membership_rows
+    ]
+    # Flush once for the whole batch so newly created users have IDs assigned
+    user_resolver.flush()
+    for membership_row, membership_user in zip(membership_rows, membership_users):
+        membership_row["user_id"] = membership_user.id
 
-        membership_user = ensure_user(
-            email=membership.customer_email,
-            first_name=membership.billing_address_first_name,
-            last_name=membership.billing_address_last_name,
-        )
-        membership_user_id = membership_user.id
-        if not membership.user_id:
-            logger.debug(
-                f"No user_id set for {membership=}! Setting to: {membership_user_id=}"
-            )
-            setattr(membership, "user_id", membership_user_id)
-    return membership_orders
 
+def insert_order_as_membership(order, membership_skus):
+    membership_rows = membership_rows_from_order(
+        order=order,
+        membership_skus=membership_skus,
+    )
+    ensure_membership_row_users(membership_rows)
+    # Existing memberships keep whichever user they were previously associated with
+    memberships = upsert_memberships(membership_rows, preserve_existing=["user_id"])
+    record_upserted_memberships(memberships)
+    db.session.commit()
+    ensure_membership_cards(user_ids=[m.user_id for m in memberships])
+    return memberships
 
-def parse_subscription_orders(membership_skus, subscription_orders):
-    logger.info(f"{len(subscription_orders)=} retrieved from Squarespace...")
 
-    # Insert oldest orders first (so our internal membership ID generally aligns with order IDs...)
-    subscription_orders.reverse()
+def generate_membership_batches(membership_skus, subscription_orders, batch_size=None):
+    """Stream `subscription_orders` through the ETL, yielding the AnnualMembership instances written per batch.
 
-    # Loop over all the raw order data and do the ETL bits
-    memberships = []
-    for subscription_order in subscription_orders:
-        membership_orders = insert_order_as_membership(
-            order=subscription_order,
-            membership_skus=membership_skus,
+    Only one batch of orders is held in memory at a time.
+    """
+    if batch_size is None:
+        batch_size = current_app.config["ETL_UPSERT_BATCH_SIZE"]
+
+    # Loop over all the raw order data in batches and do the ETL bits with one bulk upsert (and commit) per batch
+    num_orders = 0
+    for orders_batch in chunked(subscription_orders, batch_size):
+        num_orders += len(orders_batch)
+        membership_rows = []
+        for subscription_order in orders_batch:
+            membership_rows += membership_rows_from_order(
+                order=subscription_order,
+                membership_skus=membership_skus,
+            )
+        ensure_membership_row_users(membership_rows)
+        memberships = upsert_memberships(
+            membership_rows=membership_rows,
+            batch_size=batch_size,
+            preserve_existing=["user_id"],
         )
-        for membership_order in membership_orders:
-            db.session.add(membership_order)
+        record_upserted_memberships(memberships)
+        # Each batch is written (users, memberships and all they feed into) as a whole or not at all
         db.session.commit()
-        memberships += membership_orders
+        ensure_membership_cards(user_ids=[m.user_id for m in memberships])
+        yield memberships
+    logger.info(f"{num_orders=} retrieved from Squarespace and processed...")
+
+
+def parse_subscription_orders(membership_skus, subscription_orders, batch_size=None):
+    memberships = []
+    for memberships_batch in generate_membership_batches(
+        membership_skus=membership_skus,
+        subscription_orders=subscription_orders,
+        batch_size=batch_size,
+    ):
+        memberships += memberships_batch
     return memberships
 
 
@@ -255,11 +295,16 @@ def squarespace_orders_etl(squarespace_client, membership_skus, load_all):
             membership_skus=membership_skus,
         )
 
-    memberships = parse_subscription_orders(membership_skus, subscription_orders)
+    membership_stats = tally_membership_batches(
+        generate_membership_batches(
+            membership_skus=membership_skus,
+            subscription_orders=subscription_orders,
+        )
+    )
 
     table_metadata.set_last_run_start_time(membership_table_name, etl_start_time)
 
-    return memberships
+    return membership_stats
 
 
 def load_single_order(squarespace_client, membership_skus, order_id):
@@ -675,35 +720,33 @@ class Squarespace(object):
         )
 
     def load_all_membership_orders(self, membership_skus, order_params=None):
-        # ) -> List[AnnualMembership]:
+        """Lazily yield orders including any of `membership_skus`, one page of orders at a time."""
         # remove "None"s
         if order_params is None:
             order_params = {}
         order_params = {k: v for k, v in order_params.items() if v is not None}
 
-        all_orders = []
-        membership_orders = []
+        num_orders = 0
+        num_membership_orders = 0
 
         logger.debug(f"Grabbing all orders with {order_params=}")
 
         for order in self.all_orders(**order_params):
-            all_orders.append(order)
+            num_orders += 1
 
             order_product_names = [i["productName"] for i in order["lineItems"]]
             if any(i["sku"] in membership_skus for i in order["lineItems"]):
                 logger.debug(
                     f"{order['id']=} (#{order['orderNumber']}) includes {membership_skus=} in {order_product_names=}"
                 )
-                membership_orders.append(order)
+                num_membership_orders += 1
+                yield order
                 continue
             # logger.debug(
             #     f"#{order['orderNumber']} has no {membership_sku=} in {order_product_names=}"
             # )
 
-        logger.debug(
-            f"{len(all_orders)=} loaded with {len(membership_orders)=} and whatnot"
-        )
-        return membership_orders
+        logger.debug(f"{num_orders=} loaded with {num_membership_orders=} and whatnot")
 
     def list_webhook_subscriptions(
         self,
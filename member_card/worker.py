@@ -1,18 +1,42 @@
 import base64
 import json
 import logging
+import signal
+import threading
 
 from flask import Blueprint, current_app, request
 
 from member_card import minibc
-from member_card import bigcommerce, slack
+from member_card import bigcommerce, gcp, slack
 from member_card.db import db
+from member_card.idempotency import (
+    get_message_idempotency_keys,
+    get_processed_message_ledger,
+)
 from member_card.image import ensure_uploaded_card_image
-from member_card.models import AnnualMembership
+from member_card.models import AnnualMembership, User
 from member_card.models.membership_card import get_or_create_membership_card
-from member_card.models.user import get_user_or_none
-from member_card.passes import generate_and_upload_apple_pass
-from member_card.sendgrid import generate_email_message, send_email_message
+from member_card.models.pending_order_sync import (
+    claim_order_sync,
+    expire_stale_order_syncs,
+    get_due_order_syncs,
+    register_order_event,
+)
+from member_card.models.table_metadata import (
+    get_failed_ids,
+    get_last_processed_id,
+    set_failed_ids,
+    set_last_processed_id,
+)
+from member_card.models.user import get_active_members_after, get_user_or_none
+from member_card.passes import ensure_uploaded_apple_pass
+from member_card.query_stats import track_queries
+from member_card.sendgrid import (
+    build_bulk_email_messages,
+    generate_email_message,
+    send_bulk_email_messages,
+    send_email_message,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -42,6 +66,12 @@ def parse_message():
     return message
 
 
+def get_pubsub_message_id():
+    envelope = request.get_json()
+    pubsub_message = envelope["message"]
+    return pubsub_message.get("messageId") or pubsub_message.get("message_id")
+
+
 def process_email_distribution_request(message):
     logger.debug(f"Processing email distribution request message: {message}")
     email_distribution_recipient = message["email_distribution_recipient"]
@@ -74,7 +104,7 @@ def process_email_distribution_request(message):
 
     card_image_url = ensure_uploaded_card_image(membership_card)
 
-    apple_pass_url = generate_and_upload_apple_pass(membership_card)
+    apple_pass_url = ensure_uploaded_apple_pass(membership_card)
 
     email_message = generate_email_message(
         membership_card=membership_card,
@@ -89,6 +119,113 @@ def process_email_distribution_request(message):
     return send_email_resp
 
 
+def get_bulk_email_distribution_checkpoint_name(distribution_id):
+    return f"bulk_email_distribution:{distribution_id}"
+
+
+def generate_bulk_email_batches(
+    after_user_id, batch_size, stats, retry_user_ids=(), **email_kwargs
+):
+    """Yield `(checkpoint, bulk_messages)` for each successive page of active members after `after_user_id`.
+
+    Members in `retry_user_ids` (whose emails failed to build on an earlier attempt) are retried first. Checkpoints are
+    `(last_user_id, failed_user_ids)`, where `failed_user_ids` covers every member still owed a retry at that point.
+    """
+    failed_user_ids = []
+
+    def build_batch(users):
+        email_messages = []
+        for user in users:
+            try:
+                membership_card = get_or_create_membership_card(user)
+                email_messages.append(
+                    generate_email_message(
+                        membership_card=membership_card,
+                        card_image_url=ensure_uploaded_card_image(membership_card),
+                        apple_pass_url=ensure_uploaded_apple_pass(membership_card),
+                        **email_kwargs,
+                    )
+                )
+            except Exception as err:
+                logger.exception(
+                    f"Unable to generate bulk distribution email for {user=}: {err=}"
+                )
+                stats["num_failed"] += 1
+                failed_user_ids.append(user.id)
+        return build_bulk_email_messages(
+            email_messages=email_messages,
+            max_personalizations=batch_size,
+        )
+
+    retry_user_ids = sorted(retry_user_ids)
+    for start in range(0, len(retry_user_ids), batch_size):
+        batch_user_ids = retry_user_ids[start : start + batch_size]
+        users = (
+            User.query.filter(User.id.in_(batch_user_ids), User.has_active_membership)
+            .order_by(User.id)
+            .all()
+        )
+        bulk_messages = build_batch(users)
+        pending_user_ids = retry_user_ids[start + batch_size :]
+        yield (after_user_id, failed_user_ids + pending_user_ids), bulk_messages
+
+    while True:
+        users = get_active_members_after(after_user_id=after_user_id, limit=batch_size)
+        if not users:
+            return
+
+        bulk_messages = build_batch(users)
+        after_user_id = users[-1].id
+        yield (after_user_id, list(failed_user_ids)), bulk_messages
+
+
+def save_bulk_email_checkpoint(checkpoint_name, checkpoint):
+    last_user_id, failed_user_ids = checkpoint
+    set_last_processed_id(table_name=checkpoint_name, last_processed_id=last_user_id)
+    set_failed_ids(table_name=checkpoint_name, failed_ids=failed_user_ids)
+
+
+def process_bulk_email_distribution_request(message):
+    distribution_id = message["distribution_id"]
+    log_extra = dict(pubsub_message=message, distribution_id=distribution_id)
+    checkpoint_name = get_bulk_email_distribution_checkpoint_name(distribution_id)
+
+    # Resume from wherever an earlier attempt at this distribution left off
+    start_after_user_id = get_last_processed_id(checkpoint_name)
+    logger.info(
+        f"Processing bulk email distribution {distribution_id=} from {start_after_user_id=}",
+        extra=log_extra,
+    )
+
+    stats = dict(num_failed=0)
+    bulk_email_batches = generate_bulk_email_batches(
+        after_user_id=start_after_user_id,
+        batch_size=current_app.config["SENDGRID_BULK_MAX_PERSONALIZATIONS"],
+        stats=stats,
+        retry_user_ids=get_failed_ids(checkpoint_name),
+        subject=message.get("subject"),
+        submitted_on=message.get("submitted_on"),
+    )
+    stats.update(
+        send_bulk_email_messages(
+            bulk_message_batches=bulk_email_batches,
+            concurrency=current_app.config["SENDGRID_BULK_CONCURRENCY"],
+            on_batch_sent=lambda checkpoint: save_bulk_email_checkpoint(
+                checkpoint_name=checkpoint_name,
+                checkpoint=checkpoint,
+            ),
+        )
+    )
+    stats["last_processed_user_id"] = get_last_processed_id(checkpoint_name)
+    stats["failed_user_ids"] = get_failed_ids(checkpoint_name)
+    log_extra.update(dict(stats=stats))
+    logger.info(
+        f"Bulk email distribution {distribution_id=} complete: {stats=}",
+        extra=log_extra,
+    )
+    return stats
+
+
 def process_ensure_uploaded_card_image_request(message):
     logger.debug(f"Processing ensure_uploaded_card_image message: {message}")
     member_email_address = message["member_email_address"]
@@ -132,13 +269,13 @@ def sync_subscriptions_etl(message, load_all=False):
     bigcommerce_client = bigcommerce.get_app_client_for_store()
 
     if load_all:
-        memberships = bigcommerce.load_all_bigcommerce_orders(
+        membership_stats = bigcommerce.load_all_bigcommerce_orders(
             bigcommerce_client=bigcommerce_client,
             membership_skus=membership_skus,
         )
 
     else:
-        memberships = bigcommerce.bigcommerce_orders_etl(
+        membership_stats = bigcommerce.bigcommerce_orders_etl(
             bigcommerce_client=bigcommerce_client,
             membership_skus=membership_skus,
         )
@@ -146,8 +283,7 @@ def sync_subscriptions_etl(message, load_all=False):
     total_num_memberships_end = db.session.query(AnnualMembership.id).count()
     log_extra.update(
         dict(
-            active_memberships=[m for m in memberships if m.is_active],
-            inactive_memberships=[m for m in memberships if not m.is_active],
+            membership_stats=membership_stats,
             total_num_memberships_end=total_num_memberships_end,
             total_num_memberships_added=(
                 total_num_memberships_end - total_num_memberships_start
@@ -160,9 +296,9 @@ def sync_subscriptions_etl(message, load_all=False):
     )
     return {
         "stats": dict(
-            num_membership=len(memberships),
-            num_active_membership=len(log_extra["active_memberships"]),
-            num_inactive_membership=len(log_extra["inactive_memberships"]),
+            num_membership=membership_stats["num_membership"],
+            num_active_membership=membership_stats["num_active_membership"],
+            num_inactive_membership=membership_stats["num_inactive_membership"],
             total_num_memberships_start=total_num_memberships_start,
             total_num_memberships_end=total_num_memberships_end,
             total_num_memberships_added=log_extra["total_num_memberships_added"],
@@ -187,16 +323,80 @@ def sync_bigcommerce_order(message):
         return error_msg, 200
 
     logger.debug(f"sync_bigcommerce_order() called with {message=}", extra=log_extra)
+    order_id = message["data"]["id"]
+    if current_app.config["BIGCOMMERCE_ORDER_SYNC_QUIET_WINDOW_SECS"] > 0:
+        # Defer to the scheduled sync_pending_bigcommerce_orders sweep, which syncs the order once its events go quiet
+        register_order_event(store_hash=store_hash, order_id=order_id)
+        logger.info(f"Deferring sync for {order_id=}", extra=log_extra)
+        return "deferred"
+
     membership_skus = current_app.config["BIGCOMMERCE_MEMBERSHIP_SKUS"]
     bigcommerce_client = bigcommerce.get_app_client_for_store()
     bigcommerce.load_single_order(
         bigcommerce_client=bigcommerce_client,
         membership_skus=membership_skus,
-        order_id=message["data"]["id"],
+        order_id=order_id,
     )
     return "nah"
 
 
+def sync_pending_bigcommerce_orders(message):
+    log_extra = dict(pubsub_message=message)
+    logger.debug(
+        f"sync_pending_bigcommerce_orders() called with {message=}", extra=log_extra
+    )
+    num_expired = expire_stale_order_syncs(
+        max_age_secs=current_app.config["BIGCOMMERCE_ORDER_SYNC_MAX_PENDING_SECS"]
+    )
+    if num_expired:
+        logger.warning(
+            f"Expired {num_expired} stale pending order sync(s)", extra=log_extra
+        )
+
+    due_order_syncs = get_due_order_syncs(
+        store_hash=current_app.config["BIGCOMMERCE_STORE_HASH"],
+        quiet_window_secs=current_app.config[
+            "BIGCOMMERCE_ORDER_SYNC_QUIET_WINDOW_SECS"
+        ],
+    )
+    if not due_order_syncs:
+        return {"num_synced_orders": 0}
+
+    membership_skus = current_app.config["BIGCOMMERCE_MEMBERSHIP_SKUS"]
+    bigcommerce_client = bigcommerce.get_app_client_for_store()
+    num_synced_orders = 0
+    for pending_order_sync in due_order_syncs:
+        store_hash = pending_order_sync.store_hash
+        order_id = pending_order_sync.order_id
+        event_id = pending_order_sync.last_event_id
+        try:
+            bigcommerce.load_single_order(
+                bigcommerce_client=bigcommerce_client,
+                membership_skus=membership_skus,
+                order_id=order_id,
+            )
+        except Exception as err:
+            # Leave the row pending so the next sweep retries it (until it expires)
+            db.session.rollback()
+            logger.exception(
+                f"Unable to sync pending {order_id=}: {err=}", extra=log_extra
+            )
+            continue
+        num_synced_orders += 1
+
+        # Events that arrived mid-sync leave the row in place for the next sweep to pick up
+        num_events = claim_order_sync(
+            store_hash=store_hash,
+            order_id=order_id,
+            event_id=event_id,
+        )
+        logger.info(
+            f"Synced {order_id=} after coalescing {num_events or 0} event(s)",
+            extra=log_extra,
+        )
+    return {"num_synced_orders": num_synced_orders}
+
+
 def run_slack_members_etl(message):
     log_extra = dict(pubsub_message=message)
     logger.debug(f"run_slack_members_etl() called with {message=}", extra=log_extra)
@@ -240,32 +440,127 @@ def sync_minibc_subscriptions_etl(message):
         skus=membership_skus,
     )
     logger.debug(
-        f"sync_minibc_subscriptions_etl(): {len(etl_result)=}",
+        f"sync_minibc_subscriptions_etl(): {etl_result=}",
         extra=log_extra,
     )
 
 
-@worker_bp.route("/pubsub", methods=["POST"])
-def pubsub_ingress():
-    try:
-        message = parse_message()
-    except Exception as err:
-        return str(err), 400
-
-    MESSAGE_TYPE_HANDLERS = {
+def get_message_type_handlers():
+    return {
         "email_distribution_request": process_email_distribution_request,
+        "bulk_email_distribution_request": process_bulk_email_distribution_request,
         "sync_subscriptions_etl": sync_subscriptions_etl,
         "sync_minibc_subscriptions_etl": sync_minibc_subscriptions_etl,
         "sync_customers_etl": sync_customers_etl,
         "sync_squarespace_order": sync_squarespace_order,
         "sync_bigcommerce_order": sync_bigcommerce_order,
+        "sync_pending_bigcommerce_orders": sync_pending_bigcommerce_orders,
         "run_slack_members_etl": run_slack_members_etl,
         "ensure_uploaded_card_image_request": process_ensure_uploaded_card_image_request,
     }
 
+
+def dispatch_message(message, message_id=None):
+    """Hand `message` off to its type's handler, unless it has already been processed. Returns True if handled."""
+    message_type = message["type"]
+    message_type_handlers = get_message_type_handlers()
+    if message_type not in message_type_handlers:
+        raise NotImplementedError(f"Message type {message_type} is unsupported")
+
+    # Pub/Sub delivers at-least-once; skip anything we've already seen before doing any of the expensive bits
+    processed_message_ledger = get_processed_message_ledger()
+    idempotency_keys = get_message_idempotency_keys(
+        message=message,
+        message_id=message_id,
+    )
+    if processed_message_ledger.is_processed(idempotency_keys):
+        logger.info(
+            f"Skipping previously processed {message_type} message ({idempotency_keys=})",
+            extra=dict(pubsub_message=message),
+        )
+        return False
+
+    with track_queries() as query_stats:
+        message_type_handlers[message_type](message)
+    query_stats.log(
+        description=f"{message_type} message",
+        n_plus_one_threshold=current_app.config["SQL_N_PLUS_ONE_THRESHOLD"],
+        log_extra=dict(message_type=message_type, pubsub_message_id=message_id),
+    )
+    processed_message_ledger.record(
+        idempotency_keys=idempotency_keys,
+        message_type=message_type,
+    )
+    return True
+
+
+def handle_pulled_message(app, message):
+    """Streaming pull callback: dispatch `message` then ack it, or nack it for redelivery if its handler fails"""
+    with app.app_context():
+        try:
+            message_data = json.loads(message.data.decode("utf-8").strip())
+            dispatch_message(message=message_data, message_id=message.message_id)
+        except (ValueError, KeyError, NotImplementedError) as err:
+            # Malformed / unsupported messages won't fare any better on redelivery
+            logger.error(f"Dropping unprocessable {message.message_id=}: {err=}")
+        except Exception as err:
+            logger.exception(f"Error handling {message.message_id=}: {err=}")
+            message.nack()
+            return
+    message.ack()
+
+
+def run_streaming_pull_worker(
+    subscription_id,
+    max_messages,
+    max_bytes,
+    num_handler_threads,
+):
+    """Pull and dispatch messages from `subscription_id` until SIGTERM / SIGINT, then drain any in-flight handlers"""
+    app = current_app._get_current_object()
+    shutdown_requested = threading.Event()
+
+    def request_shutdown(signum, frame):
+        logger.info(f"Received signal {signum}, draining streaming pull worker...")
+        shutdown_requested.set()
+
+    previous_handlers = {
+        signum: signal.signal(signum, request_shutdown)
+        for signum in (signal.SIGTERM, signal.SIGINT)
+    }
+    streaming_pull_future = gcp.subscribe(
+        project_id=app.config["GCLOUD_PROJECT"],
+        subscription_id=subscription_id,
+        callback=lambda message: handle_pulled_message(app, message),
+        max_messages=max_messages,
+        max_bytes=max_bytes,
+        num_handler_threads=num_handler_threads,
+    )
+    try:
+        while not shutdown_requested.is_set() and not streaming_pull_future.done():
+            shutdown_requested.wait(timeout=1)
+    finally:
+        # Stops leasing new messages; result() then waits on handlers already underway
+        streaming_pull_future.cancel()
+        streaming_pull_future.result()
+        for signum, previous_handler in previous_handlers.items():
+            signal.signal(signum, previous_handler)
+    logger.info("Streaming pull worker shut down")
+
+
+@worker_bp.route("/pubsub", methods=["POST"])
+def pubsub_ingress():
+    try:
+        message = parse_message()
+    except Exception as err:
+        return str(err), 400
+
     message_type = message["type"]
-    if message_type not in MESSAGE_TYPE_HANDLERS:
+    if message_type not in get_message_type_handlers():
         return f"Message type {message_type} is unsupported", 400
 
-    MESSAGE_TYPE_HANDLERS[message["type"]](message)
+    dispatch_message(
+        message=message,
+        message_id=get_pubsub_message_id(),
+    )
     return ("", 204)
@@ -22,6 +22,13 @@ locals {
         type = "sync_subscriptions_etl",
       }
     }
+    sync_pending_bigcommerce_orders = {
+      description = "Sync storefront orders whose webhook events have gone quiet into membership database"
+      schedule    = "* * * * *"
+      data = {
+        type = "sync_pending_bigcommerce_orders",
+      }
+    }
     sync_minibc_subscriptions_etl = {
       description = "Regularly recurring MiniBC subscriptions into membership database ETL task"
       schedule    = "30 */12 * * *"
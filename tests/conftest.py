@@ -1,19 +1,35 @@
 import contextlib
 import os
 import uuid
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from typing import TYPE_CHECKING
 
 import flask_migrate
 import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
 from flask.testing import FlaskClient, FlaskCliRunner
 from flask_security import SQLAlchemySessionUserDatastore
 from member_card import create_worker_app
 from member_card.db import db
-from member_card.models.annual_membership import AnnualMembership
+from member_card.models.annual_membership import (
+    AnnualMembership,
+    record_upserted_memberships,
+    upsert_memberships,
+)
 from member_card.models.membership_card import MembershipCard
-from member_card.models import AppleDeviceRegistration, SlackUser, StoreUser
+from member_card.models import (
+    AppleDeviceRegistration,
+    DashboardStats,
+    ProcessedMessage,
+    SlackUser,
+    StoreUser,
+)
 from member_card.models.user import Role, User
+from member_card.passes.apple_wallet import PassSigner
+from member_card.query_stats import track_queries
 from mock import Mock, patch
 from PIL import Image
 
@@ -38,6 +54,8 @@ def app() -> "Flask":
     with app.app_context():
         MembershipCard.query.delete()
         AnnualMembership.query.delete()
+        ProcessedMessage.query.delete()
+        DashboardStats.query.delete()
         SlackUser.query.delete()
         StoreUser.query.delete()
 
@@ -98,6 +116,22 @@ def admin_client(app: "Flask", fake_admin_user):
         yield admin_client
 
 
+@pytest.fixture()
+def query_budget():
+    """Assert the block issues no more than `max_statements` SQL statements"""
+
+    @contextlib.contextmanager
+    def assert_query_budget(max_statements):
+        with track_queries() as query_stats:
+            yield query_stats
+        assert query_stats.num_statements <= max_statements, (
+            f"Issued {query_stats.num_statements} SQL statements (budget: {max_statements}); most common: "
+            f"{query_stats.statement_counts.most_common(3)}"
+        )
+
+    return assert_query_budget
+
+
 @pytest.fixture()
 def user_datastore(app: "Flask") -> SQLAlchemySessionUserDatastore:
     user_datastore = SQLAlchemySessionUserDatastore(db.session, User, Role)
@@ -124,6 +158,14 @@ def create_fake_user(app: "Flask", email, bigcommerce_id=1):
     return user
 
 
+def write_memberships(membership_rows):
+    """Upsert `membership_rows` and record them the way the ETLs do, committing the lot"""
+    memberships = upsert_memberships(membership_rows=membership_rows)
+    record_upserted_memberships(memberships)
+    db.session.commit()
+    return memberships
+
+
 @pytest.fixture()
 def fake_user(app: "Flask", user_datastore: SQLAlchemySessionUserDatastore) -> User:
     """Create fake user optionally with roles"""
@@ -280,3 +322,54 @@ def untrimmed_with_bg_img() -> "Image":
 @pytest.fixture()
 def untrimmed_img() -> "Image":
     return Image.open(get_test_file_path("untrimmed_img.png"))
+
+
+def generate_test_certificate(
+    common_name, private_key, issuer_name=None, issuer_key=None
+):
+    subject = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, common_name)])
+    now = datetime.now(tz=timezone.utc)
+    return (
+        x509.CertificateBuilder()
+        .subject_name(subject)
+        .issuer_name(issuer_name or subject)
+        .public_key(private_key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now)
+        .not_valid_after(now + timedelta(days=1))
+        .sign(issuer_key or private_key, hashes.SHA256())
+    )
+
+
+@pytest.fixture(scope="session")
+def pass_signing_material() -> dict:
+    wwdr_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    wwdr_cert = generate_test_certificate("Test WWDR", wwdr_key)
+    signer_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    signer_cert = generate_test_certificate(
+        "Test Pass Type ID",
+        signer_key,
+        issuer_name=wwdr_cert.subject,
+        issuer_key=wwdr_key,
+    )
+    private_key_password = "not-very-secret-at-all"
+    return dict(
+        certificate_pem=signer_cert.public_bytes(serialization.Encoding.PEM),
+        wwdr_certificate_pem=wwdr_cert.public_bytes(serialization.Encoding.PEM),
+        private_key_pem=signer_key.private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.TraditionalOpenSSL,
+            encryption_algorithm=serialization.BestAvailableEncryption(
+                private_key_password.encode("utf-8")
+            ),
+        ),
+        private_key_password=private_key_password,
+    )
+
+
+@pytest.fixture()
+def pass_signer(pass_signing_material: dict) -> PassSigner:
+    return PassSigner(
+        passfile_assets={"icon.png": b"fake-icon", "logo.png": b"fake-logo"},
+        **pass_signing_material,
+    )
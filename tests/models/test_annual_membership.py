@@ -1,5 +1,15 @@
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING
+
+from member_card.db import db
 from member_card.models import AnnualMembership
+from member_card.models.annual_membership import (
+    get_active_membership_cutoff,
+    upsert_memberships,
+)
+
+if TYPE_CHECKING:
+    from flask import Flask
 
 
 def test_to_dict(fake_membership_order: "AnnualMembership"):
@@ -15,6 +25,15 @@ def test_expiry_date_no_created_on():
     assert membership_order.expiry_date is None
 
 
+def test_expiry_date_expression(fake_membership_order: "AnnualMembership"):
+    expiry_date = (
+        db.session.query(AnnualMembership.expiry_date)
+        .filter_by(id=fake_membership_order.id)
+        .scalar()
+    )
+    assert expiry_date == fake_membership_order.expiry_date.replace(tzinfo=None)
+
+
 class TestIsActive:
     def test_canceled(self):
         membership_order = AnnualMembership()
@@ -38,5 +57,45 @@ class TestIsActive:
     def test_no_created_on_over_year_ago(self):
         membership_order = AnnualMembership()
         membership_order.fulfillment_status = "PENDING"
-        membership_order.created_on = AnnualMembership.one_year_ago
+        membership_order.created_on = get_active_membership_cutoff()
         assert membership_order.is_active is False
+
+    def test_expression(self, fake_membership_order: "AnnualMembership"):
+        active_ids = {
+            i
+            for i, in db.session.query(AnnualMembership.id).filter(
+                AnnualMembership.is_active
+            )
+        }
+        assert fake_membership_order.id in active_ids
+
+        fake_membership_order.created_on = datetime.utcnow() - timedelta(days=400)
+        db.session.commit()
+        assert (
+            db.session.query(AnnualMembership.id)
+            .filter(AnnualMembership.is_active)
+            .filter_by(id=fake_membership_order.id)
+            .first()
+            is None
+        )
+
+
+def test_upsert_memberships_leaves_commit_to_caller(app: "Flask"):
+    with app.app_context():
+        memberships = upsert_memberships(
+            membership_rows=[
+                dict(
+                    order_id="upsert-rollback-test",
+                    order_number="upsert-rollback-test",
+                    created_on=datetime.utcnow(),
+                )
+            ]
+        )
+        assert memberships[0].id
+        assert memberships.previously_canceled_by_order_id == {}
+
+        db.session.rollback()
+        assert (
+            AnnualMembership.query.filter_by(order_id="upsert-rollback-test").first()
+            is None
+        )
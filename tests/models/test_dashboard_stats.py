@@ -0,0 +1,160 @@
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING
+
+import pytest
+from conftest import write_memberships
+from member_card.db import db
+from member_card.models import AnnualMembership, DashboardStats, User
+from member_card.models.dashboard_stats import (
+    DASHBOARD_STATS_ID,
+    get_dashboard_stats,
+    recompute_dashboard_stats,
+)
+
+if TYPE_CHECKING:
+    from flask import Flask
+
+
+@pytest.fixture()
+def dashboard_stats(app: "Flask", fake_membership_order: "AnnualMembership"):
+    with app.app_context():
+        yield recompute_dashboard_stats()
+
+        db.session.query(DashboardStats).delete()
+        db.session.commit()
+
+
+def test_recompute_dashboard_stats(
+    dashboard_stats: "DashboardStats", fake_membership_order: "AnnualMembership"
+):
+    assert dashboard_stats.num_memberships == AnnualMembership.query.count()
+    assert dashboard_stats.num_users == User.query.count()
+    assert dashboard_stats.num_active_memberships >= 1
+    assert dashboard_stats.newest_membership_created_on >= (
+        fake_membership_order.created_on.replace(tzinfo=None)
+    )
+    assert dashboard_stats.time_recomputed
+
+
+def test_get_dashboard_stats_when_missing(app: "Flask"):
+    with app.app_context():
+        db.session.query(DashboardStats).delete()
+        db.session.commit()
+
+        # Nothing is computed (or written) on the read path
+        dashboard_stats = get_dashboard_stats()
+        assert dashboard_stats.num_users == 0
+        assert dashboard_stats.num_active_memberships == 0
+        assert db.session.query(DashboardStats).count() == 0
+
+
+def test_upserted_memberships_create_missing_dashboard_stats(
+    app: "Flask", fake_user: "User"
+):
+    with app.app_context():
+        db.session.query(DashboardStats).delete()
+        db.session.commit()
+
+        memberships = write_memberships(
+            membership_rows=[
+                dict(
+                    order_id="dashboard-stats-test-3",
+                    order_number="dashboard-stats-test-3",
+                    created_on=datetime.utcnow(),
+                    customer_email=fake_user.email,
+                )
+            ]
+        )
+        dashboard_stats = db.session.get(DashboardStats, DASHBOARD_STATS_ID)
+        assert dashboard_stats.num_memberships == AnnualMembership.query.count()
+
+        for membership in memberships:
+            db.session.delete(membership)
+        db.session.delete(dashboard_stats)
+        db.session.commit()
+
+
+def test_upserted_memberships_update_dashboard_stats(
+    dashboard_stats: "DashboardStats", fake_user: "User"
+):
+    num_memberships = dashboard_stats.num_memberships
+    num_active_memberships = dashboard_stats.num_active_memberships
+    newest_created_on = datetime.utcnow() + timedelta(minutes=1)
+    membership_rows = [
+        dict(
+            order_id="dashboard-stats-test-1",
+            order_number="dashboard-stats-test-1",
+            created_on=newest_created_on,
+            customer_email=fake_user.email,
+        ),
+        dict(
+            order_id="dashboard-stats-test-2",
+            order_number="dashboard-stats-test-2",
+            created_on=datetime.utcnow() - timedelta(days=400),
+            customer_email=fake_user.email,
+        ),
+    ]
+    memberships = write_memberships(membership_rows=membership_rows)
+    # Re-upserting existing orders shouldn't count them twice
+    write_memberships(membership_rows=membership_rows)
+
+    dashboard_stats = db.session.get(DashboardStats, dashboard_stats.id)
+    assert dashboard_stats.num_memberships == num_memberships + 2
+    assert dashboard_stats.num_active_memberships == num_active_memberships + 1
+    assert dashboard_stats.newest_membership_id == memberships[0].id
+
+    for membership in memberships:
+        db.session.delete(membership)
+    db.session.commit()
+
+
+def test_new_users_update_dashboard_stats(dashboard_stats: "DashboardStats"):
+    num_users = dashboard_stats.num_users
+
+    user = User(email="dashboard.stats.tester@example.com")
+    db.session.add(user)
+    db.session.commit()
+    assert db.session.get(DashboardStats, dashboard_stats.id).num_users == (
+        num_users + 1
+    )
+
+    db.session.delete(user)
+    db.session.commit()
+    assert db.session.get(DashboardStats, dashboard_stats.id).num_users == num_users
+
+
+def test_canceled_memberships_are_not_active(
+    dashboard_stats: "DashboardStats", fake_user: "User"
+):
+    num_memberships = dashboard_stats.num_memberships
+    num_active_memberships = dashboard_stats.num_active_memberships
+    membership_row = dict(
+        order_id="dashboard-stats-test-4",
+        order_number="dashboard-stats-test-4",
+        created_on=datetime.utcnow(),
+        customer_email=fake_user.email,
+        fulfillment_status="CANCELED",
+    )
+
+    def get_upserted_dashboard_stats(fulfillment_status):
+        write_memberships(
+            membership_rows=[
+                dict(membership_row, fulfillment_status=fulfillment_status)
+            ]
+        )
+        return db.session.get(DashboardStats, dashboard_stats.id)
+
+    dashboard_stats = get_upserted_dashboard_stats("CANCELED")
+    assert dashboard_stats.num_memberships == num_memberships + 1
+    assert dashboard_stats.num_active_memberships == num_active_memberships
+
+    dashboard_stats = get_upserted_dashboard_stats("COMPLETED")
+    assert dashboard_stats.num_active_memberships == num_active_memberships + 1
+
+    dashboard_stats = get_upserted_dashboard_stats("CANCELED")
+    assert dashboard_stats.num_memberships == num_memberships + 1
+    assert dashboard_stats.num_active_memberships == num_active_memberships
+    assert recompute_dashboard_stats().num_active_memberships == num_active_memberships
+
+    AnnualMembership.query.filter_by(order_id=membership_row["order_id"]).delete()
+    db.session.commit()
@@ -1,11 +1,19 @@
 from typing import TYPE_CHECKING
 
 from dateutil.parser import parse
+from member_card.db import db
 from member_card.models import MembershipCard
+from member_card.models.membership_card import (
+    ensure_membership_cards,
+    get_membership_card,
+    get_membership_cards_by_user_id,
+)
 
 if TYPE_CHECKING:
     from pytest_mock.plugin import MockerFixture
 
+    from member_card.models import User
+
 
 def test_google_pay_jwt_cached_locally(mocker: "MockerFixture"):
     mock_gen_jwt = mocker.patch("member_card.models.membership_card.generate_pass_jwt")
@@ -56,3 +64,59 @@ def test_qr_code_ascii(fake_card: "MembershipCard"):
 
 def test_authentication_token_hex(fake_card: "MembershipCard"):
     assert isinstance(fake_card.authentication_token_hex, str)
+
+
+def test_content_hash(fake_card: "MembershipCard"):
+    original_content_hash = fake_card.content_hash
+    assert fake_card.content_hash == original_content_hash
+    assert fake_card.remote_image_path.endswith(f"/{original_content_hash}.png")
+
+    original_fullname = fake_card.user.fullname
+    fake_card.user.fullname = f"{original_fullname} Renamed"
+    try:
+        assert fake_card.content_hash != original_content_hash
+    finally:
+        fake_card.user.fullname = original_fullname
+
+
+def test_content_hash_no_membership_dates(fake_card: "MembershipCard"):
+    fake_card.member_since = None
+    fake_card.member_until = None
+
+    assert fake_card.content_hash
+
+
+def test_get_membership_card(fake_card: "MembershipCard"):
+    assert get_membership_card(fake_card.user) == fake_card
+
+
+def test_get_membership_card_not_yet_created(fake_member: "User"):
+    assert get_membership_card(fake_member) is None
+
+
+def test_get_membership_cards_by_user_id(
+    fake_card: "MembershipCard", fake_user: "User"
+):
+    assert get_membership_cards_by_user_id([fake_card.user]) == {
+        fake_card.user_id: fake_card
+    }
+    assert get_membership_cards_by_user_id([]) == {}
+
+
+def test_ensure_membership_cards(fake_member: "User"):
+    new_cards = ensure_membership_cards(user_ids=[fake_member.id, None])
+
+    assert len(new_cards) == 1
+    membership_card = get_membership_card(fake_member)
+    assert membership_card == new_cards[0]
+    assert membership_card.qr_code_message.startswith("Content: ")
+    assert membership_card.member_until == fake_member.membership_expiry
+    # Members that already have a current card are left be
+    assert ensure_membership_cards(user_ids=[fake_member.id]) == []
+
+    db.session.delete(membership_card)
+    db.session.commit()
+
+
+def test_ensure_membership_cards_skips_non_members(fake_user: "User"):
+    assert ensure_membership_cards(user_ids=[fake_user.id]) == []
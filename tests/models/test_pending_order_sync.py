@@ -0,0 +1,68 @@
+from typing import TYPE_CHECKING
+
+from member_card.db import db
+from member_card.models import PendingOrderSync
+from member_card.models.pending_order_sync import (
+    claim_order_sync,
+    expire_stale_order_syncs,
+    get_due_order_syncs,
+    register_order_event,
+)
+
+if TYPE_CHECKING:
+    from flask import Flask
+
+
+def test_claim_latest_order_event(app: "Flask"):
+    with app.app_context():
+        first_event_id = register_order_event(store_hash="test-store", order_id=100)
+        second_event_id = register_order_event(store_hash="test-store", order_id=100)
+        other_order_event_id = register_order_event(
+            store_hash="test-store", order_id=101
+        )
+
+        # The earlier event was superseded, so only the latest one gets to sync the order
+        assert (
+            claim_order_sync(
+                store_hash="test-store", order_id=100, event_id=first_event_id
+            )
+            is None
+        )
+        assert (
+            claim_order_sync(
+                store_hash="test-store", order_id=100, event_id=second_event_id
+            )
+            == 2
+        )
+        assert (
+            claim_order_sync(
+                store_hash="test-store", order_id=100, event_id=second_event_id
+            )
+            is None
+        )
+        assert (
+            claim_order_sync(
+                store_hash="test-store", order_id=101, event_id=other_order_event_id
+            )
+            == 1
+        )
+        assert db.session.query(PendingOrderSync).count() == 0
+
+
+def test_due_and_stale_order_syncs(app: "Flask"):
+    with app.app_context():
+        register_order_event(store_hash="test-store", order_id=200)
+        register_order_event(store_hash="other-store", order_id=201)
+
+        # Nothing has been quiet for a whole minute yet
+        assert get_due_order_syncs(store_hash="test-store", quiet_window_secs=60) == []
+        assert [
+            pending_order_sync.order_id
+            for pending_order_sync in get_due_order_syncs(
+                store_hash="test-store", quiet_window_secs=0
+            )
+        ] == ["200"]
+
+        assert expire_stale_order_syncs(max_age_secs=60) == 0
+        assert expire_stale_order_syncs(max_age_secs=-60) == 2
+        assert db.session.query(PendingOrderSync).count() == 0
@@ -1,7 +1,15 @@
 from typing import TYPE_CHECKING
-from datetime import datetime
-from member_card.models import MembershipCard
-from member_card.models.user import User, edit_user_name, ensure_user
+from datetime import datetime, timedelta
+from member_card.models import AnnualMembership, MembershipCard
+from conftest import write_memberships
+from member_card.db import db
+from member_card.models.user import (
+    User,
+    UserResolver,
+    backfill_membership_summaries,
+    edit_user_name,
+    ensure_user,
+)
 
 if TYPE_CHECKING:
     from flask import Flask
@@ -52,6 +60,115 @@ def test_membership_expiry_yes_active_membership(fake_member: "User"):
     assert isinstance(fake_member.membership_expiry, datetime)
 
 
+def test_has_active_memberships_lapsed_summary(fake_member: "User"):
+    fake_member.membership_expiry = datetime.utcnow() - timedelta(days=1)
+    assert fake_member.has_active_memberships is False
+
+
+def test_has_active_memberships_grace_period(fake_member: "User"):
+    # Memberships stay active for a day past their expiry date, same as AnnualMembership.is_active
+    fake_member.membership_expiry = datetime.utcnow() - timedelta(hours=12)
+    assert fake_member.has_active_memberships
+    db.session.rollback()
+
+
+def test_membership_summary_maintained_on_flush(
+    fake_member: "User", fake_membership_order: "AnnualMembership"
+):
+    assert fake_member.has_active_membership is True
+    assert fake_member.membership_count == 1
+    assert fake_member.member_since == fake_membership_order.created_on.replace(
+        tzinfo=None
+    )
+    assert fake_member.membership_expiry == fake_member.member_since + timedelta(
+        days=365
+    )
+
+
+def test_membership_summary_reset_on_reassignment(
+    fake_member: "User", fake_membership_order: "AnnualMembership"
+):
+    fake_membership_order.user_id = None
+    db.session.commit()
+
+    assert fake_member.has_active_membership is False
+    assert fake_member.membership_count == 0
+    assert fake_member.member_since is None
+    assert fake_member.membership_expiry is None
+
+
+def test_membership_summary_ignores_canceled_orders(fake_user: "User"):
+    lapsed_created_on = datetime.utcnow() - timedelta(days=400)
+    memberships = write_memberships(
+        membership_rows=[
+            dict(
+                order_id="summary-lapsed-test",
+                order_number="summary-lapsed-test",
+                created_on=lapsed_created_on,
+                customer_email=fake_user.email,
+                user_id=fake_user.id,
+            ),
+            # The only recent order was canceled, so shouldn't extend the lapsed membership
+            dict(
+                order_id="summary-canceled-test",
+                order_number="summary-canceled-test",
+                created_on=datetime.utcnow(),
+                customer_email=fake_user.email,
+                user_id=fake_user.id,
+                fulfillment_status="CANCELED",
+            ),
+        ]
+    )
+    db.session.refresh(fake_user)
+
+    assert fake_user.membership_count == 2
+    assert fake_user.membership_expiry == lapsed_created_on + timedelta(days=365)
+    assert fake_user.has_active_memberships is False
+
+    for membership in memberships:
+        db.session.delete(membership)
+    db.session.commit()
+
+
+def test_membership_summary_refreshed_by_recorded_upserts(fake_user: "User"):
+    created_on = datetime.utcnow() - timedelta(days=400)
+    memberships = write_memberships(
+        membership_rows=[
+            dict(
+                order_id="summary-upsert-test",
+                order_number="summary-upsert-test",
+                created_on=created_on,
+                customer_email=fake_user.email,
+                user_id=fake_user.id,
+            )
+        ],
+    )
+
+    assert fake_user.membership_count == 1
+    assert fake_user.has_active_membership is False
+    assert fake_user.member_since == created_on
+
+    db.session.delete(memberships[0])
+    db.session.commit()
+    assert fake_user.membership_count == 0
+
+
+def test_backfill_membership_summaries(fake_member: "User"):
+    users_table = User.__table__
+    db.session.execute(
+        users_table.update()
+        .where(users_table.c.id == fake_member.id)
+        .values(has_active_membership=False, membership_count=0)
+    )
+    db.session.commit()
+    assert fake_member.has_memberships() is False
+
+    assert backfill_membership_summaries(batch_size=1) >= 1
+
+    assert fake_member.has_memberships()
+    assert fake_member.has_active_memberships
+
+
 def test_latest_membership_card_no_active_membership(fake_user: "User"):
     assert fake_user.latest_membership_card is None
 
@@ -133,3 +250,27 @@ def test_ensure_user_sets_password(fake_user: "User"):
         password="new-password?",
     )
     assert user.password
+
+
+def test_user_resolver_resolves_existing_and_new_users(app: "Flask", fake_user: "User"):
+    new_email = "new.resolver.user@example.com"
+    user_resolver = UserResolver()
+    user_resolver.preload([fake_user.email, new_email, fake_user.email])
+    assert user_resolver.users_by_email == {fake_user.email: fake_user}
+
+    existing_user = user_resolver.resolve(email=fake_user.email, bigcommerce_id=1234)
+    new_user = user_resolver.resolve(
+        email=new_email,
+        first_name="New",
+        last_name="Resolved",
+    )
+    assert user_resolver.resolve(email=new_email) is new_user
+    user_resolver.flush()
+
+    assert existing_user == fake_user
+    assert existing_user.bigcommerce_id == 1234
+    assert new_user.id
+    assert new_user.fullname == "New Resolved"
+
+    db.session.delete(new_user)
+    db.session.commit()
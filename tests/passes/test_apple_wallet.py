@@ -1,12 +1,20 @@
+import hashlib
+import json
+import zipfile
+from io import BytesIO
 from typing import TYPE_CHECKING
+
+from cryptography.hazmat.primitives.serialization import pkcs7
 from member_card.passes import apple_wallet
+from wallet.models import Generic, Pass
 
 if TYPE_CHECKING:
     from flask import Flask
     from pathlib import Path
+    from pytest_mock.plugin import MockerFixture
 
 
-def test_tmp_apple_developer_key(app: "Flask", tmpdir: "Path"):
+def test_load_apple_developer_key_from_file(app: "Flask", tmpdir: "Path"):
     test_filepath_content = "this is a secret developer key!"
 
     k = tmpdir / "fake_apple_developer.key"
@@ -15,8 +23,57 @@ def test_tmp_apple_developer_key(app: "Flask", tmpdir: "Path"):
     app.config["APPLE_KEY_FILEPATH"] = k
 
     with app.app_context():
-        with apple_wallet.tmp_apple_developer_key() as key_filepath:
-            with open(key_filepath, "r") as fp:
-                assert fp.read() == test_filepath_content
+        assert apple_wallet.apple_developer_key_configured()
+        assert apple_wallet.load_apple_developer_key() == test_filepath_content.encode(
+            "utf-8"
+        )
 
     app.config["APPLE_KEY_FILEPATH"] = ""
+
+
+def test_load_apple_developer_key_from_config(app: "Flask", mocker: "MockerFixture"):
+    mocker.patch.dict(
+        app.config,
+        {
+            "APPLE_KEY_FILEPATH": "",
+            "APPLE_DEVELOPER_PRIVATE_KEY": "-----BEGIN KEY-----\\nsecret\\n-----END KEY-----",
+        },
+    )
+    with app.app_context():
+        assert apple_wallet.apple_developer_key_configured()
+        assert (
+            apple_wallet.load_apple_developer_key()
+            == b"-----BEGIN KEY-----\nsecret\n-----END KEY-----"
+        )
+
+
+def test_pass_signer_create_pkpass(pass_signer: "apple_wallet.PassSigner"):
+    passfile = Pass(
+        Generic(),
+        passTypeIdentifier="pass.es.losverd.test",
+        organizationName="Los Verdes",
+        teamIdentifier="TEAMID",
+    )
+    passfile.serialNumber = "1234"
+
+    pkpass = pass_signer.create_pkpass(passfile)
+
+    with zipfile.ZipFile(BytesIO(pkpass)) as zf:
+        assert set(zf.namelist()) == {
+            "signature",
+            "manifest.json",
+            "pass.json",
+            "icon.png",
+            "logo.png",
+        }
+        manifest = json.loads(zf.read("manifest.json"))
+        for filename in ["pass.json", "icon.png", "logo.png"]:
+            assert manifest[filename] == hashlib.sha1(zf.read(filename)).hexdigest()
+        assert json.loads(zf.read("pass.json"))["serialNumber"] == "1234"
+
+        # Detached signature should bundle both the signing and WWDR certificates
+        signature_certs = pkcs7.load_der_pkcs7_certificates(zf.read("signature"))
+        assert {c.subject for c in signature_certs} == {
+            pass_signer.certificate.subject,
+            pass_signer.wwdr_certificate.subject,
+        }
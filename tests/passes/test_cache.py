@@ -0,0 +1,82 @@
+from datetime import datetime
+from typing import TYPE_CHECKING
+
+from member_card.passes import cache
+
+if TYPE_CHECKING:
+    from flask import Flask
+    from pytest_mock.plugin import MockerFixture
+
+
+def make_pkpass(num_bytes):
+    return cache.CachedPkpass(data=b"x" * num_bytes, last_modified=datetime.now())
+
+
+def test_pkpass_cache_hit_and_miss():
+    pkpass_cache = cache.PkpassCache(max_bytes=100, ttl_secs=60)
+    pkpass = make_pkpass(10)
+
+    assert pkpass_cache.get("serial-1") is None
+    pkpass_cache.set("serial-1", pkpass)
+    assert pkpass_cache.get("serial-1") is pkpass
+
+    stats = pkpass_cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["entries"] == 1
+    assert stats["num_bytes"] == 10
+
+
+def test_pkpass_cache_evicts_least_recently_used_within_byte_budget():
+    pkpass_cache = cache.PkpassCache(max_bytes=25, ttl_secs=60)
+    pkpass_cache.set("serial-1", make_pkpass(10))
+    pkpass_cache.set("serial-2", make_pkpass(10))
+    # Touch the first entry so the second one is now the least recently used
+    pkpass_cache.get("serial-1")
+    pkpass_cache.set("serial-3", make_pkpass(10))
+
+    assert pkpass_cache.get("serial-2") is None
+    assert pkpass_cache.get("serial-1") is not None
+    assert pkpass_cache.get("serial-3") is not None
+    stats = pkpass_cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["num_bytes"] == 20
+
+
+def test_pkpass_cache_skips_oversized_entries():
+    pkpass_cache = cache.PkpassCache(max_bytes=5, ttl_secs=60)
+    pkpass_cache.set("serial-1", make_pkpass(10))
+
+    assert len(pkpass_cache) == 0
+    assert pkpass_cache.stats()["num_bytes"] == 0
+
+
+def test_pkpass_cache_expires_entries(mocker: "MockerFixture"):
+    mock_monotonic = mocker.patch("member_card.passes.cache.monotonic")
+    mock_monotonic.return_value = 1000
+    pkpass_cache = cache.PkpassCache(max_bytes=100, ttl_secs=60)
+    pkpass_cache.set("serial-1", make_pkpass(10))
+
+    mock_monotonic.return_value = 1061
+    assert pkpass_cache.get("serial-1") is None
+    stats = pkpass_cache.stats()
+    assert stats["expirations"] == 1
+    assert stats["num_bytes"] == 0
+
+
+def test_pkpass_cache_get_or_create_only_creates_on_miss(mocker: "MockerFixture"):
+    pkpass_cache = cache.PkpassCache(max_bytes=100, ttl_secs=60)
+    create_func = mocker.Mock(return_value=make_pkpass(10))
+
+    first = pkpass_cache.get_or_create("serial-1", create_func)
+    second = pkpass_cache.get_or_create("serial-1", create_func)
+
+    assert first is second
+    create_func.assert_called_once()
+
+
+def test_get_pkpass_cache(app: "Flask"):
+    with app.app_context():
+        pkpass_cache = cache.get_pkpass_cache()
+        assert pkpass_cache is cache.get_pkpass_cache()
+        assert pkpass_cache.max_bytes == app.config["PKPASS_CACHE_MAX_BYTES"]
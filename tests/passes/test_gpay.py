@@ -128,12 +128,12 @@ class TestGooglePayApiClient:
         assert response
         mock_new_client.return_value.insert_class.assert_called_once()
 
-    # def test_patch_object(self, pay_client_mock: gpay.GooglePayApiClient):
-    #     response = pay_client_mock["client"].patch_object(
-    #         object_id="test-object_id",
-    #         payload=dict(),
-    #     )
-    #     assert response
+    def test_patch_object(self, pay_client_mock: gpay.GooglePayApiClient):
+        response = pay_client_mock["client"].patch_object(
+            object_id="test-object_id",
+            payload=dict(),
+        )
+        assert response
 
 
 class TestGeneratePassJwt:
@@ -153,3 +153,31 @@ class TestGeneratePassJwt:
 
         mock_new_google_pass_jwt.assert_called_once()
         mock_gpay_client.insert_object.assert_called_once()
+
+
+class TestUpsertPassObject:
+    def test_insert(self, app: "Flask", fake_card: "MembershipCard", mocker):
+        mock_gpay_client = mocker.Mock()
+        mock_gpay_client.insert_object.return_value.status_code = 200
+
+        with app.app_context():
+            response = gpay.upsert_pass_object(
+                membership_card=fake_card,
+                gpay_client=mock_gpay_client,
+            )
+
+        assert response is mock_gpay_client.insert_object.return_value
+        mock_gpay_client.patch_object.assert_not_called()
+
+    def test_patch_existing(self, app: "Flask", fake_card: "MembershipCard", mocker):
+        mock_gpay_client = mocker.Mock()
+        mock_gpay_client.insert_object.return_value.status_code = 409
+
+        with app.app_context():
+            response = gpay.upsert_pass_object(
+                membership_card=fake_card,
+                gpay_client=mock_gpay_client,
+            )
+
+        assert response is mock_gpay_client.patch_object.return_value
+        response.raise_for_status.assert_called_once()
@@ -1,10 +1,16 @@
+import json
+import zipfile
+from io import BytesIO
+
 from member_card import passes
+from member_card.passes.cache import PkpassCache
 from urllib.parse import urlparse
 from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
     from flask import Flask
     from member_card.models import MembershipCard
+    from member_card.passes.apple_wallet import PassSigner
     from pytest_mock.plugin import MockerFixture
 
 
@@ -42,31 +48,38 @@ class TestPkPass:
         assert passfile
 
     def test_create_pkpass(
-        self, app: "Flask", fake_card: "MembershipCard", mocker: "MockerFixture"
+        self,
+        app: "Flask",
+        fake_card: "MembershipCard",
+        pass_signer: "PassSigner",
     ):
-        mock_create_passfile = mocker.patch("member_card.passes.create_passfile")
-        key_filepath = "test-key_filepath"
-        key_password = "test-key_password"
-        pkpass_buffer = passes.create_pkpass(
+        pkpass = passes.create_pkpass(
             membership_card=fake_card,
-            key_filepath=key_filepath,
-            key_password=key_password,
+            pass_signer=pass_signer,
         )
-        assert pkpass_buffer
-        mock_create_passfile().create.assert_called_once()
+        with zipfile.ZipFile(BytesIO(pkpass)) as zf:
+            pass_json = json.loads(zf.read("pass.json"))
+        assert pass_json["serialNumber"] == fake_card.apple_pass_serial_number
 
-    def test_get_apple_pass_from_card(
-        self, app: "Flask", fake_card: "MembershipCard", mocker: "MockerFixture"
+    def test_get_pass_signer(
+        self, app: "Flask", mocker: "MockerFixture", pass_signer: "PassSigner"
     ):
-        mock_create_pkpass = mocker.patch("member_card.passes.create_pkpass")
-        passes.get_apple_pass_from_card(membership_card=fake_card)
-        mock_create_pkpass.assert_called_once()
+        mock_from_app_config = mocker.patch(
+            "member_card.passes.PassSigner.from_app_config",
+            return_value=pass_signer,
+        )
+        mocker.patch("member_card.passes._pass_signer", None)
+
+        with app.app_context():
+            assert passes.get_pass_signer() is pass_signer
+            assert passes.get_pass_signer() is pass_signer
+        mock_from_app_config.assert_called_once()
 
     def test_generate_and_upload_apple_pass(
         self, app: "Flask", fake_card: "MembershipCard", mocker: "MockerFixture"
     ):
-        mock_get_pass = mocker.patch("member_card.passes.get_apple_pass_from_card")
-        mock_upload = mocker.patch("member_card.passes.upload_file_to_gcs")
+        mock_get_pass = mocker.patch("member_card.passes.get_cached_apple_pass")
+        mock_upload = mocker.patch("member_card.passes.upload_bytes_to_gcs")
         mock_get_bucket = mocker.patch("member_card.passes.get_bucket")
 
         mock_blob = mock_upload.return_value
@@ -77,9 +90,39 @@ class TestPkPass:
             membership_card=fake_card,
         )
 
-        expected_url = f"{test_bucket_id}/membership-cards/apple-passes/{fake_card.apple_pass_serial_number}.pkpass"
+        expected_url = f"{test_bucket_id}/membership-cards/apple-passes/{fake_card.content_hash}.pkpass"
         assert card_image_url == expected_url
 
         mock_get_pass.assert_called_once()
         mock_get_bucket.assert_called_once()
         mock_upload.assert_called_once()
+
+    def test_ensure_uploaded_apple_pass(
+        self, app: "Flask", fake_card: "MembershipCard", mocker: "MockerFixture"
+    ):
+        mock_generate = mocker.patch(
+            "member_card.passes.generate_and_upload_apple_pass"
+        )
+
+        passes.ensure_uploaded_apple_pass(membership_card=fake_card)
+        apple_pass_url = passes.ensure_uploaded_apple_pass(membership_card=fake_card)
+
+        mock_generate.assert_called_once_with(fake_card)
+        assert apple_pass_url.endswith(f"/{fake_card.remote_apple_pass_path}")
+
+    def test_get_cached_apple_pass(
+        self, app: "Flask", fake_card: "MembershipCard", mocker: "MockerFixture"
+    ):
+        mock_create_pkpass = mocker.patch("member_card.passes.create_pkpass")
+        mock_create_pkpass.return_value = b"signed-pkpass"
+        mocker.patch(
+            "member_card.passes.get_pkpass_cache",
+            return_value=PkpassCache(max_bytes=1024, ttl_secs=60),
+        )
+
+        first_pkpass = passes.get_cached_apple_pass(membership_card=fake_card)
+        second_pkpass = passes.get_cached_apple_pass(membership_card=fake_card)
+
+        assert first_pkpass is second_pkpass
+        assert first_pkpass.data == b"signed-pkpass"
+        mock_create_pkpass.assert_called_once()
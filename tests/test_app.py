@@ -1,4 +1,5 @@
 import logging
+from datetime import datetime, timezone
 from typing import TYPE_CHECKING
 from urllib.parse import quote_plus
 
@@ -7,7 +8,9 @@ from flask.testing import FlaskClient
 from member_card import utils
 from urllib.parse import urlparse
 from member_card.app import commit_on_success, recaptcha
+from member_card.db import db
 from member_card.models.user import User
+from member_card.passes.cache import CachedPkpass
 from member_card.squarespace import InvalidSquarespaceWebhookSignature
 
 if TYPE_CHECKING:
@@ -51,6 +54,17 @@ def test_db_commit_on_teardown(app, client, mocker):
     mock_session.stop()
 
 
+def test_db_teardown_skips_commit_for_clean_session(client, mocker):
+    mock_session = mocker.patch.object(db, "session")
+    mock_session.new = mock_session.dirty = mock_session.deleted = []
+
+    commit_on_success()
+
+    mock_session.commit.assert_not_called()
+    mock_session.rollback.assert_not_called()
+    mock_session.remove.assert_called_once()
+
+
 def test_db_teardown_rollback_on_error(client, mocker):
     from member_card.db import db
 
@@ -146,6 +160,30 @@ class TestUnauthenticatedRequests:
             client, path="/verify-pass/some-serial-number", method="GET"
         )
 
+    def test_admin_pkpass_cache_stats(self, admin_client: "FlaskClient"):
+        response = admin_client.get("/admin-dashboard/pkpass-cache-stats")
+
+        assert response.status_code == 200
+        assert set(response.json) >= {
+            "entries",
+            "num_bytes",
+            "hits",
+            "misses",
+            "evictions",
+        }
+
+    def test_admin_db_replica_stats(self, admin_client: "FlaskClient"):
+        response = admin_client.get("/admin-dashboard/db-replica-stats")
+
+        assert response.status_code == 200
+        assert response.json == dict(status="no read replica configured")
+
+    def test_admin_db_pool_stats(self, admin_client: "FlaskClient"):
+        response = admin_client.get("/admin-dashboard/db-pool-stats")
+
+        assert response.status_code == 200
+        assert response.json
+
     def test_logout(
         self,
         client: "FlaskClient",
@@ -198,7 +236,9 @@ class TestAuthenticatedRequests:
             assert current_login_user
         assert b"los.verdes.tester@gmail.com" in response.data
 
-    def test_home_route_with_active_membership(self, authenticated_client, fake_member):
+    def test_home_route_with_active_membership(
+        self, fake_card, authenticated_client, fake_member
+    ):
         response = authenticated_client.get("/")
         logging.debug(response)
 
@@ -231,6 +271,7 @@ class TestAuthenticatedRequests:
     def test_edit_user_name_by_active_member(
         self,
         app: "Flask",
+        fake_card: "MembershipCard",
         authenticated_client: "FlaskClient",
         fake_member: "User",
         mocker: "MockerFixture",
@@ -368,17 +409,52 @@ class TestAuthenticatedRequests:
 
         assert response.location == fake_card.google_pass_save_url
 
+    def test_passes_google_pay_existing_card_is_read_only(
+        self,
+        authenticated_client: "FlaskClient",
+        fake_card,
+        mocker: "MockerFixture",
+    ):
+        fake_card._google_pay_jwt = "test_google_pay_jwt"
+        spy_commit = mocker.spy(db.session, "commit")
+        mock_request_card = mocker.patch("member_card.app.request_membership_card")
+
+        response = authenticated_client.get("/passes/google-pay")
+
+        assert response.status_code == 302
+        mock_request_card.assert_not_called()
+        spy_commit.assert_not_called()
+
+    def test_passes_google_pay_missing_card_is_requested(
+        self,
+        authenticated_client: "FlaskClient",
+        fake_member: "User",
+        mocker: "MockerFixture",
+    ):
+        spy_commit = mocker.spy(db.session, "commit")
+        mock_publish_message = mocker.patch("member_card.app.publish_message")
+
+        response = authenticated_client.get("/passes/google-pay")
+
+        assert response.status_code == 200
+        assert b"Membership Card Pending" in response.data
+        assert mock_publish_message.call_args.kwargs["message_data"] == dict(
+            type="ensure_uploaded_card_image_request",
+            member_email_address=fake_member.email,
+        )
+        spy_commit.assert_not_called()
+
     def test_passes_apple_pay_no_active_membership(
         self,
         authenticated_client: "FlaskClient",
         mocker: "MockerFixture",
     ):
-        mock_get_apple_pass_from_card = mocker.patch(
-            "member_card.app.get_apple_pass_from_card"
+        mock_get_cached_apple_pass = mocker.patch(
+            "member_card.app.get_cached_apple_pass"
         )
         response = authenticated_client.get("/passes/apple-pay")
 
-        mock_get_apple_pass_from_card.assert_not_called()
+        mock_get_cached_apple_pass.assert_not_called()
         assert response.location == "http://localhost/no-active-membership-found"
 
     def test_passes_apple_pay_with_active_membership(
@@ -386,23 +462,37 @@ class TestAuthenticatedRequests:
         authenticated_client: "FlaskClient",
         fake_card,
         mocker: "MockerFixture",
-        tmpdir,
     ):
-        mock_get_apple_pass_from_card = mocker.patch(
-            "member_card.app.get_apple_pass_from_card"
-        )
-        fake_pkpass_content = "<insert pass here>"
-        p = tmpdir.join("path.pkpass")
-        p.write(fake_pkpass_content)
-        fake_pkpass_path = p.strpath
-        mock_get_apple_pass_from_card.return_value = fake_pkpass_path
+        mock_get_cached_apple_pass = mocker.patch(
+            "member_card.app.get_cached_apple_pass"
+        )
+        fake_pkpass_content = b"<insert pass here>"
+        fake_last_modified = datetime(2021, 1, 1, tzinfo=timezone.utc)
+        mock_get_cached_apple_pass.return_value = CachedPkpass(
+            data=fake_pkpass_content,
+            last_modified=fake_last_modified,
+        )
         response = authenticated_client.get("/passes/apple-pay")
-        assert fake_pkpass_content.encode("utf-8") in response.data
+        assert fake_pkpass_content in response.data
         assert response.headers["Content-Type"] == "application/vnd.apple.pkpass"
-        mock_get_apple_pass_from_card.assert_called_once_with(
+        assert (
+            response.headers["ETag"]
+            == f'"{mock_get_cached_apple_pass.return_value.etag}"'
+        )
+        assert response.last_modified == fake_last_modified
+        mock_get_cached_apple_pass.assert_called_once_with(
             membership_card=fake_card,
         )
 
+        # Clients that already have the latest pass get a 304 rather than the whole thing again
+        response = authenticated_client.get(
+            "/passes/apple-pay",
+            headers={
+                "If-None-Match": f'"{mock_get_cached_apple_pass.return_value.etag}"'
+            },
+        )
+        assert response.status_code == 304
+
     def test_squarespace_oauth_login(
         self,
         authenticated_client: "FlaskClient",
@@ -1,12 +1,17 @@
+import threading
+from datetime import datetime, timezone
+from time import sleep
 from typing import TYPE_CHECKING
 
 import pytest
+from bigcommerce.exception import RateLimitingException
 from conftest import create_fake_user
 from mock import sentinel
 
 from member_card import bigcommerce
 from member_card.db import db
 from member_card.models import AnnualMembership, User
+from member_card.models.membership_card import get_membership_card
 
 if TYPE_CHECKING:
     from flask import Flask
@@ -251,10 +256,13 @@ def test_parse_subscription_orders(app: "Flask", mock_order, mocker):
             product_options=[dict(id=1)],
         ),
     ]
+    mocker.patch(
+        "member_card.bigcommerce.get_app_client_for_store",
+        return_value=mock_bigcomm_api,
+    )
     mock_order["date_shipped"] = "2023-01-02T11:22:33Z"
     with app.app_context():
         returned_membership_orders = bigcommerce.parse_subscription_orders(
-            bigcommerce_client=mock_bigcomm_api,
             membership_skus=app.config["BIGCOMMERCE_MEMBERSHIP_SKUS"],
             subscription_orders=[mock_order],
         )
@@ -262,12 +270,108 @@ def test_parse_subscription_orders(app: "Flask", mock_order, mocker):
         assert returned_membership_orders[0].fulfilled_on is not None
 
 
+def test_fetch_order_products_retries_when_rate_limited(app: "Flask", mocker):
+    mock_sleep = mocker.patch("member_card.bigcommerce.sleep")
+    mock_response = mocker.MagicMock()
+    mock_response.headers = {"X-Rate-Limit-Time-Reset-Ms": "1500"}
+    mock_bigcomm_api = mocker.MagicMock()
+    mock_bigcomm_api.OrderProducts.all.side_effect = [
+        RateLimitingException("429 Too Many Requests", mock_response),
+        [dict(id=1)],
+    ]
+    with app.app_context():
+        order_products = bigcommerce.fetch_order_products(
+            bigcommerce_client=mock_bigcomm_api,
+            order_id=123,
+        )
+    assert order_products == [dict(id=1)]
+    mock_sleep.assert_called_once_with(1.5)
+
+
+def test_fetch_order_products_gives_up_after_max_retries(app: "Flask", mocker):
+    mocker.patch("member_card.bigcommerce.sleep")
+    mock_response = mocker.MagicMock()
+    mock_response.headers = {"X-Rate-Limit-Time-Reset-Ms": "10"}
+    mock_bigcomm_api = mocker.MagicMock()
+    mock_bigcomm_api.OrderProducts.all.side_effect = RateLimitingException(
+        "429 Too Many Requests", mock_response
+    )
+    with app.app_context(), pytest.raises(RateLimitingException):
+        bigcommerce.fetch_order_products(
+            bigcommerce_client=mock_bigcomm_api,
+            order_id=123,
+            max_retries=2,
+        )
+    assert mock_bigcomm_api.OrderProducts.all.call_count == 3
+
+
+def test_generate_orders_with_products_preserves_order(app: "Flask", mocker):
+    def slow_for_early_orders(order_id):
+        # Make earlier orders finish last to make sure results still come back in submission order
+        sleep(0.01 * (5 - order_id))
+        return [dict(id=order_id)]
+
+    mock_bigcomm_api = mocker.MagicMock()
+    mock_bigcomm_api.OrderProducts.all.side_effect = slow_for_early_orders
+    mocker.patch(
+        "member_card.bigcommerce.get_app_client_for_store",
+        return_value=mock_bigcomm_api,
+    )
+    orders = [dict(id=i) for i in range(5)]
+    with app.app_context():
+        orders_with_products = list(
+            bigcommerce.generate_orders_with_products(
+                orders=orders,
+                max_workers=3,
+            )
+        )
+    assert orders_with_products == [(o, [dict(id=o["id"])]) for o in orders]
+
+
+def test_generate_orders_with_products_client_per_thread(app: "Flask", mocker):
+    client_threads = {}
+
+    def new_client():
+        mock_bigcomm_api = mocker.MagicMock()
+
+        def fetch_products(order_id):
+            client_threads.setdefault(id(mock_bigcomm_api), set()).add(
+                threading.get_ident()
+            )
+            sleep(0.01)
+            return [dict(id=order_id)]
+
+        mock_bigcomm_api.OrderProducts.all.side_effect = fetch_products
+        return mock_bigcomm_api
+
+    mocker.patch(
+        "member_card.bigcommerce.get_app_client_for_store", side_effect=new_client
+    )
+    with app.app_context():
+        orders_with_products = list(
+            bigcommerce.generate_orders_with_products(
+                orders=[dict(id=i) for i in range(6)],
+                max_workers=3,
+            )
+        )
+    assert len(orders_with_products) == 6
+    # No client is ever shared between the pool's threads
+    assert client_threads
+    assert all(len(thread_ids) == 1 for thread_ids in client_threads.values())
+
+
 def test_load_all_bigcommerce_orders(app: "Flask", mocker):
     mock_bigcomm_api_class = mocker.patch("member_card.bigcommerce.BiggercommerceApi")
     mock_bigcomm_api = mock_bigcomm_api_class()
     mock_load_orders = mocker.patch("member_card.bigcommerce.load_orders")
-    mocker.patch("member_card.bigcommerce.parse_subscription_orders")
-    bigcommerce.load_all_bigcommerce_orders(
+    mock_generate_batches = mocker.patch(
+        "member_card.bigcommerce.generate_membership_batches"
+    )
+    mock_generate_batches.return_value = [
+        [mocker.Mock(is_active=True), mocker.Mock(is_active=False)],
+        [mocker.Mock(is_active=True)],
+    ]
+    membership_stats = bigcommerce.load_all_bigcommerce_orders(
         bigcommerce_client=mock_bigcomm_api,
         membership_skus=app.config["BIGCOMMERCE_MEMBERSHIP_SKUS"],
     )
@@ -275,6 +379,11 @@ def test_load_all_bigcommerce_orders(app: "Flask", mocker):
         bigcommerce_client=mock_bigcomm_api,
         membership_skus=app.config["BIGCOMMERCE_MEMBERSHIP_SKUS"],
     )
+    assert membership_stats == dict(
+        num_membership=3,
+        num_active_membership=2,
+        num_inactive_membership=1,
+    )
 
 
 def test_load_single_order(app: "Flask", mock_order, mocker):
@@ -291,7 +400,6 @@ def test_load_single_order(app: "Flask", mock_order, mocker):
     )
     mock_bigcomm_api.Orders.get.assert_called_once_with(mock_order["id"])
     mock_parser_orders.assert_called_once_with(
-        bigcommerce_client=mock_bigcomm_api,
         membership_skus=app.config["BIGCOMMERCE_MEMBERSHIP_SKUS"],
         subscription_orders=[mock_order],
     )
@@ -301,9 +409,10 @@ def test_bigcommerce_orders_etl(app: "Flask", mock_order, mocker):
     mock_bigcomm_api_class = mocker.patch("member_card.bigcommerce.BigcommerceApi")
     mock_bigcomm_api = mock_bigcomm_api_class()
     mock_load_orders = mocker.patch("member_card.bigcommerce.load_orders")
-    mock_parser_orders = mocker.patch(
-        "member_card.bigcommerce.parse_subscription_orders"
+    mock_generate_batches = mocker.patch(
+        "member_card.bigcommerce.generate_membership_batches"
     )
+    mock_generate_batches.return_value = []
     mock_bigcomm_api.Orders.get.return_value = mock_order
 
     with app.app_context():
@@ -312,7 +421,7 @@ def test_bigcommerce_orders_etl(app: "Flask", mock_order, mocker):
             membership_skus=app.config["BIGCOMMERCE_MEMBERSHIP_SKUS"],
         )
     mock_load_orders.assert_called_once()
-    mock_parser_orders.assert_called_once()
+    mock_generate_batches.assert_called_once()
 
 
 def test_load_orders(app: "Flask", mock_order, mocker):
@@ -481,3 +590,95 @@ class TestBigcommerceCustomerEtl:
 
 
 # jscpd:ignore-end
+
+
+def test_parse_subscription_orders_in_batches(app: "Flask", mock_order, mocker):
+    mock_bigcomm_api = mocker.MagicMock()
+    mock_bigcomm_api.OrderProducts.all.return_value = [
+        dict(
+            id=1,
+            product_id=123,
+            name="LOS VERDES TEST MEMBERSHIP!",
+            sku=app.config["BIGCOMMERCE_MEMBERSHIP_SKUS"][0],
+        ),
+    ]
+    mock_orders = []
+    for order_id in range(200, 203):
+        mock_orders.append(dict(mock_order, id=order_id, cart_id=f"cart-{order_id}"))
+    mocker.patch(
+        "member_card.bigcommerce.get_app_client_for_store",
+        return_value=mock_bigcomm_api,
+    )
+    spy_bulk_upsert = mocker.spy(bigcommerce, "upsert_memberships")
+    with app.app_context():
+        returned_membership_orders = bigcommerce.parse_subscription_orders(
+            membership_skus=app.config["BIGCOMMERCE_MEMBERSHIP_SKUS"],
+            subscription_orders=mock_orders,
+            batch_size=2,
+        )
+        assert [m.order_id for m in returned_membership_orders] == [
+            "200_bc",
+            "201_bc",
+            "202_bc",
+        ]
+        assert spy_bulk_upsert.call_count == 2
+        assert all(m.user_id for m in returned_membership_orders)
+
+
+def test_generate_membership_batches_commits_whole_batches(
+    app: "Flask", mock_order, mocker
+):
+    mock_bigcomm_api = mocker.MagicMock()
+    mock_bigcomm_api.OrderProducts.all.return_value = [
+        dict(
+            id=1,
+            product_id=123,
+            name="LOS VERDES TEST MEMBERSHIP!",
+            sku=app.config["BIGCOMMERCE_MEMBERSHIP_SKUS"][0],
+        ),
+    ]
+    mocker.patch(
+        "member_card.bigcommerce.get_app_client_for_store",
+        return_value=mock_bigcomm_api,
+    )
+    record_upserted_memberships = bigcommerce.record_upserted_memberships
+
+    def fail_second_batch(memberships):
+        if memberships[0].order_id == "301_bc":
+            raise Exception("nope")
+        record_upserted_memberships(memberships)
+
+    mocker.patch(
+        "member_card.bigcommerce.record_upserted_memberships",
+        side_effect=fail_second_batch,
+    )
+    date_created = datetime.now(tz=timezone.utc).isoformat()
+    mock_orders = [
+        dict(
+            mock_order,
+            id=order_id,
+            cart_id=f"cart-{order_id}",
+            date_created=date_created,
+        )
+        for order_id in (300, 301)
+    ]
+    with app.app_context():
+        with pytest.raises(Exception, match="nope"):
+            list(
+                bigcommerce.generate_membership_batches(
+                    membership_skus=app.config["BIGCOMMERCE_MEMBERSHIP_SKUS"],
+                    subscription_orders=mock_orders,
+                    batch_size=1,
+                )
+            )
+        db.session.rollback()
+
+        # The first batch went through in full (card and all) while none of the failed one was left behind
+        membership = AnnualMembership.query.filter_by(order_id="300_bc").one()
+        membership_card = get_membership_card(membership.user)
+        assert membership_card is not None
+        assert AnnualMembership.query.filter_by(order_id="301_bc").first() is None
+
+        db.session.delete(membership_card)
+        db.session.delete(membership)
+        db.session.commit()
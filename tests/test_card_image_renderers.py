@@ -0,0 +1,126 @@
+import shutil
+import uuid
+from datetime import datetime
+from typing import TYPE_CHECKING
+
+import pytest
+from conftest import get_test_file_path
+from PIL import Image, ImageChops, ImageStat
+
+from member_card import image
+from member_card.models import MembershipCard, User
+
+if TYPE_CHECKING:
+    from flask import Flask
+
+GOLDEN_CARD_IMAGE_FILENAME = "golden_card_image_pillow.png"
+
+
+@pytest.fixture()
+def golden_card() -> MembershipCard:
+    # A transient (never committed) card with fixed details so renders are reproducible
+    return MembershipCard(
+        user=User(fullname="Verde Tester", email="golden.card@losverd.es"),
+        serial_number=uuid.UUID(int=1),
+        member_since=datetime(2020, 3, 1),
+        member_until=datetime(2024, 3, 1),
+        qr_code_message="Content: https://card.losverd.es/verify-pass/golden",
+    )
+
+
+@pytest.fixture()
+def bitmap_font(app: "Flask"):
+    # Pillow's built-in bitmap font renders the same everywhere, unlike whatever TrueType fonts a host may have
+    original_font_path = app.config["CARD_IMAGE_FONT_PATH"]
+    app.config["CARD_IMAGE_FONT_PATH"] = ""
+    yield
+    app.config["CARD_IMAGE_FONT_PATH"] = original_font_path
+
+
+def rms_difference(img_a, img_b):
+    diff = ImageChops.difference(img_a.convert("RGBA"), img_b.convert("RGBA"))
+    return max(ImageStat.Stat(diff).rms)
+
+
+def test_get_card_image_renderer(app: "Flask"):
+    with app.app_context():
+        assert isinstance(image.get_card_image_renderer(), image.HtmlCardImageRenderer)
+        app.config["CARD_IMAGE_RENDERER"] = "pillow"
+        try:
+            renderer = image.get_card_image_renderer()
+        finally:
+            app.config["CARD_IMAGE_RENDERER"] = "html"
+    assert isinstance(renderer, image.PillowCardImageRenderer)
+
+
+def test_get_card_image_renderer_unknown(app: "Flask"):
+    app.config["CARD_IMAGE_RENDERER"] = "crayons"
+    try:
+        with app.app_context(), pytest.raises(NotImplementedError):
+            image.get_card_image_renderer()
+    finally:
+        app.config["CARD_IMAGE_RENDERER"] = "html"
+
+
+def test_pillow_renderer_matches_golden_image(
+    app: "Flask", golden_card: MembershipCard, bitmap_font
+):
+    with app.app_context():
+        card_img = image.PillowCardImageRenderer().render(golden_card)
+
+    golden_img = Image.open(get_test_file_path(GOLDEN_CARD_IMAGE_FILENAME))
+    assert card_img.size == golden_img.size
+    # Allow for a smidge of resampling drift between Pillow builds
+    assert rms_difference(card_img, golden_img) < 2.0
+
+
+def test_pillow_renderer_no_membership_dates(
+    app: "Flask", golden_card: MembershipCard, bitmap_font
+):
+    golden_card.member_since = None
+    golden_card.member_until = None
+
+    with app.app_context():
+        card_img = image.PillowCardImageRenderer().render(golden_card)
+
+    assert card_img.size == (793, 500)
+
+
+def test_measure_text():
+    font = image.load_card_font(font_path="", size=20)
+    width, height = image.measure_text(font, "Los Verdes")
+    assert width > 0
+    assert height > 0
+
+
+def test_generate_card_image_with_pillow_renderer(
+    app: "Flask", golden_card: MembershipCard, bitmap_font, tmp_path
+):
+    app.config["CARD_IMAGE_RENDERER"] = "pillow"
+    try:
+        with app.app_context():
+            image_path = image.generate_card_image(
+                membership_card=golden_card,
+                output_path=str(tmp_path),
+                card_image_filename=golden_card.image_filename,
+            )
+    finally:
+        app.config["CARD_IMAGE_RENDERER"] = "html"
+
+    assert Image.open(image_path).size == (793, 500)
+
+
+@pytest.mark.skipif(
+    not any(shutil.which(c) for c in ["google-chrome", "chromium", "chromium-browser"]),
+    reason="html card image renderer parity checks require chrome",
+)
+def test_html_renderer_parity_with_golden_image(
+    app: "Flask", golden_card: MembershipCard
+):
+    with app.app_context():
+        html_img = image.HtmlCardImageRenderer().render(golden_card)
+
+    golden_img = Image.open(get_test_file_path(GOLDEN_CARD_IMAGE_FILENAME))
+    # Fonts & layout engines differ between the two backends so only loosely compare the overall card
+    html_img = html_img.resize(golden_img.size)
+    assert rms_difference(html_img, golden_img) < 64.0
@@ -4,6 +4,7 @@ from member_card.db import db
 
 from flask import url_for
 from member_card.commands import bigcomm, minibc
+from member_card.queues import InMemoryQueueBackend
 
 if TYPE_CHECKING:
     from flask import Flask
@@ -67,6 +68,25 @@ class TestCommands:
             message=dict(email_distribution_recipient=test_email),
         )
 
+    def test_send_bulk_email(self, runner: "FlaskCliRunner", mocker: "MockerFixture"):
+        mock_bulk_email_request = mocker.patch(
+            "member_card.commands.worker"
+        ).process_bulk_email_distribution_request
+
+        result = runner.invoke(
+            args=["cards", "send-bulk-email", "test-distribution"],
+        )
+
+        assert result.exit_code == 0
+
+        mock_bulk_email_request.assert_called_once_with(
+            message=dict(
+                type="bulk_email_distribution_request",
+                distribution_id="test-distribution",
+                subject=None,
+            ),
+        )
+
     def test_update_sendgrid_template_cli(
         self, runner: "FlaskCliRunner", mocker: "MockerFixture"
     ):
@@ -202,6 +222,134 @@ class TestCommands:
             ),
         )
 
+    def test_recompute_dashboard_stats(
+        self,
+        runner: "FlaskCliRunner",
+        mocker: "MockerFixture",
+    ):
+        mock_recompute = mocker.patch("member_card.commands.recompute_dashboard_stats")
+
+        result = runner.invoke(
+            args=["recompute-dashboard-stats"],
+        )
+
+        assert result.exit_code == 0
+        mock_recompute.assert_called_once_with()
+
+    def test_backfill_membership_summaries(
+        self,
+        runner: "FlaskCliRunner",
+        mocker: "MockerFixture",
+    ):
+        mock_backfill = mocker.patch(
+            "member_card.commands.backfill_membership_summaries"
+        )
+        mock_backfill.return_value = 0
+
+        result = runner.invoke(
+            args=["backfill-membership-summaries", "--batch-size=50"],
+        )
+
+        assert result.exit_code == 0
+        mock_backfill.assert_called_once_with(batch_size=50)
+
+    def test_cards_detect_missing_card_images(
+        self,
+        app: "Flask",
+        runner: "FlaskCliRunner",
+        fake_card: "MembershipCard",
+        mocker: "MockerFixture",
+    ):
+        mock_get_bucket = mocker.patch("member_card.commands.get_bucket")
+        mock_get_bucket.return_value.blob.return_value.exists.return_value = False
+        mock_publish_many = mocker.patch("member_card.commands.publish_many")
+        mock_publish_many.return_value = []
+
+        result = runner.invoke(
+            args=["cards", "detect-missing-card-images"],
+        )
+
+        assert result.exit_code == 0
+        mock_publish_many.assert_called_once()
+        messages = list(mock_publish_many.call_args.kwargs["messages"])
+        assert all(m["type"] == "ensure_uploaded_card_image_request" for m in messages)
+        assert messages
+        with app.app_context():
+            member_email = fake_card.user.email
+        # Only active members' card images are checked on
+        assert {m["member_email_address"] for m in messages} == {member_email}
+
+    def test_cards_reissue(self, runner: "FlaskCliRunner", mocker: "MockerFixture"):
+        mock_run_card_reissue = mocker.patch("member_card.commands.run_card_reissue")
+        mock_run_card_reissue.return_value = dict(num_completed=0)
+
+        result = runner.invoke(
+            args=["cards", "reissue", "test-reissue", "--num-shards=2", "--force"],
+        )
+
+        assert result.exit_code == 0
+        mock_run_card_reissue.assert_called_once_with(
+            reissue_id="test-reissue",
+            batch_size=100,
+            concurrency=4,
+            num_shards=2,
+            shard_index=0,
+            force=True,
+            report_interval_secs=10.0,
+        )
+
+    def test_worker_run(
+        self, app: "Flask", runner: "FlaskCliRunner", mocker: "MockerFixture"
+    ):
+        mock_run_worker = mocker.patch(
+            "member_card.commands.worker"
+        ).run_streaming_pull_worker
+
+        result = runner.invoke(
+            args=["worker", "run", "--max-messages=5"],
+        )
+
+        assert result.exit_code == 0
+        mock_run_worker.assert_called_once_with(
+            subscription_id=app.config["PUBSUB_SUBSCRIPTION_ID"],
+            max_messages=5,
+            max_bytes=app.config["PUBSUB_FLOW_CONTROL_MAX_BYTES"],
+            num_handler_threads=app.config["PUBSUB_SUBSCRIBER_HANDLER_THREADS"],
+        )
+
+    def test_queue_publish_and_consume(
+        self,
+        app: "Flask",
+        runner: "FlaskCliRunner",
+        mocker: "MockerFixture",
+    ):
+        mocker.patch("member_card.queues._queue_backend", InMemoryQueueBackend())
+        mock_dispatch_message = mocker.patch(
+            "member_card.commands.worker.dispatch_message"
+        )
+
+        result = runner.invoke(
+            args=["queue", "publish", '{"type": "sync_customers_etl"}', "--count=3"],
+        )
+        assert result.exit_code == 0
+
+        result = runner.invoke(
+            args=["queue", "consume", "--idle-timeout-secs=0.01"],
+        )
+        assert result.exit_code == 0
+        assert "'num_processed': 3" in result.stdout
+        assert mock_dispatch_message.call_count == 3
+        # Each copy is distinct, so none of them are deduplicated as redeliveries
+        assert (
+            len(
+                {
+                    call.kwargs["message"]["load_test_id"]
+                    for call in mock_dispatch_message.call_args_list
+                }
+            )
+            == 3
+        )
+
     def test_add_memberships_to_user_email(
         self,
         app: "Flask",
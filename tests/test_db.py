@@ -2,13 +2,15 @@ from typing import TYPE_CHECKING
 
 import uuid
 from datetime import datetime, timezone
+
+import pytest
 from member_card import db
-from member_card.models import AnnualMembership
+from sqlalchemy import create_engine, event, text
+from member_card.models import AnnualMembership, User
 
 if TYPE_CHECKING:
     from flask import Flask
     from flask_security import SQLAlchemySessionUserDatastore
-    from member_card.models import User
     from pytest_mock.plugin import MockerFixture
 
 
@@ -42,6 +44,7 @@ def test_get_gcp_sql_engine_creator(app: "Flask", mocker: "MockerFixture"):
 
 def test_get_db_connector_sans_password(app: "Flask", mocker: "MockerFixture"):
     mock_connector = mocker.patch("member_card.db.connector")
+    mocker.patch("member_card.db._sql_connector", None)
     mock_conn_obj = mock_connector.Connector.return_value
     test_conn_string = "test-gcp-instance-connection-string"
     test_db_name = "test-db-name"
@@ -61,11 +64,12 @@ def test_get_db_connector_sans_password(app: "Flask", mocker: "MockerFixture"):
         user=test_db_user,
         db=test_db_name,
     )
-    assert mock_conn_obj._enable_iam_auth
+    mock_connector.Connector.assert_called_once_with(enable_iam_auth=True)
 
 
 def test_get_db_connector_with_password(app: "Flask", mocker: "MockerFixture"):
     mock_connector = mocker.patch("member_card.db.connector")
+    mocker.patch("member_card.db._sql_connector", None)
     mock_conn_obj = mock_connector.Connector.return_value
     test_conn_string = "test-gcp-instance-connection-string"
     test_db_name = "test-db-name"
@@ -88,7 +92,52 @@ def test_get_db_connector_with_password(app: "Flask", mocker: "MockerFixture"):
         db=test_db_name,
         password=test_db_pass,
     )
-    assert mock_conn_obj._enable_iam_auth is not True
+    mock_connector.Connector.assert_called_once_with(enable_iam_auth=False)
+
+
+def test_get_db_connector_shares_connector(app: "Flask", mocker: "MockerFixture"):
+    mock_connector = mocker.patch("member_card.db.connector")
+    mocker.patch("member_card.db._sql_connector", None)
+
+    with app.app_context():
+        engine_creator = db.get_gcp_sql_engine_creator(
+            instance_connection_string="test-gcp-instance-connection-string",
+            db_name="test-db-name",
+            db_user="test-db-user",
+            db_pass="test-db-pass",
+        )
+
+    for _ in range(3):
+        engine_creator()
+
+    mock_connector.Connector.assert_called_once()
+    assert mock_connector.Connector.return_value.connect.call_count == 3
+
+
+def test_instrumented_queue_pool(app: "Flask"):
+    engine = create_engine(
+        app.config["SQLALCHEMY_DATABASE_URI"],
+        poolclass=db.InstrumentedQueuePool,
+        pool_size=2,
+        max_overflow=0,
+    )
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            pool_stats = db.get_pool_stats(engine)
+            assert pool_stats["checked_out"] == 1
+
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+
+        pool_stats = db.get_pool_stats(engine)
+    finally:
+        engine.dispose()
+
+    assert pool_stats["pool_size"] == 2
+    assert pool_stats["checked_out"] == 0
+    assert pool_stats["num_checkouts"] == 2
+    assert 0 < pool_stats["avg_checkout_wait_ms"] <= pool_stats["max_checkout_wait_ms"]
 
 
 def test_get_or_update_for_updates(
@@ -124,3 +173,237 @@ def test_get_or_update_for_creates(
             kwargs=membership_kwargs,
         )
     assert updated_membership.order_id == membership_kwargs["order_id"]
+
+
+def test_chunked():
+    assert list(db.chunked(range(5), 2)) == [[0, 1], [2, 3], [4]]
+
+
+def test_get_instances_by_key(app: "Flask", fake_membership_order: AnnualMembership):
+    instances_by_key = db.get_instances_by_key(
+        session=db.db.session,
+        model=AnnualMembership,
+        key="order_id",
+        values=[fake_membership_order.order_id, "not-an-order-id"],
+        chunk_size=1,
+    )
+    assert instances_by_key == {fake_membership_order.order_id: fake_membership_order}
+
+
+def test_bulk_upsert_inserts_and_updates(app: "Flask"):
+    order_ids = [str(uuid.uuid4())[:30] for _ in range(3)]
+    membership_rows = [
+        {
+            "order_id": order_id,
+            "order_number": order_id,
+            "channel_name": "test-bulk-upsert",
+            "created_on": datetime.utcnow().replace(tzinfo=timezone.utc),
+        }
+        for order_id in order_ids
+    ]
+
+    with app.app_context():
+        num_rows_written = db.bulk_upsert(
+            session=db.db.session,
+            model=AnnualMembership,
+            rows=membership_rows,
+            index_elements=["order_id"],
+            batch_size=2,
+        )
+        assert num_rows_written == 3
+
+        # None values should leave extant column values be while others get updated
+        updated_rows = [
+            dict(r, channel_name=None, product_name="updated") for r in membership_rows
+        ]
+        db.bulk_upsert(
+            session=db.db.session,
+            model=AnnualMembership,
+            rows=updated_rows,
+            index_elements=["order_id"],
+        )
+
+        memberships = AnnualMembership.query.filter(
+            AnnualMembership.order_id.in_(order_ids)
+        ).all()
+        assert len(memberships) == 3
+        assert all(m.channel_name == "test-bulk-upsert" for m in memberships)
+        assert all(m.product_name == "updated" for m in memberships)
+
+        AnnualMembership.query.filter(AnnualMembership.order_id.in_(order_ids)).delete(
+            synchronize_session="fetch"
+        )
+        db.db.session.commit()
+
+
+def test_bulk_upsert_applies_column_defaults(app: "Flask"):
+    order_ids = [str(uuid.uuid4())[:30] for _ in range(2)]
+    membership_rows = [
+        {
+            "order_id": order_ids[0],
+            "order_number": order_ids[0],
+            "created_on": datetime.utcnow(),
+            "test_mode": True,
+        },
+        # Lacks test_mode, so should get the column's default rather than NULL
+        {
+            "order_id": order_ids[1],
+            "order_number": order_ids[1],
+            "created_on": datetime.utcnow(),
+        },
+    ]
+
+    with app.app_context():
+        db.bulk_upsert(
+            session=db.db.session,
+            model=AnnualMembership,
+            rows=membership_rows,
+            index_elements=["order_id"],
+        )
+
+        test_modes = dict(
+            db.db.session.query(
+                AnnualMembership.order_id, AnnualMembership.test_mode
+            ).filter(AnnualMembership.order_id.in_(order_ids))
+        )
+        assert test_modes == {order_ids[0]: True, order_ids[1]: False}
+
+        AnnualMembership.query.filter(AnnualMembership.order_id.in_(order_ids)).delete(
+            synchronize_session="fetch"
+        )
+        db.db.session.commit()
+
+
+def test_bulk_upsert_sqlite_fallback():
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+
+    engine = create_engine("sqlite://")
+    AnnualMembership.__table__.create(engine)
+    session = Session(bind=engine)
+    membership_row = {
+        "order_id": "sqlite-order",
+        "order_number": "sqlite-order",
+        "user_id": 1,
+        "created_on": datetime.utcnow(),
+    }
+
+    db.bulk_upsert(
+        session=session,
+        model=AnnualMembership,
+        rows=[membership_row],
+        index_elements=["order_id"],
+    )
+    db.bulk_upsert(
+        session=session,
+        model=AnnualMembership,
+        rows=[dict(membership_row, user_id=2, sku="updated")],
+        index_elements=["order_id"],
+        preserve_existing=["user_id"],
+    )
+
+    membership = session.execute(AnnualMembership.__table__.select()).one()
+    assert membership.user_id == 1
+    assert membership.sku == "updated"
+
+
+@pytest.fixture()
+def replica_router(app: "Flask", mocker: "MockerFixture"):
+    """Routes replica reads to a second engine pointed at the test database"""
+    replica_engine = create_engine(app.config["SQLALCHEMY_DATABASE_URI"])
+    replica_router = db.ReplicaRouter(engine=replica_engine)
+    mocker.patch("member_card.db._replica_router", replica_router)
+    mocker.patch.dict(
+        app.config,
+        SQLALCHEMY_REPLICA_DATABASE_URI=app.config["SQLALCHEMY_DATABASE_URI"],
+    )
+
+    replica_statements = []
+
+    @event.listens_for(replica_engine, "before_cursor_execute")
+    def record_replica_statement(conn, cursor, statement, *args):
+        if statement.startswith("SELECT users."):
+            replica_statements.append(statement)
+
+    replica_router.replica_statements = replica_statements
+    with app.app_context():
+        # Other fixtures' writes would otherwise leave the shared test session pinned to the primary
+        db.db.session.info.pop("wrote_to_primary", None)
+    yield replica_router
+    replica_engine.dispose()
+
+
+def test_replica_router_routes_to_replica():
+    replica_engine = create_engine("sqlite://")
+    replica_router = db.ReplicaRouter(engine=replica_engine, check_interval_secs=60)
+
+    assert replica_router.route() is replica_engine
+    assert replica_router.route() is replica_engine
+    assert replica_router.stats()["decisions"] == dict(replica=2)
+    assert replica_router.stats()["last_lag_secs"] == 0.0
+
+
+def test_replica_router_lagging_replica(mocker: "MockerFixture"):
+    replica_router = db.ReplicaRouter(engine=create_engine("sqlite://"), max_lag_secs=5)
+    mocker.patch.object(replica_router, "measure_lag_secs", return_value=30.0)
+
+    assert replica_router.route() is None
+    assert replica_router.stats()["decisions"] == dict(primary_replica_lagging=1)
+    assert replica_router.stats()["last_lag_secs"] == 30.0
+
+
+def test_replica_router_unavailable_replica(mocker: "MockerFixture"):
+    replica_router = db.ReplicaRouter(engine=create_engine("sqlite://"))
+    mocker.patch.object(
+        replica_router, "measure_lag_secs", side_effect=Exception("replica down")
+    )
+
+    assert replica_router.route() is None
+    assert replica_router.stats()["current_route"] == "primary_replica_unavailable"
+
+
+def test_replica_router_rechecks_after_interval(mocker: "MockerFixture"):
+    replica_router = db.ReplicaRouter(
+        engine=create_engine("sqlite://"), check_interval_secs=0
+    )
+    spy_measure_lag_secs = mocker.spy(replica_router, "measure_lag_secs")
+
+    replica_router.route()
+    replica_router.mark_unavailable()
+    assert replica_router.stats()["current_route"] == "primary_replica_unavailable"
+    assert replica_router.route() is not None
+
+    assert spy_measure_lag_secs.call_count == 2
+
+
+def test_routing_session_uses_replica_for_reads(
+    app: "Flask", fake_user: "User", replica_router: "db.ReplicaRouter"
+):
+    with app.app_context():
+        User.query.filter_by(id=fake_user.id).one()
+        assert replica_router.replica_statements == []
+
+        with db.use_read_replica():
+            assert User.query.filter_by(id=fake_user.id).one().email == fake_user.email
+        assert len(replica_router.replica_statements) == 1
+        assert db.db.session.info["use_read_replica"] is False
+
+
+def test_routing_session_pinned_to_primary_after_write(
+    app: "Flask", fake_user: "User", replica_router: "db.ReplicaRouter"
+):
+    with app.app_context(), db.use_read_replica():
+        user = User.query.filter_by(id=fake_user.id).one()
+        user.fullname = f"{fake_user.fullname} (Updated)"
+        db.db.session.flush()
+
+        User.query.filter_by(id=fake_user.id).one()
+        db.db.session.rollback()
+
+    assert len(replica_router.replica_statements) == 1
+
+
+def test_routing_session_without_replica_configured(app: "Flask", fake_user: "User"):
+    with app.app_context(), db.use_read_replica():
+        assert db.get_replica_router() is None
+        assert User.query.filter_by(id=fake_user.id).one()
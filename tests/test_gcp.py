@@ -1,7 +1,9 @@
 import json
 from typing import TYPE_CHECKING
 
+import pytest
 from google.cloud import pubsub_v1
+from mock import call
 from member_card import gcp
 
 if TYPE_CHECKING:
@@ -9,35 +11,92 @@ if TYPE_CHECKING:
     from pytest_mock.plugin import MockerFixture
 
 
-def test_publish_message(mocker: "MockerFixture"):
-    mock_futures = mocker.patch("member_card.gcp.futures")
-
+@pytest.fixture()
+def mock_publisher(app: "Flask", mocker: "MockerFixture"):
     mock_publisher = mocker.create_autospec(pubsub_v1.PublisherClient)
-    mocker.patch(
-        "member_card.gcp.pubsub_v1"
-    ).PublisherClient.return_value = mock_publisher
+    mock_pubsub_v1 = mocker.patch("member_card.gcp.pubsub_v1")
+    mock_pubsub_v1.PublisherClient.return_value = mock_publisher
+    mock_publisher.topic_path.return_value = "test-topic-path"
+    mocker.patch("member_card.gcp.atexit")
+    mocker.patch("member_card.gcp._publisher", None)
+    with app.app_context():
+        yield mock_publisher
+
+
+def test_get_publisher(mock_publisher):
+    publisher = gcp.get_publisher()
+
+    assert publisher is mock_publisher
+    assert gcp.get_publisher() is publisher
+    gcp.pubsub_v1.PublisherClient.assert_called_once()
+    gcp.atexit.register.assert_called_once_with(gcp.flush_publisher)
+
+
+def test_flush_publisher(mock_publisher):
+    gcp.get_publisher()
+    gcp.flush_publisher()
 
-    test_topic_path = "test-topic-path"
-    mock_publisher.topic_path.return_value = test_topic_path
+    mock_publisher.stop.assert_called_once()
+    assert gcp._publisher is None
+    # Nothing left to flush the second time around
+    gcp.flush_publisher()
+    mock_publisher.stop.assert_called_once()
 
-    test_project_id = "test-project"
-    test_topic_id = "test-topic"
-    test_message_data = {"this-is": "a-test"}
 
-    gcp.publish_message(
-        project_id=test_project_id,
-        topic_id=test_topic_id,
-        message_data=test_message_data,
+def test_publish_many(mock_publisher):
+    test_messages = [{"this-is": "a-test"}, {"this-is": "another-test"}]
+
+    publish_futures = gcp.publish_many(
+        project_id="test-project",
+        topic_id="test-topic",
+        messages=test_messages,
     )
 
-    mock_publisher.publish.assert_called_once_with(
-        test_topic_path, json.dumps(test_message_data).encode("utf-8")
+    assert len(publish_futures) == 2
+    mock_publisher.topic_path.assert_called_once_with("test-project", "test-topic")
+    assert mock_publisher.publish.call_args_list == [
+        call("test-topic-path", json.dumps(m).encode("utf-8")) for m in test_messages
+    ]
+
+
+def test_publish_many_shares_publisher_client(mock_publisher):
+    for _ in range(2):
+        gcp.publish_many(
+            project_id="test-project",
+            topic_id="test-topic",
+            messages=[{"this-is": "a-test"}],
+        )
+
+    # The (shared) publisher client only gets set up the once
+    gcp.pubsub_v1.PublisherClient.assert_called_once()
+    assert mock_publisher.publish.call_count == 2
+
+
+def test_subscribe(mocker: "MockerFixture"):
+    mock_pubsub_v1 = mocker.patch("member_card.gcp.pubsub_v1")
+    mock_subscriber = mock_pubsub_v1.SubscriberClient.return_value
+    mock_subscriber.subscription_path.return_value = "test-subscription-path"
+    test_callback = mocker.Mock()
+
+    streaming_pull_future = gcp.subscribe(
+        project_id="test-project",
+        subscription_id="test-subscription",
+        callback=test_callback,
+        max_messages=10,
+        max_bytes=1024,
+        num_handler_threads=2,
     )
 
-    mock_futures.stop()
-    mock_futures.wait.assert_called_once_with(
-        [mock_publisher.publish.return_value], return_when=mock_futures.ALL_COMPLETED
+    assert streaming_pull_future is mock_subscriber.subscribe.return_value
+    mock_pubsub_v1.types.FlowControl.assert_called_once_with(
+        max_messages=10,
+        max_bytes=1024,
     )
+    subscribe_kwargs = mock_subscriber.subscribe.call_args.kwargs
+    assert mock_subscriber.subscribe.call_args.args == ("test-subscription-path",)
+    assert subscribe_kwargs["callback"] is test_callback
+    assert subscribe_kwargs["await_callbacks_on_shutdown"] is True
+    subscribe_kwargs["scheduler"].shutdown()
 
 
 def test_retrieve_app_secrets(mocker: "MockerFixture"):
@@ -114,3 +173,22 @@ def test_upload_file_to_gcs(app: "Flask", mocker: "MockerFixture"):
 
     mock_bucket.blob.assert_called_with(remote_path)
     mock_blob.upload_from_filename.assert_called_with(local_file)
+
+
+def test_upload_bytes_to_gcs(app: "Flask", mocker: "MockerFixture"):
+    mock_blob = mocker.Mock()
+    mock_bucket = mocker.Mock()
+    mock_bucket.blob.return_value = mock_blob
+    remote_path = "test-remote-path"
+
+    gcp.upload_bytes_to_gcs(
+        bucket=mock_bucket,
+        data=b"test-data",
+        remote_path=remote_path,
+        content_type="x-some-type",
+    )
+
+    mock_bucket.blob.assert_called_with(remote_path)
+    mock_blob.upload_from_string.assert_called_with(
+        b"test-data", content_type="x-some-type"
+    )
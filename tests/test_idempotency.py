@@ -0,0 +1,111 @@
+from datetime import timedelta
+from typing import TYPE_CHECKING
+
+import pytest
+
+from member_card import idempotency
+from member_card.db import db
+from member_card.models import ProcessedMessage
+
+if TYPE_CHECKING:
+    from flask import Flask
+    from pytest_mock.plugin import MockerFixture
+
+
+@pytest.fixture(params=sorted(idempotency.PROCESSED_MESSAGE_LEDGERS))
+def ledger(request, app: "Flask"):
+    ledger_class = idempotency.PROCESSED_MESSAGE_LEDGERS[request.param]
+    with app.app_context():
+        yield ledger_class(ttl_secs=60, prune_interval_secs=3600)
+        db.session.query(ProcessedMessage).delete()
+        db.session.commit()
+
+
+def test_get_message_idempotency_keys():
+    message = dict(
+        type="sync_bigcommerce_order",
+        store_hash="test-store",
+        created_at=1234,
+        data=dict(id=100),
+        hash="abc123",
+    )
+
+    assert idempotency.get_message_idempotency_keys(message, message_id="abc") == [
+        "pubsub:abc",
+        "sync_bigcommerce_order:test-store:100:abc123",
+    ]
+    # Without a per-event hash, only the messageId can identify redeliveries
+    del message["hash"]
+    assert idempotency.get_message_idempotency_keys(message, message_id="abc") == [
+        "pubsub:abc",
+    ]
+    # Load test copies of a message each get their own key
+    assert idempotency.get_message_idempotency_keys(
+        dict(message, hash="abc123", load_test_id="copy-1")
+    ) == ["sync_bigcommerce_order:test-store:100:abc123:copy-1"]
+    assert (
+        idempotency.get_message_idempotency_keys(
+            dict(type="sync_customers_etl"), message_id=None
+        )
+        == []
+    )
+
+
+def test_ledger_is_processed_after_record(ledger):
+    assert not ledger.is_processed(["pubsub:1"])
+
+    ledger.record(["pubsub:1", "some_type:key"], message_type="some_type")
+
+    assert ledger.is_processed(["pubsub:1"])
+    # A redelivery under a new messageId is still caught via its per-type key
+    assert ledger.is_processed(["pubsub:2", "some_type:key"])
+    assert not ledger.is_processed(["pubsub:3"])
+    assert ledger.stats() == dict(hits=2, misses=2, num_recorded=2, num_pruned=0)
+
+
+def test_ledger_no_keys(ledger):
+    ledger.record([], message_type="some_type")
+
+    assert not ledger.is_processed([])
+
+
+def test_ledger_expiry_and_pruning(ledger, mocker: "MockerFixture"):
+    ledger.record(["pubsub:1"], message_type="some_type")
+
+    later = idempotency.utcnow() + timedelta(seconds=61)
+    mocker.patch("member_card.idempotency.utcnow", return_value=later)
+
+    assert not ledger.is_processed(["pubsub:1"])
+    assert ledger.prune() == 1
+    assert ledger.stats()["num_pruned"] == 1
+
+
+def test_ledger_prunes_periodically_on_record(ledger, mocker: "MockerFixture"):
+    mock_prune = mocker.patch.object(ledger, "prune")
+    ledger.record(["pubsub:1"], message_type="some_type")
+    mock_prune.assert_not_called()
+
+    ledger.prune_interval_secs = 0
+    ledger.record(["pubsub:2"], message_type="some_type")
+    mock_prune.assert_called_once()
+
+
+def test_get_processed_message_ledger(app: "Flask", mocker: "MockerFixture"):
+    mocker.patch("member_card.idempotency._processed_message_ledger", None)
+    with app.app_context():
+        ledger = idempotency.get_processed_message_ledger()
+        assert ledger is idempotency.get_processed_message_ledger()
+    assert isinstance(
+        ledger,
+        idempotency.PROCESSED_MESSAGE_LEDGERS[app.config["PROCESSED_MESSAGE_LEDGER"]],
+    )
+
+
+def test_get_processed_message_ledger_unsupported(
+    app: "Flask", mocker: "MockerFixture"
+):
+    mocker.patch("member_card.idempotency._processed_message_ledger", None)
+    mocker.patch.dict(app.config, {"PROCESSED_MESSAGE_LEDGER": "not-a-ledger"})
+    with app.app_context():
+        with pytest.raises(NotImplementedError):
+            idempotency.get_processed_message_ledger()
@@ -7,6 +7,7 @@ from google.cloud.storage.blob import Blob
 from member_card import image
 
 if TYPE_CHECKING:
+    from flask import Flask
     from PIL import Image
     from pytest_mock.plugin import MockerFixture
 
@@ -29,9 +30,9 @@ def test_remove_image_background(untrimmed_with_bg_img: "Image"):
     assert bottom_right_pixel == transparent_white_pixel
 
 
-def test_trim_without_image_background(untrimmed_img: "Image"):
+def test_trim_without_image_background(untrimmed_img: "Image", tmp_path):
     trimmed_img = image.trim(untrimmed_img)
-    trimmed_img.save("trimmed.png")
+    trimmed_img.save(tmp_path / "trimmed.png")
 
     # After triming, the resulting image should have smaller dimensions:
     assert trimmed_img.width < untrimmed_img.width
@@ -47,9 +48,9 @@ def test_trim_without_image_background(untrimmed_img: "Image"):
     assert bottom_right_pixel == bright_verde_pixel
 
 
-def test_trim_with_image_background(untrimmed_with_bg_img: "Image"):
+def test_trim_with_image_background(untrimmed_with_bg_img: "Image", tmp_path):
     trimmed_img = image.trim(untrimmed_with_bg_img)
-    trimmed_img.save("trimmed.png")
+    trimmed_img.save(tmp_path / "trimmed.png")
 
     # With a background, triming is a no-go. Thus the resulting image should
     # have the dimensions as the original:
@@ -92,6 +93,10 @@ def mock_image(
     chained_image_methods = ["open", "convert", "crop"]
     for chained_image_method in chained_image_methods:
         getattr(mock_image, chained_image_method).return_value = mock_image
+    # background removal does channel math on real image bands, so pass our mock on through instead
+    mocker.patch(
+        "member_card.image.remove_image_background", side_effect=lambda img: img
+    )
     return mock_image
 
 
@@ -110,6 +115,30 @@ def test_generate_and_upload_card_image(
     mock_image.save.assert_called_once()
 
 
+def test_generate_card_image_with_renderer_pool(
+    app: "Flask", fake_card: "MembershipCard", mocker: "MockerFixture", mock_image
+):
+    mock_html2image = mocker.patch("member_card.image.Html2Image")
+    mock_get_renderer_pool = mocker.patch("member_card.image.get_renderer_pool")
+    mock_pool = mock_get_renderer_pool.return_value
+    mock_pool.render.return_value = b"not-really-a-png"
+    app.config["CARD_RENDERER_POOL_SIZE"] = 1
+    try:
+        with app.app_context():
+            image_path = image.generate_card_image(
+                membership_card=fake_card,
+                output_path="/tmp",
+                card_image_filename=fake_card.image_filename,
+            )
+    finally:
+        app.config["CARD_RENDERER_POOL_SIZE"] = 0
+
+    assert image_path == f"/tmp/{fake_card.image_filename}"
+    mock_pool.render.assert_called_once()
+    mock_html2image.assert_not_called()
+    mock_image.save.assert_called_once_with(image_path)
+
+
 def test_ensure_uploaded_card_image_no_extant_blob(
     fake_card: "MembershipCard", mocker: "MockerFixture", mock_uploaded_blob
 ):
@@ -120,7 +149,7 @@ def test_ensure_uploaded_card_image_no_extant_blob(
     )
 
     expected_url = (
-        f"{test_bucket_id}/membership-cards/images/{fake_card.serial_number.hex}.png"
+        f"{test_bucket_id}/membership-cards/images/{fake_card.content_hash}.png"
     )
     assert card_image_url == expected_url
     mock_upload.assert_called()
@@ -137,7 +166,54 @@ def test_ensure_uploaded_card_image_extant_blob(
     )
 
     expected_url = (
-        f"{test_bucket_id}/membership-cards/images/{fake_card.serial_number.hex}.png"
+        f"{test_bucket_id}/membership-cards/images/{fake_card.content_hash}.png"
     )
     assert card_image_url == expected_url
     mock_upload.assert_not_called()
+
+
+def test_ensure_uploaded_card_image_indexed_artifact(
+    app: "Flask",
+    fake_card: "MembershipCard",
+    mocker: "MockerFixture",
+    mock_uploaded_blob,
+):
+    mock_upload = mocker.patch("member_card.image.generate_and_upload_card_image")
+    first_card_image_url = image.ensure_uploaded_card_image(
+        membership_card=fake_card,
+    )
+    mock_upload.assert_called_once()
+
+    # Unchanged card content => served straight from the artifact index; no bucket lookups / renders / uploads
+    mock_get_bucket = mocker.patch("member_card.image.get_bucket")
+    second_card_image_url = image.ensure_uploaded_card_image(
+        membership_card=fake_card,
+    )
+    mock_get_bucket.assert_not_called()
+    mock_upload.assert_called_once()
+    assert second_card_image_url.endswith(f"/{fake_card.remote_image_path}")
+    assert first_card_image_url.endswith(f"/{fake_card.remote_image_path}")
+
+
+def test_ensure_uploaded_card_image_content_changed(
+    app: "Flask",
+    fake_card: "MembershipCard",
+    mocker: "MockerFixture",
+    mock_uploaded_blob,
+):
+    mock_upload = mocker.patch("member_card.image.generate_and_upload_card_image")
+    first_card_image_url = image.ensure_uploaded_card_image(
+        membership_card=fake_card,
+    )
+
+    original_fullname = fake_card.user.fullname
+    fake_card.user.fullname = f"{original_fullname} Renamed"
+    try:
+        second_card_image_url = image.ensure_uploaded_card_image(
+            membership_card=fake_card,
+        )
+    finally:
+        fake_card.user.fullname = original_fullname
+
+    assert second_card_image_url != first_card_image_url
+    assert mock_upload.call_count == 2
@@ -0,0 +1,93 @@
+import os
+from timeit import timeit
+from typing import TYPE_CHECKING
+
+import pytest
+from PIL import Image, ImageDraw
+
+from member_card import image
+
+if TYPE_CHECKING:
+    from PIL.Image import Image as PILImage
+
+
+def remove_image_background_per_pixel(img):
+    """The original pure-python implementation, kept around as a reference point."""
+    img = img.convert("RGBA")
+
+    img_data = img.getdata()
+
+    updated_img_data = []
+
+    for pixel in img_data:
+        if pixel[0] == 255 and pixel[1] == 255 and pixel[2] == 255:
+            updated_img_data.append((255, 255, 255, 0))
+        else:
+            updated_img_data.append(pixel)
+
+    img.putdata(updated_img_data)
+    return img
+
+
+def generate_card_sized_img() -> "PILImage":
+    # Roughly the dimensions of a rendered card, with a mix of background, near-white and colored pixels
+    img = Image.new("RGB", (793, 500), (255, 255, 255))
+    draw = ImageDraw.Draw(img)
+    draw.rectangle((40, 40, 753, 460), fill=(0, 177, 64))
+    draw.ellipse((100, 100, 300, 300), fill=(254, 255, 255))
+    draw.text((400, 200), "Los Verdes", fill=(250, 250, 250))
+    return img
+
+
+def test_remove_image_background_matches_per_pixel_reference(
+    untrimmed_with_bg_img: "PILImage",
+):
+    for img in [untrimmed_with_bg_img, generate_card_sized_img()]:
+        expected_img = remove_image_background_per_pixel(img)
+        vectorized_img = image.remove_image_background(img)
+        assert vectorized_img.mode == expected_img.mode
+        assert vectorized_img.tobytes() == expected_img.tobytes()
+
+
+def test_remove_image_background_tolerance():
+    img = generate_card_sized_img()
+    near_white_pixel = img.getpixel((200, 200))
+    assert near_white_pixel == (254, 255, 255)
+
+    assert image.remove_image_background(img).getpixel((200, 200)) == (
+        254,
+        255,
+        255,
+        255,
+    )
+    assert image.remove_image_background(img, tolerance=1).getpixel((200, 200)) == (
+        255,
+        255,
+        255,
+        0,
+    )
+    # Non-background pixels are left be regardless
+    assert image.remove_image_background(img, tolerance=10).getpixel((50, 50)) == (
+        0,
+        177,
+        64,
+        255,
+    )
+
+
+@pytest.mark.skipif(
+    not os.getenv("RUN_BENCHMARKS"),
+    reason="wall-clock benchmarks are flaky on shared CI runners; set RUN_BENCHMARKS=1 to run them",
+)
+def test_remove_image_background_is_an_order_of_magnitude_faster():
+    img = generate_card_sized_img()
+    num_runs = 3
+
+    per_pixel_secs = timeit(
+        lambda: remove_image_background_per_pixel(img), number=num_runs
+    )
+    vectorized_secs = timeit(
+        lambda: image.remove_image_background(img), number=num_runs
+    )
+
+    assert vectorized_secs * 10 <= per_pixel_secs
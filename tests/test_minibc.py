@@ -90,3 +90,23 @@ def test_parse_subscriptions(app: "Flask", mock_subscriptions, mocker):
             subscriptions=mock_subscriptions
         )
     assert len(returned_subscriptions) == 1
+
+
+def test_minibc_subscriptions_etl(app: "Flask", mock_subscriptions, mocker):
+    mocker.patch("member_card.minibc.sleep")
+    mock_set_last_run_start_page = mocker.patch(
+        "member_card.minibc.table_metadata.set_last_run_start_page"
+    )
+    mocker.patch(
+        "member_card.minibc.table_metadata.get_last_run_start_page"
+    ).return_value = 3
+    mock_client = mocker.create_autospec(minibc.Minibc, instance=True)
+    mock_client.search_subscriptions.side_effect = [mock_subscriptions, None]
+    with app.app_context():
+        etl_result = minibc.minibc_subscriptions_etl(
+            minibc_client=mock_client,
+            skus=["test-sku"],
+        )
+    assert etl_result == dict(num_subscriptions=1, last_page_num=1)
+    assert mock_client.search_subscriptions.call_count == 2
+    mock_set_last_run_start_page.assert_called_once_with("subscription", 1)
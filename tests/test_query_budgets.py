@@ -0,0 +1,131 @@
+from typing import TYPE_CHECKING
+
+from member_card.db import db
+from member_card.models.dashboard_stats import recompute_dashboard_stats
+from member_card.query_stats import QueryStats, track_queries
+from sqlalchemy import text
+
+if TYPE_CHECKING:
+    from flask import Flask
+    from flask.testing import FlaskClient
+    from member_card.models import MembershipCard, User
+    from pytest_mock.plugin import MockerFixture
+
+
+def test_query_stats_repeated_statements():
+    query_stats = QueryStats()
+    for _ in range(3):
+        query_stats.record("SELECT 1", duration_secs=0.001)
+    query_stats.record("SELECT 2", duration_secs=0.001)
+
+    assert query_stats.num_statements == 4
+    assert query_stats.repeated_statements(threshold=3) == {"SELECT 1": 3}
+
+
+def test_track_queries_records_into_enclosing_stats(app: "Flask"):
+    with app.app_context(), track_queries() as outer_query_stats:
+        with track_queries() as inner_query_stats:
+            db.session.execute(text("SELECT 1"))
+        db.session.execute(text("SELECT 2"))
+
+    assert inner_query_stats.num_statements == 1
+    assert outer_query_stats.num_statements == 2
+    assert outer_query_stats.total_duration_ms > 0
+
+
+def test_query_stats_response_headers(
+    authenticated_client: "FlaskClient", fake_user: "User"
+):
+    response = authenticated_client.get("/no-active-membership-found")
+
+    assert int(response.headers["X-DB-Query-Count"]) > 0
+    assert float(response.headers["X-DB-Query-Time-Ms"]) > 0
+
+
+def test_query_stats_response_headers_disabled(
+    app: "Flask", authenticated_client: "FlaskClient", mocker: "MockerFixture"
+):
+    mocker.patch.dict(app.config, SQL_QUERY_STATS_HEADERS_ENABLED=False)
+
+    response = authenticated_client.get("/no-active-membership-found")
+
+    assert "X-DB-Query-Count" not in response.headers
+
+
+def test_n_plus_one_warning(app: "Flask", mocker: "MockerFixture"):
+    mock_logger = mocker.patch("member_card.query_stats.logger")
+    with app.app_context(), track_queries() as query_stats:
+        for membership_id in range(3):
+            db.session.execute(
+                text("SELECT id FROM annual_membership WHERE id = :id"),
+                dict(id=membership_id),
+            )
+    query_stats.log(description="test", n_plus_one_threshold=3)
+
+    mock_logger.warning.assert_called_once()
+    assert "Possible N+1 query" in mock_logger.warning.call_args.args[0]
+
+
+class TestEndpointQueryBudgets:
+    def test_home(
+        self,
+        authenticated_client: "FlaskClient",
+        fake_card: "MembershipCard",
+        query_budget,
+        mocker: "MockerFixture",
+    ):
+        mocker.patch("member_card.models.membership_card.generate_pass_jwt")
+        with query_budget(max_statements=7):
+            response = authenticated_client.get("/")
+
+        assert response.status_code == 200
+
+    def test_passes_google_pay(
+        self,
+        authenticated_client: "FlaskClient",
+        fake_card: "MembershipCard",
+        query_budget,
+    ):
+        fake_card._google_pay_jwt = "test_google_pay_jwt"
+        with query_budget(max_statements=3):
+            response = authenticated_client.get("/passes/google-pay")
+
+        assert response.status_code == 302
+
+    def test_verify_pass(
+        self,
+        authenticated_client: "FlaskClient",
+        fake_card: "MembershipCard",
+        query_budget,
+    ):
+        verify_pass_url = fake_card.verify_pass_url.replace(
+            fake_card.verify_pass_url.split("/verify-pass")[0], ""
+        )
+        with query_budget(max_statements=5):
+            response = authenticated_client.get(verify_pass_url)
+
+        assert response.status_code == 200
+
+    def test_admin_dashboard(
+        self,
+        fake_card: "MembershipCard",
+        admin_client: "FlaskClient",
+        query_budget,
+    ):
+        # Prime the stats snapshot so the budget covers the steady-state read path
+        recompute_dashboard_stats()
+        with query_budget(max_statements=9):
+            response = admin_client.get("/admin-dashboard")
+
+        assert response.status_code == 200
+
+    def test_no_active_membership_landing_page(
+        self,
+        authenticated_client: "FlaskClient",
+        fake_user: "User",
+        query_budget,
+    ):
+        with query_budget(max_statements=4):
+            response = authenticated_client.get("/no-active-membership-found")
+
+        assert response.status_code == 200
@@ -0,0 +1,152 @@
+import uuid
+from datetime import datetime
+from typing import TYPE_CHECKING
+
+import pytest
+from member_card.db import db
+from member_card.models import (
+    AnnualMembership,
+    MembershipCard,
+    SquarespaceWebhook,
+    User,
+)
+
+if TYPE_CHECKING:
+    from flask import Flask
+
+NUM_SEEDED_MEMBERS = 500
+SEEDED_SERIAL_NUMBER = uuid.UUID(int=1)
+
+# Lookups made per request / per synced record, along with the index each should be served by
+HOT_QUERIES = {
+    "annual_membership_by_customer_email": (
+        lambda: AnnualMembership.query.filter_by(
+            customer_email="seeded-member-1@losverd.es"
+        ),
+        "ix_annual_membership_customer_email",
+    ),
+    "annual_membership_by_user_id": (
+        lambda: AnnualMembership.query.filter_by(user_id=1),
+        "ix_annual_membership_user_id",
+    ),
+    "user_by_email": (
+        lambda: User.query.filter_by(email="seeded-member-1@losverd.es"),
+        "users_email_key",
+    ),
+    "user_by_bigcommerce_id": (
+        lambda: User.query.filter_by(bigcommerce_id=1),
+        "ix_users_bigcommerce_id",
+    ),
+    "membership_card_by_user_id": (
+        lambda: MembershipCard.query.filter_by(user_id=1),
+        "ix_membership_cards_user_id",
+    ),
+    "membership_card_by_serial_number": (
+        lambda: MembershipCard.query.filter_by(serial_number=str(SEEDED_SERIAL_NUMBER)),
+        "ix_membership_cards_serial_number",
+    ),
+    "squarespace_webhook_by_webhook_and_website_id": (
+        lambda: SquarespaceWebhook.query.filter_by(
+            webhook_id="seeded-webhook-1",
+            website_id="seeded-website",
+        ),
+        "ix_squarespace_webhook_webhook_id_website_id",
+    ),
+}
+
+
+@pytest.fixture(scope="module")
+def seeded_db(app: "Flask"):
+    with app.app_context():
+        db.session.execute(
+            User.__table__.insert(),
+            [
+                dict(
+                    email=f"seeded-member-{num}@losverd.es",
+                    fullname=f"Seeded Member {num}",
+                    bigcommerce_id=num,
+                )
+                for num in range(NUM_SEEDED_MEMBERS)
+            ],
+        )
+        user_ids = [user_id for user_id, in db.session.query(User.id)]
+        db.session.execute(
+            AnnualMembership.__table__.insert(),
+            [
+                dict(
+                    user_id=user_id,
+                    customer_email=f"seeded-member-{num}@losverd.es",
+                    order_id=f"seeded-order-{num}",
+                    order_number=f"seeded-order-{num}",
+                    created_on=datetime.utcnow(),
+                )
+                for num, user_id in enumerate(user_ids)
+            ],
+        )
+        db.session.execute(
+            MembershipCard.__table__.insert(),
+            [
+                dict(user_id=user_id, serial_number=uuid.UUID(int=num + 1))
+                for num, user_id in enumerate(user_ids)
+            ],
+        )
+        db.session.execute(
+            SquarespaceWebhook.__table__.insert(),
+            [
+                dict(webhook_id=f"seeded-webhook-{num}", website_id="seeded-website")
+                for num in range(NUM_SEEDED_MEMBERS)
+            ],
+        )
+        db.session.commit()
+        db.session.connection().exec_driver_sql("ANALYZE")
+        db.session.commit()
+
+        yield
+
+        MembershipCard.query.filter(MembershipCard.user_id.in_(user_ids)).delete(
+            synchronize_session=False
+        )
+        AnnualMembership.query.filter(AnnualMembership.user_id.in_(user_ids)).delete(
+            synchronize_session=False
+        )
+        User.query.filter(User.id.in_(user_ids)).delete(synchronize_session=False)
+        SquarespaceWebhook.query.filter(
+            SquarespaceWebhook.webhook_id.like("seeded-webhook-%")
+        ).delete(synchronize_session=False)
+        db.session.commit()
+
+
+def explain_query(query):
+    """EXPLAIN `query` with sequential scans discouraged, so any that still show up mean there's no usable index"""
+    compiled = query.statement.compile(dialect=db.engine.dialect)
+    connection = db.session.connection()
+    connection.exec_driver_sql("SET LOCAL enable_seqscan = off")
+    result = connection.exec_driver_sql(
+        f"EXPLAIN (FORMAT JSON) {compiled.string}", compiled.params
+    )
+    return result.scalar()[0]["Plan"]
+
+
+def iter_plan_nodes(plan):
+    yield plan
+    for child_plan in plan.get("Plans", []):
+        yield from iter_plan_nodes(child_plan)
+
+
+@pytest.mark.parametrize("query_name", HOT_QUERIES)
+def test_hot_query_uses_index(app: "Flask", seeded_db, query_name):
+    query_func, expected_index_name = HOT_QUERIES[query_name]
+    with app.app_context():
+        plan = explain_query(query_func())
+        db.session.rollback()
+
+    plan_nodes = list(iter_plan_nodes(plan))
+    seq_scans = [
+        node["Relation Name"] for node in plan_nodes if node["Node Type"] == "Seq Scan"
+    ]
+    assert not seq_scans, f"{query_name} fell back to a sequential scan: {plan}"
+    # Walking some other index (e.g., a composite primary key led by a different column) is nearly as bad
+    index_names = [node["Index Name"] for node in plan_nodes if "Index Name" in node]
+    assert (
+        expected_index_name in index_names
+    ), f"{query_name} not using {expected_index_name}: {plan}"
@@ -0,0 +1,193 @@
+from typing import TYPE_CHECKING
+
+import pytest
+
+from member_card import queues
+
+if TYPE_CHECKING:
+    from flask import Flask
+    from pytest_mock.plugin import MockerFixture
+
+TEST_TOPIC_ID = "test-topic"
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def local_queue_backend(request, tmpdir):
+    if request.param == "sqlite":
+        return queues.SqliteQueueBackend(database_path=str(tmpdir / "queue.db"))
+    return queues.InMemoryQueueBackend()
+
+
+def test_local_queue_backend_publish_receive_ack(local_queue_backend):
+    test_messages = [dict(type="test", num=n) for n in range(3)]
+    publish_futures = local_queue_backend.publish_many(
+        project_id="test-project",
+        topic_id=TEST_TOPIC_ID,
+        messages=test_messages,
+    )
+    message_ids = [f.result() for f in publish_futures]
+    assert len(set(message_ids)) == 3
+
+    received = local_queue_backend.receive(TEST_TOPIC_ID, max_messages=2)
+    assert [m.message_data for m in received] == test_messages[:2]
+    assert [m.message_id for m in received] == message_ids[:2]
+    for queued_message in received:
+        local_queue_backend.ack(TEST_TOPIC_ID, queued_message.message_id)
+
+    received = local_queue_backend.receive(TEST_TOPIC_ID, max_messages=2)
+    assert [m.message_data for m in received] == test_messages[2:]
+    local_queue_backend.ack(TEST_TOPIC_ID, received[0].message_id)
+
+    assert local_queue_backend.receive(TEST_TOPIC_ID, timeout_secs=0.01) == []
+
+
+def test_local_queue_backend_nack_redelivers(local_queue_backend):
+    local_queue_backend.publish_many(
+        project_id="test-project",
+        topic_id=TEST_TOPIC_ID,
+        messages=[dict(type="test")],
+    )
+    (queued_message,) = local_queue_backend.receive(TEST_TOPIC_ID)
+    assert queued_message.attempts == 1
+    local_queue_backend.nack(TEST_TOPIC_ID, queued_message.message_id)
+
+    (redelivered_message,) = local_queue_backend.receive(TEST_TOPIC_ID)
+    assert redelivered_message.message_id == queued_message.message_id
+    assert redelivered_message.attempts == 2
+
+
+def test_sqlite_queue_backend_is_durable(tmpdir):
+    database_path = str(tmpdir / "queue.db")
+    queues.SqliteQueueBackend(database_path=database_path).publish_many(
+        project_id="test-project",
+        topic_id=TEST_TOPIC_ID,
+        messages=[dict(type="test")],
+    )
+
+    received = queues.SqliteQueueBackend(database_path=database_path).receive(
+        TEST_TOPIC_ID
+    )
+    assert [m.message_data for m in received] == [dict(type="test")]
+
+
+def test_sqlite_queue_backend_message_ids_are_not_reused(tmpdir):
+    database_path = tmpdir / "queue.db"
+    message_ids = []
+    for _ in range(2):
+        publish_futures = queues.SqliteQueueBackend(
+            database_path=str(database_path)
+        ).publish_many(
+            project_id="test-project",
+            topic_id=TEST_TOPIC_ID,
+            messages=[dict(type="test")],
+        )
+        message_ids.append(publish_futures[0].result())
+        # Recreating the queue file starts the rowids over
+        database_path.remove()
+
+    assert message_ids[0] != message_ids[1]
+
+
+def test_run_local_consumer(local_queue_backend, mocker: "MockerFixture"):
+    local_queue_backend.publish_many(
+        project_id="test-project",
+        topic_id=TEST_TOPIC_ID,
+        messages=[dict(type="test", num=n) for n in range(5)],
+    )
+    mock_dispatch = mocker.Mock()
+
+    stats = queues.run_local_consumer(
+        dispatch_func=mock_dispatch,
+        queue_backend=local_queue_backend,
+        topic_id=TEST_TOPIC_ID,
+        batch_size=2,
+        idle_timeout_secs=0.01,
+    )
+
+    assert stats["num_processed"] == 5
+    assert stats["num_failed"] == 0
+    assert mock_dispatch.call_count == 5
+
+
+def test_run_local_consumer_max_messages(local_queue_backend, mocker: "MockerFixture"):
+    local_queue_backend.publish_many(
+        project_id="test-project",
+        topic_id=TEST_TOPIC_ID,
+        messages=[dict(type="test", num=n) for n in range(5)],
+    )
+
+    stats = queues.run_local_consumer(
+        dispatch_func=mocker.Mock(),
+        queue_backend=local_queue_backend,
+        topic_id=TEST_TOPIC_ID,
+        max_messages=3,
+        batch_size=2,
+        idle_timeout_secs=0.01,
+    )
+
+    assert stats["num_processed"] == 3
+    assert len(local_queue_backend.receive(TEST_TOPIC_ID, max_messages=5)) == 2
+
+
+def test_run_local_consumer_failures(local_queue_backend, mocker: "MockerFixture"):
+    local_queue_backend.publish_many(
+        project_id="test-project",
+        topic_id=TEST_TOPIC_ID,
+        messages=[dict(type="test")],
+    )
+    mock_dispatch = mocker.Mock(side_effect=Exception("nope"))
+
+    stats = queues.run_local_consumer(
+        dispatch_func=mock_dispatch,
+        queue_backend=local_queue_backend,
+        topic_id=TEST_TOPIC_ID,
+        idle_timeout_secs=0.01,
+        max_attempts=3,
+    )
+
+    # Retried up until max_attempts, then dropped
+    assert mock_dispatch.call_count == 3
+    assert stats["num_failed"] == 3
+    assert stats["num_dropped"] == 1
+    assert stats["num_processed"] == 0
+
+
+def test_get_queue_backend(app: "Flask", mocker: "MockerFixture", tmpdir):
+    mocker.patch("member_card.queues._queue_backend", None)
+    mocker.patch.dict(
+        app.config,
+        {"QUEUE_BACKEND": "sqlite", "QUEUE_SQLITE_PATH": str(tmpdir / "queue.db")},
+    )
+    with app.app_context():
+        queue_backend = queues.get_queue_backend()
+        assert queue_backend is queues.get_queue_backend()
+    assert isinstance(queue_backend, queues.SqliteQueueBackend)
+
+
+def test_get_queue_backend_unsupported(app: "Flask", mocker: "MockerFixture"):
+    mocker.patch("member_card.queues._queue_backend", None)
+    mocker.patch.dict(app.config, {"QUEUE_BACKEND": "not-a-backend"})
+    with app.app_context():
+        with pytest.raises(NotImplementedError):
+            queues.get_queue_backend()
+
+
+def test_publish_message_gcp_backend(mocker: "MockerFixture"):
+    mock_publish_many = mocker.patch("member_card.queues.gcp.publish_many")
+    mock_publish_many.return_value = [queues.completed_future("test-message-id")]
+    mocker.patch(
+        "member_card.queues.get_queue_backend",
+        return_value=queues.GcpQueueBackend(),
+    )
+
+    queues.publish_message(
+        project_id="test-project",
+        topic_id=TEST_TOPIC_ID,
+        message_data=dict(type="test"),
+    )
+
+    mock_publish_many.assert_called_once_with(
+        project_id="test-project",
+        topic_id=TEST_TOPIC_ID,
+        messages=[dict(type="test")],
+    )
@@ -0,0 +1,156 @@
+import uuid
+from typing import TYPE_CHECKING
+
+from member_card import reissue
+from member_card.models.card_reissue import (
+    CARD_REISSUE_COMPLETED,
+    CARD_REISSUE_FAILED,
+    get_reissued_user_ids,
+)
+
+if TYPE_CHECKING:
+    from flask import Flask
+    from member_card.models import MembershipCard, User
+    from pytest_mock.plugin import MockerFixture
+
+
+def test_reissue_progress():
+    progress = reissue.ReissueProgress(num_total=10, num_previously_completed=2)
+    assert progress.eta is None
+
+    progress.started_at -= 4
+    for _ in range(3):
+        progress.record(CARD_REISSUE_COMPLETED)
+    progress.record("failed")
+
+    assert progress.num_remaining == 4
+    assert 0.9 < progress.cards_per_sec <= 1.0
+    progress_dict = progress.to_dict()
+    assert progress_dict["num_completed"] == 3
+    assert progress_dict["num_failed"] == 1
+    assert 4 <= progress_dict["eta_secs"] <= 5
+
+
+def test_reissue_card_artifacts(
+    app: "Flask", fake_card: "MembershipCard", mocker: "MockerFixture"
+):
+    mock_ensure_image = mocker.patch("member_card.reissue.ensure_uploaded_card_image")
+    mock_ensure_pass = mocker.patch("member_card.reissue.ensure_uploaded_apple_pass")
+    mock_gpay = mocker.patch("member_card.reissue.gpay")
+
+    with app.app_context():
+        reissue.reissue_card_artifacts(fake_card)
+
+    mock_ensure_image.assert_called_once_with(fake_card)
+    mock_ensure_pass.assert_called_once_with(fake_card)
+    mock_gpay.upsert_pass_object.assert_called_once_with(fake_card, gpay_client=None)
+
+
+def test_reissue_card_artifacts_force(
+    app: "Flask", fake_card: "MembershipCard", mocker: "MockerFixture"
+):
+    mocker.patch("member_card.reissue.get_bucket")
+    mock_generate_image = mocker.patch(
+        "member_card.reissue.generate_and_upload_card_image"
+    )
+    mock_generate_pass = mocker.patch(
+        "member_card.reissue.generate_and_upload_apple_pass"
+    )
+    mock_record_artifact = mocker.patch("member_card.reissue.record_card_artifact")
+    mocker.patch("member_card.reissue.gpay")
+
+    with app.app_context():
+        reissue.reissue_card_artifacts(fake_card, force=True)
+
+    mock_generate_image.assert_called_once()
+    mock_generate_pass.assert_called_once_with(fake_card)
+    assert mock_record_artifact.call_count == 2
+
+
+def test_run_card_reissue(app: "Flask", fake_member: "User", mocker: "MockerFixture"):
+    mock_reissue_artifacts = mocker.patch("member_card.reissue.reissue_card_artifacts")
+    mocker.patch("member_card.reissue.gpay")
+    reissue_id = str(uuid.uuid4())
+
+    with app.app_context():
+        stats = reissue.run_card_reissue(reissue_id=reissue_id, concurrency=2)
+
+    assert stats["num_total"] == 1
+    assert stats["num_completed"] == 1
+    assert stats["num_remaining"] == 0
+    mock_reissue_artifacts.assert_called_once()
+
+    # Rerunning the same reissue skips over members already taken care of
+    mock_reissue_artifacts.reset_mock()
+    with app.app_context():
+        stats = reissue.run_card_reissue(reissue_id=reissue_id)
+
+    assert stats["num_previously_completed"] == 1
+    assert stats["num_completed"] == 0
+    mock_reissue_artifacts.assert_not_called()
+
+
+def test_run_card_reissue_failure(
+    app: "Flask", fake_member: "User", mocker: "MockerFixture"
+):
+    mock_reissue_artifacts = mocker.patch("member_card.reissue.reissue_card_artifacts")
+    mock_reissue_artifacts.side_effect = Exception("nope")
+    mocker.patch("member_card.reissue.gpay")
+    reissue_id = str(uuid.uuid4())
+
+    with app.app_context():
+        stats = reissue.run_card_reissue(reissue_id=reissue_id)
+
+    assert stats["num_failed"] == 1
+
+    # Failed cards are retried on the next run
+    mock_reissue_artifacts.side_effect = None
+    with app.app_context():
+        stats = reissue.run_card_reissue(reissue_id=reissue_id)
+
+    assert stats["num_completed"] == 1
+    assert mock_reissue_artifacts.call_count == 2
+
+
+def test_reissue_member_card_failures(
+    app: "Flask", fake_member: "User", mocker: "MockerFixture"
+):
+    mock_get_card = mocker.patch("member_card.reissue.get_membership_card")
+    mock_get_card.side_effect = Exception("nope")
+    reissue_id = str(uuid.uuid4())
+    member_id = fake_member.id
+
+    # Neither a missing user nor a card that can't be loaded escapes to abort the rest of the run
+    assert (
+        reissue.reissue_member_card(app, reissue_id, user_id=-1) == CARD_REISSUE_FAILED
+    )
+    assert (
+        reissue.reissue_member_card(app, reissue_id, user_id=member_id)
+        == CARD_REISSUE_FAILED
+    )
+    with app.app_context():
+        assert get_reissued_user_ids(reissue_id, user_ids=[member_id]) == set()
+
+
+def test_run_card_reissue_sharded(
+    app: "Flask", fake_member: "User", mocker: "MockerFixture"
+):
+    mock_reissue_artifacts = mocker.patch("member_card.reissue.reissue_card_artifacts")
+    mocker.patch("member_card.reissue.gpay")
+    member_shard_index = fake_member.id % 2
+
+    with app.app_context():
+        other_shard_stats = reissue.run_card_reissue(
+            reissue_id=str(uuid.uuid4()),
+            num_shards=2,
+            shard_index=1 - member_shard_index,
+        )
+        member_shard_stats = reissue.run_card_reissue(
+            reissue_id=str(uuid.uuid4()),
+            num_shards=2,
+            shard_index=member_shard_index,
+        )
+
+    assert other_shard_stats["num_total"] == 0
+    assert member_shard_stats["num_completed"] == 1
+    mock_reissue_artifacts.assert_called_once()
@@ -0,0 +1,148 @@
+import os
+import sys
+from time import sleep
+from typing import TYPE_CHECKING
+
+import pytest
+
+from member_card import renderer
+
+if TYPE_CHECKING:
+    from flask import Flask
+    from pytest_mock.plugin import MockerFixture
+
+
+class FakeBrowser(object):
+    instances = []
+
+    def __init__(self, executable=None, flags=None):
+        self.num_renders = 0
+        self.closed = False
+        self.healthy = True
+        FakeBrowser.instances.append(self)
+
+    def start(self):
+        return self
+
+    def is_healthy(self):
+        return self.healthy
+
+    def close(self):
+        self.closed = True
+
+    def render(self, html_content, width, height):
+        if html_content == "explode":
+            raise renderer.ChromeRendererError("kaboom")
+        self.num_renders += 1
+        return f"{html_content}:{width}x{height}".encode()
+
+
+@pytest.fixture()
+def fake_browser_pool():
+    FakeBrowser.instances = []
+    pool = renderer.ChromeRendererPool(
+        pool_size=1,
+        max_renders_per_browser=2,
+        health_check_interval_secs=0.05,
+        browser_class=FakeBrowser,
+    ).start()
+    yield pool
+    pool.shutdown()
+
+
+def test_pool_render_returns_png_bytes(fake_browser_pool):
+    assert fake_browser_pool.render("<p>hi</p>", 10, 20) == b"<p>hi</p>:10x20"
+    # The browser should have been warmed up ahead of the render and reused for it
+    assert len(FakeBrowser.instances) == 1
+
+
+def test_pool_recycles_browsers_after_max_renders(fake_browser_pool):
+    for _ in range(3):
+        fake_browser_pool.render("<p>hi</p>", 10, 20)
+
+    assert len(FakeBrowser.instances) == 2
+    assert FakeBrowser.instances[0].closed
+    assert FakeBrowser.instances[0].num_renders == 2
+
+
+def test_pool_replaces_browser_after_failed_render(fake_browser_pool):
+    with pytest.raises(renderer.ChromeRendererError):
+        fake_browser_pool.render("explode", 10, 20)
+
+    assert FakeBrowser.instances[0].closed
+    assert fake_browser_pool.render("<p>hi</p>", 10, 20) == b"<p>hi</p>:10x20"
+    assert len(FakeBrowser.instances) == 2
+
+
+def test_pool_health_check_closes_unhealthy_browser(fake_browser_pool):
+    fake_browser_pool.render("<p>hi</p>", 10, 20)
+    FakeBrowser.instances[0].healthy = False
+
+    # Wait on an idle health check to notice the now-unhealthy browser
+    for _ in range(100):
+        if FakeBrowser.instances[0].closed:
+            break
+        sleep(0.01)
+    assert FakeBrowser.instances[0].closed
+    assert fake_browser_pool.render("<p>hi</p>", 10, 20) == b"<p>hi</p>:10x20"
+
+
+def test_get_renderer_pool(app: "Flask", mocker: "MockerFixture"):
+    mock_pool_class = mocker.patch("member_card.renderer.ChromeRendererPool")
+    mocker.patch("member_card.renderer._renderer_pool", None)
+    mocker.patch("member_card.renderer.atexit")
+    with app.app_context():
+        pool = renderer.get_renderer_pool()
+        assert renderer.get_renderer_pool() is pool
+    mock_pool_class.assert_called_once()
+    assert pool == mock_pool_class.return_value.start.return_value
+
+
+FAKE_CHROME_SCRIPT = """#!{python}
+import json, os, sys
+
+if "--version" in sys.argv:
+    print("Fake Chromium 1.0")
+    raise SystemExit(0)
+
+# Answers every DevTools command read off of fd 3 (on fd 4) with the fds this process was started with
+open_fds = sorted(int(fd) for fd in os.listdir("/proc/self/fd"))
+buffer = b""
+while True:
+    chunk = os.read(3, 65536)
+    if not chunk:
+        break
+    buffer += chunk
+    while b"\\0" in buffer:
+        raw_message, buffer = buffer.split(b"\\0", 1)
+        message = json.loads(raw_message)
+        response = dict(id=message["id"], result=dict(product="FakeChrome", open_fds=open_fds))
+        os.write(4, json.dumps(response).encode() + b"\\0")
+        if message["method"] == "Browser.close":
+            raise SystemExit(0)
+"""
+
+
+@pytest.mark.skipif(
+    not os.path.isdir("/proc/self/fd"), reason="fake chrome lists fds via /proc"
+)
+def test_chrome_browser_pipes(tmp_path):
+    fake_chrome_path = tmp_path / "fake-chrome"
+    fake_chrome_path.write_text(FAKE_CHROME_SCRIPT.format(python=sys.executable))
+    fake_chrome_path.chmod(0o755)
+    # An inheritable fd of ours that chrome should nonetheless never see
+    leaky_read_fd, leaky_write_fd = os.pipe()
+    os.set_inheritable(leaky_read_fd, True)
+
+    browser = renderer.ChromeBrowser(executable=str(fake_chrome_path))
+    try:
+        browser.start()
+        version = browser.send_command("Browser.getVersion")
+    finally:
+        browser.close()
+        os.close(leaky_read_fd)
+        os.close(leaky_write_fd)
+
+    assert version["product"] == "FakeChrome"
+    # stdio, the DevTools pipe ends and whatever fd listing /proc/self/fd itself opened
+    assert set(version["open_fds"]) - {0, 1, 2, 3, 4} == {5}
@@ -1,6 +1,7 @@
 import json
 from typing import TYPE_CHECKING
 
+import pytest
 from member_card import sendgrid
 from sendgrid import SendGridAPIClient
 from sendgrid.helpers.mail import Mail
@@ -30,6 +31,7 @@ def test_send_email_message(
 ):
     mock_sg_client = mocker.create_autospec(SendGridAPIClient, instance=True)
     mocker.patch("member_card.sendgrid.SendGridAPIClient").return_value = mock_sg_client
+    mocker.patch("member_card.sendgrid._sendgrid_client", None)
     to_emails = fake_card.user.email
     test_message = Mail(
         from_email=app.config["EMAIL_FROM_ADDRESS"],
@@ -48,6 +50,84 @@ def test_send_email_message(
     mock_sg_client.send.assert_called_once_with(test_message)
 
 
+def generate_test_email_messages(app: "Flask", num_messages):
+    email_messages = []
+    for num in range(num_messages):
+        email_message = Mail(
+            from_email=app.config["EMAIL_FROM_ADDRESS"],
+            to_emails=f"test-recipient-{num}@losverd.es",
+        )
+        email_message.template_id = app.config["SENDGRID_TEMPLATE_ID"]
+        email_message.dynamic_template_data = {"recipient_num": num}
+        email_messages.append(email_message)
+    return email_messages
+
+
+def test_build_bulk_email_messages(app: "Flask"):
+    email_messages = generate_test_email_messages(app, num_messages=5)
+
+    bulk_messages = sendgrid.build_bulk_email_messages(
+        email_messages=email_messages,
+        max_personalizations=2,
+    )
+
+    assert [len(m.personalizations) for m in bulk_messages] == [2, 2, 1]
+    bulk_message_bodies = [m.get() for m in bulk_messages]
+    assert [
+        p["dynamic_template_data"]["recipient_num"]
+        for body in bulk_message_bodies
+        for p in body["personalizations"]
+    ] == list(range(5))
+    assert all(
+        body["template_id"] == app.config["SENDGRID_TEMPLATE_ID"]
+        for body in bulk_message_bodies
+    )
+
+
+def test_send_bulk_email_messages(app: "Flask", mocker: "MockerFixture"):
+    mock_sg_client = mocker.create_autospec(SendGridAPIClient, instance=True)
+    mocker.patch("member_card.sendgrid._sendgrid_client", mock_sg_client)
+    email_messages = generate_test_email_messages(app, num_messages=6)
+    bulk_message_batches = [
+        (num, sendgrid.build_bulk_email_messages(email_messages[num : num + 2]))
+        for num in range(0, 6, 2)
+    ]
+    sent_checkpoints = []
+
+    with app.app_context():
+        stats = sendgrid.send_bulk_email_messages(
+            bulk_message_batches=bulk_message_batches,
+            concurrency=2,
+            on_batch_sent=sent_checkpoints.append,
+        )
+
+    assert stats == dict(num_requests=3, num_personalizations=6)
+    assert sent_checkpoints == [0, 2, 4]
+    assert mock_sg_client.send.call_count == 3
+
+
+def test_send_bulk_email_messages_failure(app: "Flask", mocker: "MockerFixture"):
+    mock_sg_client = mocker.create_autospec(SendGridAPIClient, instance=True)
+    mock_sg_client.send.side_effect = [None, Exception("nope"), None]
+    mocker.patch("member_card.sendgrid._sendgrid_client", mock_sg_client)
+    email_messages = generate_test_email_messages(app, num_messages=3)
+    bulk_message_batches = [
+        (num, sendgrid.build_bulk_email_messages([email_message]))
+        for num, email_message in enumerate(email_messages)
+    ]
+    sent_checkpoints = []
+
+    with app.app_context(), pytest.raises(Exception, match="nope"):
+        sendgrid.send_bulk_email_messages(
+            bulk_message_batches=bulk_message_batches,
+            concurrency=1,
+            on_batch_sent=sent_checkpoints.append,
+        )
+
+    # Nothing past the failed batch is checkpointed, so a rerun picks up from there
+    assert sent_checkpoints == [0]
+
+
 def test_update_sendgrid_template(app: "Flask", mocker: "MockerFixture"):
     template_id = "test-template-id"
     test_template_version = dict(
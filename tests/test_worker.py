@@ -1,10 +1,21 @@
 import base64
 import json
 import logging
+import os
+import signal
+import threading
+import uuid
+from unittest.mock import PropertyMock
 
+import pytest
 from bigcommerce import connection
 
 from member_card import worker
+from member_card.db import db
+from member_card.models import MembershipCard, PendingOrderSync
+from member_card.models.table_metadata import get_last_processed_id
+from member_card.idempotency import InMemoryProcessedMessageLedger
+from sqlalchemy import text
 from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
@@ -73,6 +84,53 @@ class TestPubsubIngress:
         # Check that we return a 400 / Bad Request in these cases
         assert response.status_code == 204
 
+    def test_redelivered_message_skipped(self, client, mocker):
+        mock_sync_customers_etl = mocker.patch("member_card.worker.sync_customers_etl")
+        mocker.patch(
+            "member_card.worker.get_processed_message_ledger",
+            return_value=InMemoryProcessedMessageLedger(
+                ttl_secs=60, prune_interval_secs=3600
+            ),
+        )
+        test_envelope = self.generate_test_envelope(dict(type="sync_customers_etl"))
+        test_envelope["message"]["messageId"] = "test-message-id"
+
+        for _ in range(2):
+            response = client.post(
+                "/pubsub",
+                json=test_envelope,
+            )
+            assert response.status_code == 204
+
+        mock_sync_customers_etl.assert_called_once()
+
+    def test_dispatch_message_logs_query_stats(self, app, mocker):
+        def fake_sync_customers_etl(message):
+            db.session.execute(text("SELECT 1"))
+
+        mocker.patch(
+            "member_card.worker.sync_customers_etl", side_effect=fake_sync_customers_etl
+        )
+        mocker.patch(
+            "member_card.worker.get_processed_message_ledger",
+            return_value=InMemoryProcessedMessageLedger(
+                ttl_secs=60, prune_interval_secs=3600
+            ),
+        )
+        mock_logger = mocker.patch("member_card.query_stats.logger")
+
+        with app.app_context():
+            worker.dispatch_message(dict(type="sync_customers_etl"))
+
+        log_extra = mock_logger.info.call_args.kwargs["extra"]
+        assert log_extra["message_type"] == "sync_customers_etl"
+        assert log_extra["db_num_statements"] == 1
+
+    def test_dispatch_message_unsupported_type(self, app):
+        with app.app_context():
+            with pytest.raises(NotImplementedError):
+                worker.dispatch_message(dict(type="not-a-supported-type"))
+
     def test_sync_subscriptions_etl(self, client, mocker):
         mock_store_hash = "mock_store_hash"
         mock_orders = [
@@ -222,7 +280,7 @@ class TestEmailDistribution:
             "member_card.worker.ensure_uploaded_card_image"
         )
         mock_upload_apple_pass = mocker.patch(
-            "member_card.worker.generate_and_upload_apple_pass"
+            "member_card.worker.ensure_uploaded_apple_pass"
         )
         mock_generate_email = mocker.patch("member_card.worker.generate_email_message")
         mock_send_email = mocker.patch("member_card.worker.send_email_message")
@@ -246,6 +304,77 @@ class TestEmailDistribution:
         mock_send_email.assert_called_once_with(mock_generate_email.return_value)
 
 
+class TestBulkEmailDistribution:
+    def test_with_active_member(self, mocker, fake_member):
+        mocker.patch("member_card.worker.ensure_uploaded_card_image")
+        mocker.patch("member_card.worker.ensure_uploaded_apple_pass")
+        mocker.patch.object(
+            MembershipCard, "google_pass_save_url", new_callable=PropertyMock
+        )
+        mock_sg_client = mocker.patch("member_card.sendgrid._sendgrid_client")
+        member_id = fake_member.id
+        member_email = fake_member.email
+        distribution_id = str(uuid.uuid4())
+        test_message = dict(
+            type="bulk_email_distribution_request",
+            distribution_id=distribution_id,
+        )
+
+        stats = worker.process_bulk_email_distribution_request(message=test_message)
+
+        assert stats["num_requests"] == 1
+        assert stats["num_personalizations"] == 1
+        assert stats["num_failed"] == 0
+        assert stats["last_processed_user_id"] == member_id
+        sent_message = mock_sg_client.send.call_args[0][0]
+        assert [p.tos for p in sent_message.personalizations] == [
+            [dict(email=member_email)]
+        ]
+        assert (
+            get_last_processed_id(
+                worker.get_bulk_email_distribution_checkpoint_name(distribution_id)
+            )
+            == member_id
+        )
+
+        # Rerunning the same distribution resumes from its checkpoint rather than re-sending
+        mock_sg_client.reset_mock()
+        stats = worker.process_bulk_email_distribution_request(message=test_message)
+
+        assert stats["num_personalizations"] == 0
+        mock_sg_client.send.assert_not_called()
+
+    def test_failed_member_retried_on_resume(self, mocker, fake_member):
+        mock_ensure_image = mocker.patch(
+            "member_card.worker.ensure_uploaded_card_image"
+        )
+        mock_ensure_image.side_effect = Exception("nope")
+        mocker.patch("member_card.worker.ensure_uploaded_apple_pass")
+        mocker.patch.object(
+            MembershipCard, "google_pass_save_url", new_callable=PropertyMock
+        )
+        mock_sg_client = mocker.patch("member_card.sendgrid._sendgrid_client")
+        member_id = fake_member.id
+        test_message = dict(
+            type="bulk_email_distribution_request",
+            distribution_id=str(uuid.uuid4()),
+        )
+
+        stats = worker.process_bulk_email_distribution_request(message=test_message)
+
+        assert stats["num_failed"] == 1
+        assert stats["failed_user_ids"] == [member_id]
+        mock_sg_client.send.assert_not_called()
+
+        # The checkpoint moved past the failed member, but a resumed run still gets their email out
+        mock_ensure_image.side_effect = None
+        stats = worker.process_bulk_email_distribution_request(message=test_message)
+
+        assert stats["num_failed"] == 0
+        assert stats["failed_user_ids"] == []
+        assert stats["num_personalizations"] == 1
+
+
 class TestEnsureCardImage:
     def test_no_matching_user(self, mocker):
         mock_ensure_uploaded_card_image = mocker.patch(
@@ -302,6 +431,7 @@ class TestEnsureCardImage:
 
 def test_sync_bigcommerce_order(app: "Flask", mocker):
     mock_bigcommerce = mocker.patch("member_card.worker.bigcommerce")
+    mocker.patch.dict(app.config, {"BIGCOMMERCE_ORDER_SYNC_QUIET_WINDOW_SECS": 0})
     test_message = dict(
         type="sync_bigcommerce_order",
         store_hash=app.config["BIGCOMMERCE_STORE_HASH"],
@@ -325,6 +455,61 @@ def test_sync_bigcommerce_order(app: "Flask", mocker):
     )
 
 
+def test_sync_bigcommerce_order_deferred(app: "Flask", mocker):
+    mock_bigcommerce = mocker.patch("member_card.worker.bigcommerce")
+    test_message = dict(
+        type="sync_bigcommerce_order",
+        store_hash=app.config["BIGCOMMERCE_STORE_HASH"],
+        data=dict(id="test-deferred-id"),
+    )
+
+    with app.app_context():
+        return_value = worker.sync_bigcommerce_order(
+            message=test_message,
+        )
+        num_pending = (
+            db.session.query(PendingOrderSync)
+            .filter_by(order_id="test-deferred-id")
+            .delete()
+        )
+        db.session.commit()
+
+    assert return_value == "deferred"
+    assert num_pending == 1
+    mock_bigcommerce.load_single_order.assert_not_called()
+
+
+def test_sync_pending_bigcommerce_orders(app: "Flask", mocker):
+    mock_bigcommerce = mocker.patch("member_card.worker.bigcommerce")
+    mocker.patch.dict(app.config, {"BIGCOMMERCE_ORDER_SYNC_QUIET_WINDOW_SECS": 0})
+    store_hash = app.config["BIGCOMMERCE_STORE_HASH"]
+
+    def another_event_arrives(order_id, **kwargs):
+        if order_id == "test-mid-sync-id":
+            worker.register_order_event(store_hash=store_hash, order_id=order_id)
+
+    mock_bigcommerce.load_single_order.side_effect = another_event_arrives
+
+    with app.app_context():
+        worker.register_order_event(store_hash=store_hash, order_id="test-pending-id")
+        worker.register_order_event(store_hash=store_hash, order_id="test-pending-id")
+        worker.register_order_event(store_hash=store_hash, order_id="test-mid-sync-id")
+        return_value = worker.sync_pending_bigcommerce_orders(
+            message=dict(type="sync_pending_bigcommerce_orders"),
+        )
+        # The event that arrived mid-sync leaves its order pending for the next sweep
+        remaining_order_ids = [
+            pending_order_sync.order_id
+            for pending_order_sync in db.session.query(PendingOrderSync)
+        ]
+        db.session.query(PendingOrderSync).delete()
+        db.session.commit()
+
+    assert return_value == {"num_synced_orders": 2}
+    assert mock_bigcommerce.load_single_order.call_count == 2
+    assert remaining_order_ids == ["test-mid-sync-id"]
+
+
 def test_worker_sync_customers_etl(mocker):
     mock_bigcommerce = mocker.patch("member_card.worker.bigcommerce")
     test_message = dict(
@@ -369,3 +554,71 @@ def test_sync_minibc_subscriptions_etl(app: "Flask", mocker):
         )
 
     mock_minibc.minibc_subscriptions_etl.assert_called_once()
+
+
+class TestStreamingPullWorker:
+    @staticmethod
+    def generate_pulled_message(mocker, message_data):
+        pulled_message = mocker.Mock()
+        pulled_message.data = json.dumps(message_data).encode("utf-8")
+        pulled_message.message_id = "test-message-id"
+        return pulled_message
+
+    def test_handle_pulled_message(self, app: "Flask", mocker):
+        mock_dispatch_message = mocker.patch("member_card.worker.dispatch_message")
+        test_message = dict(type="sync_customers_etl")
+        pulled_message = self.generate_pulled_message(mocker, test_message)
+
+        worker.handle_pulled_message(app, pulled_message)
+
+        mock_dispatch_message.assert_called_once_with(
+            message=test_message,
+            message_id="test-message-id",
+        )
+        pulled_message.ack.assert_called_once()
+        pulled_message.nack.assert_not_called()
+
+    def test_handle_pulled_message_handler_error(self, app: "Flask", mocker):
+        mock_dispatch_message = mocker.patch("member_card.worker.dispatch_message")
+        mock_dispatch_message.side_effect = Exception("nope")
+        pulled_message = self.generate_pulled_message(
+            mocker, dict(type="sync_customers_etl")
+        )
+
+        worker.handle_pulled_message(app, pulled_message)
+
+        pulled_message.nack.assert_called_once()
+        pulled_message.ack.assert_not_called()
+
+    def test_handle_pulled_message_unsupported_type(self, app: "Flask", mocker):
+        pulled_message = self.generate_pulled_message(
+            mocker, dict(type="not-a-real-type")
+        )
+
+        worker.handle_pulled_message(app, pulled_message)
+
+        pulled_message.ack.assert_called_once()
+        pulled_message.nack.assert_not_called()
+
+    def test_run_streaming_pull_worker_drains_on_sigterm(self, app: "Flask", mocker):
+        mock_subscribe = mocker.patch("member_card.worker.gcp.subscribe")
+        mock_streaming_pull_future = mock_subscribe.return_value
+        mock_streaming_pull_future.done.return_value = False
+        previous_sigterm_handler = signal.getsignal(signal.SIGTERM)
+        threading.Timer(0.1, os.kill, args=(os.getpid(), signal.SIGTERM)).start()
+
+        with app.app_context():
+            worker.run_streaming_pull_worker(
+                subscription_id="test-subscription",
+                max_messages=10,
+                max_bytes=1024,
+                num_handler_threads=2,
+            )
+
+        assert mock_subscribe.call_args.kwargs["subscription_id"] == (
+            "test-subscription"
+        )
+        assert mock_subscribe.call_args.kwargs["max_messages"] == 10
+        mock_streaming_pull_future.cancel.assert_called_once()
+        mock_streaming_pull_future.result.assert_called_once()
+        assert signal.getsignal(signal.SIGTERM) == previous_sigterm_handler